@@ -1,6 +1,12 @@
+import fnmatch
 import os
 import logging
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.core.exceptions import ResourceNotFoundError
 from azure.identity import ClientSecretCredential, DefaultAzureCredential
 from azure.appconfiguration import AzureAppConfigurationClient
 from azure.keyvault.secrets import SecretClient
@@ -13,10 +19,49 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 
 
+# Content type App Configuration gives Key Vault references
+KEY_VAULT_REFERENCE_CONTENT_TYPE = "application/vnd.microsoft.appconfig.keyvaultref+json"
+# Label filter selecting settings without a label, which is what get_configuration_setting returns by default
+NULL_LABEL = "\0"
+
+
 class AppConfigClient:
-    def __init__(self, app_config_url):
+    """
+    Azure App Configuration client with an in-process cache.
+
+    Settings are bulk-loaded with one ``list_configuration_settings`` call per key/label filter,
+    and Key Vault references among them are resolved in parallel through one SecretClient per
+    vault. Values are served from the cache until they are older than ``cache_ttl``; with
+    ``start_refresh`` a background thread also reloads everything as soon as a sentinel key changes.
+    """
+
+    def __init__(self, app_config_url, key_filter: str = None, label_filter: str = None, cache_ttl: float = None,
+                 max_workers: int = 8):
+        """
+        :param app_config_url: Endpoint of the App Configuration store.
+        :param key_filter: Keys to bulk-load, e.g. "SG_*" or "A,B"; defaults to APP_CONFIG_KEY_FILTER, or every key.
+        :param label_filter: Label to load; defaults to APP_CONFIG_LABEL, or settings without a label.
+        :param cache_ttl: Seconds a cached value is served before it is reloaded; defaults to
+            APP_CONFIG_CACHE_TTL, or 300.
+        :param max_workers: Maximum Key Vault secrets fetched concurrently.
+        """
         self.app_config_url = app_config_url
         self.environment = os.getenv("ENVIRONMENT", "production").lower()
+        self.key_filter = key_filter if key_filter is not None else os.getenv("APP_CONFIG_KEY_FILTER")
+        self.label_filter = label_filter if label_filter is not None else os.getenv("APP_CONFIG_LABEL")
+        self.cache_ttl = cache_ttl if cache_ttl is not None else float(os.getenv("APP_CONFIG_CACHE_TTL", "300"))
+        self.max_workers = max_workers
+
+        # key -> (value, monotonic time fetched); None values record keys known to be missing
+        self._cache = {}
+        self._loaded_at = None
+        self._cache_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._secret_clients = {}
+        self._secret_clients_lock = threading.Lock()
+        self._sentinel_etag = None
+        self._stop_refresh = threading.Event()
+        self._refresher = None
 
         # Determine which credential to use based on the environment
         if self.environment == "local":
@@ -40,39 +85,126 @@ class AppConfigClient:
             logging.error("App Configuration URL not provided.")
             raise ValueError("App Configuration URL is missing.")
 
-    def fetch_configuration_value(self, key):
-        """Fetch a single configuration setting from Azure App Configuration."""
+    def _covers(self, key):
+        """True if the bulk load's key filter includes this key, so its absence there means it does not exist."""
+        if not self.key_filter:
+            return True
+        return any(fnmatch.fnmatchcase(key, pattern.strip()) for pattern in self.key_filter.split(","))
+
+    def load(self):
+        """
+        Bulk-load every setting matching the key and label filters, resolving Key Vault references in parallel.
+
+        :return: Number of settings loaded.
+        """
+        with self._load_lock:
+            started = time.monotonic()
+            settings = self.app_config_client.list_configuration_settings(
+                key_filter=self.key_filter or None,
+                label_filter=self.label_filter or NULL_LABEL
+            )
+            values = {setting.key: self._raw_value(setting) for setting in settings}
+
+            references = {key: uri for key, (value, uri) in values.items() if uri}
+            secrets = self._resolve_secrets(references.values())
+            loaded = {key: secrets.get(uri) if uri else value for key, (value, uri) in values.items()}
+
+            now = time.monotonic()
+            with self._cache_lock:
+                # Settings deleted from the store disappear from the cache too
+                for key in [key for key in self._cache if self._covers(key) and key not in loaded]:
+                    del self._cache[key]
+                self._cache.update({key: (value, now) for key, value in loaded.items()})
+                self._loaded_at = now
+            logging.info(f"Loaded {len(loaded)} configuration settings ({len(references)} Key Vault references) "
+                         f"in {now - started:.2f}s.")
+            return len(loaded)
+
+    @staticmethod
+    def _raw_value(setting):
+        """(value, Key Vault secret URI or None) of a configuration setting."""
+        value = setting.value
+        content_type = setting.content_type or ""
+        if value is None or not (content_type.startswith(KEY_VAULT_REFERENCE_CONTENT_TYPE) or value.startswith("{")):
+            return value, None
         try:
-            setting = self.app_config_client.get_configuration_setting(key=key)
-            if setting:
-                value = setting.value
-                try:
-                    # Check if the value is a JSON object containing a Key Vault URI
-                    parsed_value = json.loads(value)
-                    if isinstance(parsed_value, dict) and "uri" in parsed_value:
-                        secret_uri = parsed_value["uri"]
-                        return self.fetch_secret_from_keyvault_uri(secret_uri)
-                    else:
-                        return value
-                except json.JSONDecodeError:
-                    return value
-            else:
-                logging.error(f"Key '{key}' not found in App Configuration.")
-                return None
+            # Check if the value is a JSON object containing a Key Vault URI
+            parsed_value = json.loads(value)
+        except json.JSONDecodeError:
+            return value, None
+        if isinstance(parsed_value, dict) and "uri" in parsed_value:
+            return value, parsed_value["uri"]
+        return value, None
+
+    def _resolve_secrets(self, secret_uris):
+        """Fetch the given Key Vault secrets concurrently; returns {uri: value}."""
+        secret_uris = list(dict.fromkeys(secret_uris))
+        if not secret_uris:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(secret_uris))) as pool:
+            return dict(zip(secret_uris, pool.map(self.fetch_secret_from_keyvault_uri, secret_uris)))
+
+    def _fetch_single(self, key):
+        """Fetch one setting outside the bulk-loaded filter with its own round trip."""
+        try:
+            setting = self.app_config_client.get_configuration_setting(key=key, label=self.label_filter or None)
+        except ResourceNotFoundError:
+            setting = None
         except Exception as e:
             logging.error(f"Error fetching configuration setting '{key}': {e}")
             return None
+        if not setting:
+            logging.error(f"Key '{key}' not found in App Configuration.")
+            value = None
+        else:
+            value, secret_uri = self._raw_value(setting)
+            if secret_uri:
+                value = self.fetch_secret_from_keyvault_uri(secret_uri)
+        with self._cache_lock:
+            self._cache[key] = (value, time.monotonic())
+        return value
+
+    def fetch_configuration_value(self, key):
+        """Fetch a configuration setting, from the cache when it holds a fresh value."""
+        now = time.monotonic()
+        if self._covers(key) and (self._loaded_at is None or now - self._loaded_at > self.cache_ttl):
+            try:
+                self.load()
+            except Exception as e:
+                # Keep serving the last known values if the store is unreachable
+                logging.error(f"Error loading configuration settings: {e}")
+
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[1] <= self.cache_ttl:
+            value = cached[0]
+        elif self._covers(key) and self._loaded_at is not None:
+            if cached is None:
+                logging.error(f"Key '{key}' not found in App Configuration.")
+            value = cached[0] if cached else None
+        else:
+            value = self._fetch_single(key)
+        return value
+
+    def _secret_client(self, vault_url):
+        """The SecretClient for a vault, created once and reused for every secret in it."""
+        with self._secret_clients_lock:
+            secret_client = self._secret_clients.get(vault_url)
+            if secret_client is None:
+                # Use the same credential to access Key Vault
+                secret_client = self._secret_clients[vault_url] = SecretClient(vault_url=vault_url, credential=self.credential)
+            return secret_client
 
     def fetch_secret_from_keyvault_uri(self, secret_uri):
         """Fetch a secret using its full URI from Azure Key Vault."""
         try:
             if "/secrets/" in secret_uri:
                 vault_url = secret_uri.split("/secrets/")[0]
-                secret_name = secret_uri.split("/secrets/")[1].split("?")[0]
+                secret_path = secret_uri.split("/secrets/")[1].split("?")[0].split("/")
+                secret_name = secret_path[0]
+                version = secret_path[1] if len(secret_path) > 1 else None
 
-                # Use the same credential to access Key Vault
-                secret_client = SecretClient(vault_url=vault_url, credential=self.credential)
-                secret = secret_client.get_secret(secret_name)
+                secret = self._secret_client(vault_url).get_secret(secret_name, version)
                 logging.info(f"Secret '{secret_name}' fetched successfully from Key Vault.")
                 return secret.value
             else:
@@ -82,6 +214,61 @@ class AppConfigClient:
             logging.error(f"Error fetching secret from Key Vault: {e}")
             return None
 
+    def refresh_if_changed(self, sentinel_key: str) -> bool:
+        """
+        Reload every setting if the sentinel key's ETag changed since the last check.
+
+        :return: True if the settings were reloaded.
+        """
+        setting = self.app_config_client.get_configuration_setting(key=sentinel_key, label=self.label_filter or None)
+        etag = setting.etag if setting else None
+        if etag == self._sentinel_etag:
+            return False
+        first_check = self._sentinel_etag is None
+        self._sentinel_etag = etag
+        if first_check and self._loaded_at is not None:
+            return False  # Baseline taken after the initial load
+        logging.info(f"Sentinel key '{sentinel_key}' changed; reloading configuration.")
+        self.load()
+        return True
+
+    def start_refresh(self, sentinel_key: str, interval: float = 30.0):
+        """
+        Poll a sentinel key from a daemon thread and reload all settings whenever it changes.
+
+        Only the sentinel is read on each poll; writers bump it after updating the settings it guards.
+        Settings are also reloaded once they are older than ``cache_ttl``.
+
+        :param sentinel_key: Key whose change signals that the configuration was updated.
+        :param interval: Seconds between polls.
+        """
+        def refresh():
+            while not self._stop_refresh.wait(interval):
+                try:
+                    if not self.refresh_if_changed(sentinel_key) and (
+                            self._loaded_at is None or time.monotonic() - self._loaded_at > self.cache_ttl):
+                        self.load()
+                except Exception as e:
+                    logging.error(f"Error refreshing configuration: {e}")
+
+        try:
+            self.refresh_if_changed(sentinel_key)
+        except Exception as e:
+            logging.error(f"Error reading sentinel key '{sentinel_key}': {e}")
+        self._refresher = threading.Thread(target=refresh, name="app-config-refresh", daemon=True)
+        self._refresher.start()
+
+    def close(self):
+        """Stop the background refresh and close the App Configuration and Key Vault clients."""
+        self._stop_refresh.set()
+        if self._refresher:
+            self._refresher.join()
+        with self._secret_clients_lock:
+            for secret_client in self._secret_clients.values():
+                secret_client.close()
+            self._secret_clients.clear()
+        self.app_config_client.close()
+
 
 if __name__ == "__main__":
     # Load the App Configuration URL from environment variables
@@ -93,10 +280,12 @@ if __name__ == "__main__":
     # Example keys to fetch
     keys_to_fetch = ["ServiceBusConnectionString", "EventHubConnectionString"]
 
-    # Fetch configuration values for each key
+    # Fetch configuration values for each key; the first fetch bulk-loads them all
     for key in keys_to_fetch:
         value = config_client.fetch_configuration_value(key)
         if value:
             print(f"{key}: {value}")
         else:
             print(f"Failed to fetch value for key: {key}")
+
+    config_client.close()
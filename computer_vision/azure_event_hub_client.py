@@ -1,24 +1,61 @@
+import asyncio
 import logging
 import os
+import time
 from azure.eventhub import EventHubConsumerClient, EventData
+from azure.eventhub.aio import EventHubConsumerClient as AsyncEventHubConsumerClient
 from dotenv import load_dotenv
 
-from azure_app_config_client import AppConfigClient
+from metrics import CHECKPOINTS, EVENTS
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
 
+class _CheckpointPolicy:
+    """Per-partition bookkeeping deciding when a batch's last event is due for a checkpoint."""
+
+    def __init__(self, checkpoint_every: int = 1, checkpoint_interval: float = None):
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        # partition id -> (batches since checkpoint, last checkpoint time, last unacknowledged event)
+        self._pending = {}
+
+    def record(self, partition_id, events):
+        """Account for a received batch; return the event to checkpoint now, or None."""
+        batches, last_checkpoint, last_event = self._pending.get(partition_id, (0, time.monotonic(), None))
+        if events:
+            batches, last_event = batches + 1, events[-1]
+
+        due = None
+        if last_event is not None:
+            now = time.monotonic()
+            if self.checkpoint_interval is not None:
+                is_due = now - last_checkpoint >= self.checkpoint_interval
+            else:
+                is_due = batches >= self.checkpoint_every
+            if is_due:
+                due = last_event
+                batches, last_checkpoint, last_event = 0, now, None
+        self._pending[partition_id] = (batches, last_checkpoint, last_event)
+        return due
+
+    def pop(self, partition_id):
+        """Forget a partition; return its event still awaiting a checkpoint, if any."""
+        return self._pending.pop(partition_id, (0, 0, None))[2]
+
+
 class AzureEventHubClient:
     """A Client for receiving messages from an Azure Event Hub."""
 
-    def __init__(self, connection_string: str, event_hub_name: str, consumer_group: str = "$Default"):
+    def __init__(self, connection_string: str, event_hub_name: str, consumer_group: str = "$Default", checkpoint_store=None):
         """
         Initialize the Event Hub client.
 
         :param connection_string: The connection string for the Event Hub.
         :param event_hub_name: The name of the Event Hub.
         :param consumer_group: The consumer group to listen on (default is "$Default").
+        :param checkpoint_store: Optional CheckpointStore persisting checkpoints (see checkpoint_store).
         """
         self.connection_string = connection_string
         self.event_hub_name = event_hub_name
@@ -26,7 +63,8 @@ class AzureEventHubClient:
         self.client = EventHubConsumerClient.from_connection_string(
             conn_str=connection_string,
             consumer_group=consumer_group,
-            eventhub_name=event_hub_name
+            eventhub_name=event_hub_name,
+            checkpoint_store=checkpoint_store
         )
         logging.info("Azure Event Hub Client initialized.")
 
@@ -49,6 +87,54 @@ class AzureEventHubClient:
         finally:
             self.close()
 
+    def receive_batches(self, on_batch_callback, max_batch_size: int = 64, max_wait_time: float = 1.0,
+                        checkpoint_every: int = 1, checkpoint_interval: float = None):
+        """
+        Start receiving events in batches, checkpointing once per batch or time interval.
+
+        :param on_batch_callback: A callback ``on_batch_callback(partition_context, events)`` processing each batch.
+        :param max_batch_size: Maximum number of events per batch.
+        :param max_wait_time: Seconds to wait for a batch to fill before delivering what has arrived.
+        :param checkpoint_every: Write a checkpoint after this many non-empty batches per partition.
+        :param checkpoint_interval: If set, write a checkpoint at most once per this many seconds per partition instead.
+        """
+        checkpoints = _CheckpointPolicy(checkpoint_every, checkpoint_interval)
+
+        def on_event_batch(partition_context, events):
+            if events:
+                EVENTS.labels(partition_context.partition_id).inc(len(events))
+                on_batch_callback(partition_context, events)
+            due = checkpoints.record(partition_context.partition_id, events)
+            if due is not None:
+                partition_context.update_checkpoint(due)
+                CHECKPOINTS.labels(partition_context.partition_id).inc()
+
+        def on_partition_close(partition_context, reason):
+            # Don't lose progress made since the last amortized checkpoint
+            last_event = checkpoints.pop(partition_context.partition_id)
+            if last_event is not None:
+                try:
+                    partition_context.update_checkpoint(last_event)
+                    CHECKPOINTS.labels(partition_context.partition_id).inc()
+                except Exception as e:
+                    logging.error(f"Error checkpointing partition {partition_context.partition_id} on close: {e}")
+
+        try:
+            logging.info(f"Listening for event batches from Azure Event Hub (max {max_batch_size}, wait {max_wait_time}s)...")
+            self.client.receive_batch(
+                on_event_batch=on_event_batch,
+                max_batch_size=max_batch_size,
+                max_wait_time=max_wait_time,
+                on_partition_close=on_partition_close,
+                starting_position="-1"  # Read from the beginning of the stream
+            )
+        except KeyboardInterrupt:
+            logging.info("Event Hub listener stopped by user.")
+        except Exception as e:
+            logging.error(f"Error receiving events: {e}")
+        finally:
+            self.close()
+
     def close(self):
         """Close the Event Hub client."""
         if self.client:
@@ -56,11 +142,111 @@ class AzureEventHubClient:
             logging.info("Azure Event Hub Client closed.")
 
 
+class AsyncAzureEventHubClient:
+    """
+    Event Hub client on azure.eventhub.aio that receives every owned partition independently.
+
+    The aio consumer runs one task per partition; each batch is handed to the callback on a
+    worker thread, so a partition whose batch is slow to process (e.g. blocked on a full frame
+    queue) never holds up the others. ``receive_batches`` has the same contract as
+    AzureEventHubClient's and blocks until the client is closed.
+    """
+
+    def __init__(self, connection_string: str, event_hub_name: str, consumer_group: str = "$Default", checkpoint_store=None):
+        """
+        :param connection_string: The connection string for the Event Hub.
+        :param event_hub_name: The name of the Event Hub.
+        :param consumer_group: The consumer group to listen on (default is "$Default").
+        :param checkpoint_store: Optional azure.eventhub.aio CheckpointStore (see checkpoint_store.create_checkpoint_store).
+        """
+        self.connection_string = connection_string
+        self.event_hub_name = event_hub_name
+        self.consumer_group = consumer_group
+        self.checkpoint_store = checkpoint_store
+        self.client = None
+        self._loop = None
+
+    def receive_batches(self, on_batch_callback, max_batch_size: int = 64, max_wait_time: float = 1.0,
+                        checkpoint_every: int = 1, checkpoint_interval: float = None):
+        """
+        Receive events in batches on an event loop of its own, checkpointing once per batch or time interval.
+
+        :param on_batch_callback: A callback ``on_batch_callback(partition_context, events)``, run on a worker thread.
+        :param max_batch_size: Maximum number of events per batch.
+        :param max_wait_time: Seconds to wait for a batch to fill before delivering what has arrived.
+        :param checkpoint_every: Write a checkpoint after this many non-empty batches per partition.
+        :param checkpoint_interval: If set, write a checkpoint at most once per this many seconds per partition instead.
+        """
+        try:
+            asyncio.run(self._receive_batches(on_batch_callback, max_batch_size, max_wait_time,
+                                              checkpoint_every, checkpoint_interval))
+        except KeyboardInterrupt:
+            logging.info("Event Hub listener stopped by user.")
+        except Exception as e:
+            logging.error(f"Error receiving events: {e}")
+
+    async def _receive_batches(self, on_batch_callback, max_batch_size, max_wait_time, checkpoint_every,
+                               checkpoint_interval):
+        checkpoints = _CheckpointPolicy(checkpoint_every, checkpoint_interval)
+
+        async def on_event_batch(partition_context, events):
+            if events:
+                EVENTS.labels(partition_context.partition_id).inc(len(events))
+                await asyncio.to_thread(on_batch_callback, partition_context, events)
+            due = checkpoints.record(partition_context.partition_id, events)
+            if due is not None:
+                await partition_context.update_checkpoint(due)
+                CHECKPOINTS.labels(partition_context.partition_id).inc()
+
+        async def on_partition_close(partition_context, reason):
+            # Don't lose progress made since the last amortized checkpoint
+            last_event = checkpoints.pop(partition_context.partition_id)
+            if last_event is not None:
+                try:
+                    await partition_context.update_checkpoint(last_event)
+                    CHECKPOINTS.labels(partition_context.partition_id).inc()
+                except Exception as e:
+                    logging.error(f"Error checkpointing partition {partition_context.partition_id} on close: {e}")
+
+        self._loop = asyncio.get_running_loop()
+        self.client = AsyncEventHubConsumerClient.from_connection_string(
+            conn_str=self.connection_string,
+            consumer_group=self.consumer_group,
+            eventhub_name=self.event_hub_name,
+            checkpoint_store=self.checkpoint_store
+        )
+        logging.info(f"Listening for event batches from Azure Event Hub, one task per partition "
+                     f"(max {max_batch_size}, wait {max_wait_time}s)...")
+        try:
+            async with self.client:
+                await self.client.receive_batch(
+                    on_event_batch=on_event_batch,
+                    max_batch_size=max_batch_size,
+                    max_wait_time=max_wait_time,
+                    on_partition_close=on_partition_close,
+                    starting_position="-1"  # Read from the beginning of the stream
+                )
+        finally:
+            self._loop = None
+            logging.info("Azure Event Hub Client closed.")
+
+    def close(self):
+        """Stop receiving; safe to call from any thread, and a no-op once receiving has ended."""
+        loop, client = self._loop, self.client
+        if loop is not None and client is not None and not loop.is_closed():
+            try:
+                asyncio.run_coroutine_threadsafe(client.close(), loop).result(timeout=30)
+            except RuntimeError:
+                pass  # The loop finished meanwhile
+
+
 # Test the Event Hub Client
 if __name__ == "__main__":
     # Load environment variables from .env
     load_dotenv()
 
+    from azure_app_config_client import AppConfigClient
+
     # Fetch the Event Hub connection details from Azure App Configuration
     config_client = AppConfigClient(os.getenv('APP_CONFIG_URL'))
     event_hub_connection_string = config_client.fetch_configuration_value("EventHubConnectionString")
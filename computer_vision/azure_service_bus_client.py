@@ -1,14 +1,152 @@
 import logging
 import os
+import queue
+import threading
+import time
 
 from azure.servicebus import ServiceBusClient, ServiceBusMessage
+from azure.servicebus.exceptions import MessageSizeExceededError
 
-from azure_app_config_client import AppConfigClient
+from metrics import MESSAGES
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
 
+class ServiceBusBatchSender:
+    """
+    Buffers messages for one queue and sends them from a background thread as
+    ServiceBusMessageBatch objects over a single long-lived sender.
+
+    A batch is flushed once ``max_batch_messages`` are buffered or the oldest buffered
+    message has waited ``max_delay`` seconds; failed sends are retried with backoff and
+    everything still buffered is flushed on ``close``.
+    """
+
+    def __init__(self, sender, queue_name: str, max_delay: float = 0.2, max_batch_messages: int = 100,
+                 max_buffered: int = 10000, max_retries: int = 3, retry_backoff: float = 0.5):
+        """
+        :param sender: A ServiceBusSender for the queue, owned by this object from now on.
+        :param queue_name: Name of the queue, for logging.
+        :param max_delay: Maximum seconds a message waits in the buffer before its batch is sent.
+        :param max_batch_messages: Flush as soon as this many messages are buffered.
+        :param max_buffered: Bound of the buffer; ``send`` blocks (up to its timeout) when it is full.
+        :param max_retries: Send attempts per batch beyond the first.
+        :param retry_backoff: Initial retry delay in seconds, doubled on each attempt.
+        """
+        self.sender = sender
+        self.queue_name = queue_name
+        self.max_delay = max_delay
+        self.max_batch_messages = max_batch_messages
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self._buffer = queue.Queue(maxsize=max_buffered)
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._run, name=f"servicebus-{queue_name}", daemon=True)
+        self._flusher.start()
+
+    def _count(self, outcome: str, count: int = 1):
+        setattr(self, outcome, getattr(self, outcome) + count)
+        MESSAGES.labels(self.queue_name, outcome).inc(count)
+
+    def send(self, message_content: str, session_id: str = None, timeout: float = 1.0) -> bool:
+        """
+        Buffer a message for the next batch without waiting for the network.
+
+        :return: False if the sender is closed or the buffer stayed full for ``timeout`` seconds.
+        """
+        if self._closed.is_set():
+            self._count("dropped")
+            return False
+        try:
+            self._buffer.put((time.monotonic(), message_content, session_id), timeout=timeout)
+            return True
+        except queue.Full:
+            self._count("dropped")
+            logging.error(f"Service Bus buffer for queue '{self.queue_name}' is full; dropping message.")
+            return False
+
+    def _collect(self):
+        """Wait for the first message, then gather more until the batch is full or its delay has passed."""
+        try:
+            first = self._buffer.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        pending = [first]
+        deadline = first[0] + self.max_delay
+        while len(pending) < self.max_batch_messages:
+            remaining = deadline - time.monotonic()
+            try:
+                pending.append(self._buffer.get(timeout=remaining) if remaining > 0 else self._buffer.get_nowait())
+            except queue.Empty:
+                break
+        return pending
+
+    def _send_with_retry(self, batch, count):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.sender.send_messages(batch)
+                self._count("sent", count)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self._count("failed", count)
+                    logging.error(f"Failed to send {count} messages to queue '{self.queue_name}': {e}")
+                    return
+                logging.warning(f"Retrying send of {count} messages to queue '{self.queue_name}': {e}")
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def _flush(self, pending):
+        # Messages with different session IDs can land on different partitions, so batch them separately
+        sessions = {}
+        for _, message_content, session_id in pending:
+            sessions.setdefault(session_id, []).append(message_content)
+
+        for session_id, contents in sessions.items():
+            batch, count = self.sender.create_message_batch(), 0
+            for message_content in contents:
+                message = ServiceBusMessage(message_content, session_id=session_id)
+                while True:
+                    try:
+                        batch.add_message(message)
+                        count += 1
+                        break
+                    except MessageSizeExceededError:
+                        if count == 0:
+                            # Too large even alone in an empty batch
+                            self._count("failed")
+                            logging.error(f"Message too large for a batch on queue '{self.queue_name}'; dropping it.")
+                            break
+                        # Send the full batch and retry the message in a fresh one
+                        self._send_with_retry(batch, count)
+                        batch, count = self.sender.create_message_batch(), 0
+            if count:
+                self._send_with_retry(batch, count)
+        logging.debug(f"Flushed {len(pending)} messages to queue '{self.queue_name}'.")
+
+    def _run(self):
+        while not self._closed.is_set() or not self._buffer.empty():
+            pending = self._collect()
+            if pending:
+                try:
+                    self._flush(pending)
+                except Exception as e:
+                    self._count("failed", len(pending))
+                    logging.error(f"Error flushing messages to queue '{self.queue_name}': {e}")
+
+    def close(self):
+        """Stop accepting messages, flush everything buffered and close the sender."""
+        self._closed.set()
+        self._flusher.join()
+        self.sender.close()
+        logging.info(f"Service Bus sender for queue '{self.queue_name}' closed "
+                     f"(sent {self.sent}, failed {self.failed}, dropped {self.dropped}).")
+
+
 class AzureServiceBusClient:
     """A Service Bus Client that can send messages to a queue or topic."""
 
@@ -18,21 +156,60 @@ class AzureServiceBusClient:
         """
         self.connection_string = connection_string
         self.client = ServiceBusClient.from_connection_string(connection_string)
+        self._queue_senders = {}
+        self._batch_senders = {}
+        self._senders_lock = threading.Lock()
+        self._closed = False
         logging.info("Azure Service Bus Client initialized.")
 
+    def _queue_sender(self, queue_name: str):
+        """Return the long-lived sender (and its lock) for a queue, opening it on first use."""
+        with self._senders_lock:
+            if self._closed:
+                raise RuntimeError("Azure Service Bus Client is closed.")
+            if queue_name not in self._queue_senders:
+                self._queue_senders[queue_name] = (self.client.get_queue_sender(queue_name), threading.Lock())
+            return self._queue_senders[queue_name]
+
     def send_message_to_queue(self, queue_name: str, message_content: str, session_id: str = None):
         """
-        Send a message to the specified queue.
+        Send a message to the specified queue and wait for it to be accepted.
         """
         try:
-            with self.client.get_queue_sender(queue_name) as sender:
+            sender, sender_lock = self._queue_sender(queue_name)
+            with sender_lock:
                 # Set the SessionId if provided
                 message = ServiceBusMessage(message_content, session_id=session_id)
                 sender.send_messages(message)
-                logging.info(f"Message sent to queue '{queue_name}' with SessionId '{session_id}': {message_content}")
+            logging.debug(f"Message sent to queue '{queue_name}' with SessionId '{session_id}': {message_content}")
         except Exception as e:
             logging.error(f"Failed to send message to queue '{queue_name}': {e}")
 
+    def get_batch_sender(self, queue_name: str, **options) -> ServiceBusBatchSender:
+        """
+        Return the shared batching sender for a queue, creating it on first use.
+
+        :param options: ServiceBusBatchSender options, applied when the sender is created.
+        :raises RuntimeError: If the client has been closed.
+        """
+        with self._senders_lock:
+            if self._closed:
+                raise RuntimeError("Azure Service Bus Client is closed.")
+            if queue_name not in self._batch_senders:
+                self._batch_senders[queue_name] = ServiceBusBatchSender(
+                    self.client.get_queue_sender(queue_name), queue_name, **options
+                )
+            return self._batch_senders[queue_name]
+
+    def enqueue_message_to_queue(self, queue_name: str, message_content: str, session_id: str = None) -> bool:
+        """
+        Buffer a message for the queue's background batching sender and return immediately.
+
+        :return: False if the message could not be buffered.
+        :raises RuntimeError: If the client has been closed.
+        """
+        return self.get_batch_sender(queue_name).send(message_content, session_id)
+
     def send_message_to_topic(self, topic_name: str, message_content: str, session_id: str = None):
         """
         Send a message to the specified topic.
@@ -42,18 +219,28 @@ class AzureServiceBusClient:
                 # Set the SessionId if provided
                 message = ServiceBusMessage(message_content, session_id=session_id)
                 sender.send_messages(message)
-                logging.info(f"Message sent to topic '{topic_name}' with SessionId '{session_id}': {message_content}")
+                logging.debug(f"Message sent to topic '{topic_name}' with SessionId '{session_id}': {message_content}")
         except Exception as e:
             logging.error(f"Failed to send message to topic '{topic_name}': {e}")
 
     def close(self):
-        """Close the Service Bus Client."""
+        """Flush buffered messages, close all senders and the Service Bus Client."""
+        with self._senders_lock:
+            self._closed = True
+            for batch_sender in self._batch_senders.values():
+                batch_sender.close()
+            for sender, _ in self._queue_senders.values():
+                sender.close()
+            self._batch_senders.clear()
+            self._queue_senders.clear()
         self.client.close()
         logging.info("Azure Service Bus Client closed.")
 
 
 
 if __name__ == "__main__":
+    from azure_app_config_client import AppConfigClient
+
     # Fetch the connection string from the .env file
     config_client = AppConfigClient(os.getenv('APP_CONFIG_URL'))
     service_bus_connection_string = config_client.fetch_configuration_value("ServiceBusConnectionString")
@@ -67,8 +254,8 @@ if __name__ == "__main__":
     service_bus_client = AzureServiceBusClient(service_bus_connection_string)
 
     # Example usage: Sending a message to a queue
-    queue = "sg-video-service"
-    service_bus_client.send_message_to_queue(queue, "Hello, Queue!", None)
+    queue_name = "sg-video-service"
+    service_bus_client.send_message_to_queue(queue_name, "Hello, Queue!", None)
 
     # Example usage: Sending a message to a topic
     # topic = "my-topic"
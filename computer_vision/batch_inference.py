@@ -0,0 +1,209 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import BATCH_SIZE
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+
+class MicroBatcher:
+    """Collects items submitted from many threads and runs them through one batched call.
+
+    A batch is flushed as soon as it holds ``max_batch_size`` items or the oldest
+    item in it has waited ``max_latency`` seconds, whichever comes first.
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = 8, max_latency: float = 0.02, name: str = "micro-batcher"):
+        """
+        Initialize the micro-batcher.
+
+        :param batch_fn: Callable taking a list of items and returning a list of results in the same order.
+        :param max_batch_size: Maximum number of items passed to ``batch_fn`` at once.
+        :param max_latency: Maximum time in seconds an item may wait for its batch to fill.
+        :param name: Name of the background worker thread.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        # Held while checking for close and queueing, so nothing is queued after the worker may have exited
+        self._submit_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item) -> Future:
+        """
+        Queue an item for the next batch.
+
+        :param item: The item to process.
+        :return: A future resolved with the item's result.
+        """
+        future = Future()
+        with self._submit_lock:
+            if self._stopped.is_set():
+                raise RuntimeError(f"{self.name} is closed.")
+            self._queue.put((time.monotonic(), item, future))
+        return future
+
+    def __call__(self, item):
+        """Submit an item and block until its result is available."""
+        return self.submit(item).result()
+
+    @property
+    def average_batch_size(self) -> float:
+        """Average number of items per flushed batch."""
+        return self.items / self.batches if self.batches else 0.0
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or its deadline passes."""
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = first[0] + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        """Run one batch and hand each result back to its future."""
+        pending = [(item, future) for _, item, future in batch if future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+        items = [item for item, _ in pending]
+        futures = [future for _, future in pending]
+
+        try:
+            results = list(self.batch_fn(items))
+            if len(results) != len(items):
+                raise RuntimeError(f"{self.name} batch function returned {len(results)} results for {len(items)} items.")
+        except Exception as e:
+            logging.error(f"{self.name} batch of {len(items)} failed: {e}")
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.items += len(items)
+        BATCH_SIZE.labels(self.name).observe(len(items))
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def _run(self):
+        while not self._stopped.is_set() or not self._queue.empty():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def close(self):
+        """Stop accepting items, flush what is queued and stop the worker thread."""
+        with self._submit_lock:
+            self._stopped.set()
+        self._worker.join()
+        logging.info(f"{self.name} closed after {self.batches} batches (avg size {self.average_batch_size:.2f}).")
+
+
+class BatchedDetector:
+    """Shares one detector between cameras by micro-batching their frames."""
+
+    def __init__(self, detector, max_batch_size: int = 8, max_latency: float = 0.02):
+        """
+        Initialize the batched detector wrapper.
+
+        :param detector: A detectors.Detector.
+        :param max_batch_size: Maximum number of frames per ``detect`` call on the wrapped detector.
+        :param max_latency: Maximum time in seconds a frame may wait for its batch to fill.
+        """
+        self.detector = detector
+        self.batcher = MicroBatcher(detector.detect, max_batch_size, max_latency, name="detector-batcher")
+
+    def detect(self, frames):
+        """Same contract as ``Detector.detect``; the frames are batched together with other callers' frames."""
+        futures = [self.batcher.submit(frame) for frame in frames]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Flush pending frames and stop the batching worker; the wrapped detector stays open."""
+        self.batcher.close()
+
+
+class BatchedEmbedder:
+    """
+    Shares one appearance embedder between per-camera trackers by micro-batching their person crops.
+
+    Crops from every camera that arrive within ``max_latency`` of each other go through the re-ID
+    model in one call. Trackers are built with ``DeepSort(embedder=None)`` and receive the
+    embeddings through ``update_tracks(..., embeds=...)``.
+    """
+
+    def __init__(self, embedder, max_batch_size: int = 64, max_latency: float = 0.01):
+        """
+        :param embedder: A deep_sort_realtime embedder exposing ``predict(crops)``.
+        :param max_batch_size: Maximum number of crops per ``predict`` call.
+        :param max_latency: Maximum time in seconds a crop may wait for its batch to fill.
+        """
+        self.embedder = embedder
+        self.batcher = MicroBatcher(embedder.predict, max_batch_size, max_latency, name="embedder-batcher")
+
+    @staticmethod
+    def crop(frame, detections):
+        """
+        Crop DeepSort-style ((x, y, w, h), confidence, class) detections out of a frame, clipped to its bounds.
+
+        :return: (detections with a non-empty crop, their crops).
+        """
+        height, width = frame.shape[:2]
+        kept, crops = [], []
+        for detection in detections:
+            x, y, w, h = detection[0]
+            left, top = max(0, int(x)), max(0, int(y))
+            right, bottom = min(width, int(x) + int(w)), min(height, int(y) + int(h))
+            # An empty crop would fail the whole shared batch in the re-ID model
+            if right > left and bottom > top:
+                kept.append(detection)
+                crops.append(frame[top:bottom, left:right])
+        return kept, crops
+
+    def embed(self, frame, detections):
+        """
+        Embed detections in a batch shared with other cameras.
+
+        Detections without area inside the frame are dropped rather than embedded; DeepSort would
+        otherwise drop them only after receiving the embeddings, misaligning the two.
+
+        :return: (kept detections, one embedding per kept detection).
+        """
+        detections, crops = self.crop(frame, detections)
+        futures = [self.batcher.submit(crop) for crop in crops]
+        return detections, [future.result() for future in futures]
+
+    def close(self):
+        """Flush pending crops and stop the batching worker."""
+        self.batcher.close()
+
+
+def create_embedder(max_batch_size: int = 64, half: bool = True, gpu: bool = False):
+    """Build the MobileNetV2 re-ID embedder DeepSort uses by default, for sharing through BatchedEmbedder."""
+    from deep_sort_realtime.embedder.embedder_pytorch import MobileNetv2_Embedder
+
+    return MobileNetv2_Embedder(half=half, max_batch_size=max_batch_size, bgr=True, gpu=gpu)
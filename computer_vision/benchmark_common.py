@@ -0,0 +1,27 @@
+import argparse
+import json
+
+
+def benchmark_parser(description: str, embeddings: bool = False, seed: bool = False) -> argparse.ArgumentParser:
+    """
+    Argument parser with the options every benchmark script shares.
+
+    :param description: What the benchmark measures, shown in --help.
+    :param embeddings: Add ``--dim``, the size of synthetic re-ID embeddings.
+    :param seed: Add ``--seed`` for the random generator of synthetic inputs.
+    :return: A parser with ``--output``; scripts add their own options to it.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    if embeddings:
+        parser.add_argument("--dim", type=int, default=512, help="Embedding size (DeepSort's MobileNet embedder emits 1280).")
+    if seed:
+        parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON to this path.")
+    return parser
+
+
+def write_report(report, path: str = None):
+    """Write a benchmark report as JSON to path; does nothing without a path."""
+    if path:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
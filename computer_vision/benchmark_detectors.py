@@ -0,0 +1,132 @@
+import glob
+import time
+
+import cv2
+import numpy as np
+
+from benchmark_common import benchmark_parser, write_report
+from detectors import box_iou, create_detector
+
+
+def parse_spec(spec):
+    """'backend' or 'backend=weights' -> (backend, weights or None)."""
+    backend, _, weights = spec.partition("=")
+    return backend, weights or None
+
+
+def average_precision(reference, candidate, iou_threshold):
+    """AP of candidate detections against reference detections taken as ground truth (all-point interpolation)."""
+    scored = []  # (confidence, is_true_positive)
+    total = 0
+    for ref, cand in zip(reference, candidate):
+        total += len(ref)
+        if not len(cand):
+            continue
+        order = np.argsort(-cand[:, 4])
+        cand = cand[order]
+        taken = np.zeros(len(ref), dtype=bool)
+        iou = box_iou(cand[:, :4], ref[:, :4]) if len(ref) else np.zeros((len(cand), 0))
+        for i, row in enumerate(cand):
+            # Only boxes of the same class can match
+            candidates = np.where((ref[:, 5] == row[5]) & ~taken)[0] if len(ref) else []
+            best = candidates[np.argmax(iou[i, candidates])] if len(candidates) else None
+            hit = best is not None and iou[i, best] >= iou_threshold
+            if hit:
+                taken[best] = True
+            scored.append((row[4], hit))
+    if not total:
+        return 1.0 if not scored else 0.0
+    if not scored:
+        return 0.0
+
+    scored.sort(key=lambda item: -item[0])
+    hits = np.array([hit for _, hit in scored], dtype=np.float64)
+    true_positives = np.cumsum(hits)
+    recall = true_positives / total
+    precision = true_positives / np.arange(1, len(hits) + 1)
+    # Precision envelope, integrated over recall
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    recall = np.concatenate([[0.0], recall])
+    return float(np.sum((recall[1:] - recall[:-1]) * precision))
+
+
+def time_latency(detector, frames):
+    """Per-frame latency in milliseconds at batch size 1."""
+    latencies = []
+    for frame in frames:
+        started = time.perf_counter()
+        detector.detect([frame])
+        latencies.append((time.perf_counter() - started) * 1000)
+    return np.array(latencies)
+
+
+def time_throughput(detector, frames, batch):
+    """Frames per second at the given batch size, and the detections of every frame."""
+    detections = []
+    started = time.perf_counter()
+    for i in range(0, len(frames), batch):
+        detections.extend(detector.detect(frames[i:i + batch]))
+    return len(frames) / (time.perf_counter() - started), detections
+
+
+def run(specs, frames, batch, imgsz, conf, threads, warmup):
+    report = []
+    reference = None
+    for spec in specs:
+        backend, weights = parse_spec(spec)
+        options = {"imgsz": imgsz, "conf": conf, "classes": None}
+        if threads and backend != "ultralytics":
+            options["threads"] = threads
+        detector = create_detector(backend, weights, **options)
+        for frame in frames[:warmup]:
+            detector.detect([frame])
+
+        latencies = time_latency(detector, frames)
+        fps, detections = time_throughput(detector, frames, batch)
+        detector.close()
+
+        row = {
+            "backend": backend, "weights": weights or getattr(detector, "weights", None),
+            "latency_p50_ms": float(np.percentile(latencies, 50)),
+            "latency_p99_ms": float(np.percentile(latencies, 99)),
+            "throughput_fps": fps, "batch": batch,
+            "detections": int(sum(len(d) for d in detections)),
+        }
+        if reference is None:
+            # The first backend is the reference the others are scored against
+            reference = detections
+            row.update({"map50": 1.0, "map50_95": 1.0})
+        else:
+            thresholds = np.arange(0.5, 0.96, 0.05)
+            aps = [average_precision(reference, detections, t) for t in thresholds]
+            row.update({"map50": aps[0], "map50_95": float(np.mean(aps))})
+        report.append(row)
+    return report
+
+
+if __name__ == "__main__":
+    parser = benchmark_parser("Latency, throughput and mAP of detector backends, scored against the first backend.")
+    parser.add_argument("--backends", nargs="+", default=["ultralytics=yolov8n.pt", "onnx=yolov8n.onnx", "onnx=yolov8n-int8.onnx"],
+                        help="backend=weights specs; e.g. openvino=yolov8n-int8_openvino_model/yolov8n-int8.xml")
+    parser.add_argument("--frames", default="../unity/CapturedFrames/*.png", help="Glob of evaluation frames.")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=8, help="Frames per detect call for the throughput run.")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--threads", type=int, help="Inference threads for the ONNX Runtime / OpenVINO backends.")
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.frames))[:args.count]
+    frames = [frame for frame in (cv2.imread(path) for path in paths) if frame is not None]
+    if not frames:
+        raise SystemExit(f"No frames match {args.frames}.")
+
+    results = run(args.backends, frames, args.batch, args.imgsz, args.conf, args.threads, args.warmup)
+
+    print(f"{'backend':>12} {'weights':>36} {'p50 ms':>8} {'p99 ms':>8} {'fps':>8} {'mAP50':>6} {'mAP50-95':>9}")
+    for row in results:
+        print(f"{row['backend']:>12} {str(row['weights'])[-36:]:>36} {row['latency_p50_ms']:>8.1f} "
+              f"{row['latency_p99_ms']:>8.1f} {row['throughput_fps']:>8.1f} {row['map50']:>6.3f} {row['map50_95']:>9.3f}")
+
+    write_report(results, args.output)
@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+
+from benchmark_common import benchmark_parser, write_report
+from gallery_index import ExactIndex, create_index, normalize
+
+
+def make_gallery(size, dim, rng):
+    """Synthetic identities: unit vectors loosely clustered the way appearance embeddings are."""
+    clusters = normalize(rng.normal(size=(max(1, size // 50), dim)))
+    members = clusters[rng.integers(0, len(clusters), size)] + 0.6 * rng.normal(size=(size, dim)) / np.sqrt(dim) * 4
+    return normalize(members)
+
+
+def make_queries(gallery, count, noise, rng):
+    """Re-sightings of random gallery identities with some appearance noise."""
+    picks = rng.integers(0, len(gallery), count)
+    queries = gallery[picks] + noise * rng.normal(size=(count, gallery.shape[1])) / np.sqrt(gallery.shape[1])
+    return normalize(queries)
+
+
+def fill(index, gallery):
+    started = time.perf_counter()
+    for i, vector in enumerate(gallery):
+        index.upsert(i, vector)
+    return time.perf_counter() - started
+
+
+def time_search(index, queries, batch):
+    """Return per-query latency in microseconds and the top-1 keys."""
+    keys = []
+    started = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        found, _ = index.search(queries[i:i + batch], k=1)
+        keys.extend(row[0] if row else None for row in found)
+    return (time.perf_counter() - started) / len(queries) * 1e6, keys
+
+
+def run(sizes, dim, queries_per_size, noise, batch, configs, seed):
+    rng = np.random.default_rng(seed)
+    report = []
+    for size in sizes:
+        gallery = make_gallery(size, dim, rng)
+        queries = make_queries(gallery, queries_per_size, noise, rng)
+
+        exact = ExactIndex()
+        fill(exact, gallery)
+        exact_us, truth = time_search(exact, queries, batch)
+        report.append({"size": size, "index": "exact", "recall@1": 1.0, "us_per_query": exact_us})
+
+        for config in configs:
+            options = dict(config)
+            kind = options.pop("kind")
+            index = create_index(kind, **options)
+            build_s = fill(index, gallery)
+            us, keys = time_search(index, queries, batch)
+            recall = float(np.mean([k == t for k, t in zip(keys, truth)]))
+            report.append({
+                "size": size, "index": kind, **options,
+                "recall@1": recall, "us_per_query": us, "build_s": build_s,
+                "speedup": exact_us / us if us else float("inf"),
+            })
+    return report
+
+
+if __name__ == "__main__":
+    parser = benchmark_parser("Recall vs. latency of gallery indexes against the exact matcher.", embeddings=True, seed=True)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 10000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.5)
+    parser.add_argument("--batch", type=int, default=1, help="Queries per search call.")
+    parser.add_argument("--nlist", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--faiss", action="store_true", help="Also benchmark the faiss backend.")
+    args = parser.parse_args()
+
+    configs = [
+        {"kind": "ivf", "nlist": nlist, "nprobe": nprobe, "train_size": min(args.sizes)}
+        for nlist in args.nlist for nprobe in args.nprobe if nprobe <= nlist
+    ]
+    if args.faiss:
+        configs.append({"kind": "faiss", "nlist": None})
+        configs.extend({"kind": "faiss", "nlist": nlist, "nprobe": nprobe, "train_size": min(args.sizes)}
+                       for nlist in args.nlist for nprobe in args.nprobe if nprobe <= nlist)
+
+    results = run(args.sizes, args.dim, args.queries, args.noise, args.batch, configs, args.seed)
+
+    print(f"{'size':>7} {'index':>6} {'nlist':>6} {'nprobe':>6} {'recall@1':>9} {'us/query':>10} {'speedup':>8}")
+    for row in results:
+        print(f"{row['size']:>7} {row['index']:>6} {str(row.get('nlist', '-')):>6} {str(row.get('nprobe', '-')):>6} "
+              f"{row['recall@1']:>9.3f} {row['us_per_query']:>10.1f} {row.get('speedup', 1.0):>8.2f}")
+
+    write_report(results, args.output)
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark_common import benchmark_parser, write_report
+from benchmark_gallery_index import make_gallery
+from gallery_snapshot import GallerySnapshotter
+from global_tracker import GlobalTracker
+
+
+def populate(tracker, gallery, sources, cameras, rng):
+    """Create one global identity per gallery row, spread over sources and cameras."""
+    source_ids = rng.integers(0, sources, len(gallery))
+    camera_ids = rng.integers(0, cameras, len(gallery))
+    for start in range(0, len(gallery), 256):
+        for source in range(sources):
+            rows = np.flatnonzero(source_ids[start:start + 256] == source) + start
+            if len(rows):
+                # A threshold of 0 never matches, so every row becomes a new identity
+                tracker.match_batch(f"store-{source}", f"camera-{camera_ids[rows[0]]}", list(gallery[rows]))
+
+
+def resight(tracker, fraction, rng):
+    """Match a fraction of the identities again with their own embeddings, marking them changed."""
+    tracker.threshold = 0.5
+    tracks = tracker.global_tracks
+    picks = rng.choice(list(tracks), max(1, int(len(tracks) * fraction)), replace=False)
+    for global_id in picks:
+        track = tracks[global_id]
+        tracker.match_batch(track.source_id, "camera-0", [track.features])
+    return len(picks)
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def run(sizes, dim, dirty_fraction, sources, seed, directory):
+    rng = np.random.default_rng(seed)
+    report = []
+    for size in sizes:
+        target = os.path.join(directory, f"gallery-{size}")
+        shutil.rmtree(target, ignore_errors=True)
+        tracker = GlobalTracker(threshold=0.0, timeout=3600, shard_by_source=True)
+        snapshotter = GallerySnapshotter(tracker, target)
+        populate(tracker, make_gallery(size, dim, rng), sources, 8, rng)
+
+        started = time.perf_counter()
+        snapshotter.snapshot()
+        full_s, full_pause = time.perf_counter() - started, snapshotter.last_pause
+
+        dirty = resight(tracker, dirty_fraction, rng)
+        started = time.perf_counter()
+        snapshotter.snapshot()
+        incremental_s, incremental_pause = time.perf_counter() - started, snapshotter.last_pause
+        snapshotter.close()
+
+        restored_tracker = GlobalTracker(threshold=0.5, timeout=3600, shard_by_source=True)
+        started = time.perf_counter()
+        restored = GallerySnapshotter(restored_tracker, target).restore()
+        restore_s = time.perf_counter() - started
+        assert restored == size and len(restored_tracker) == size
+
+        report.append({
+            "identities": size, "dim": dim, "dirty": dirty,
+            "full_snapshot_s": full_s, "full_pause_ms": full_pause * 1e3,
+            "incremental_snapshot_s": incremental_s, "incremental_pause_ms": incremental_pause * 1e3,
+            "restore_s": restore_s, "disk_mb": directory_size(target) / 2 ** 20,
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = benchmark_parser("Snapshot overhead and restore time of the persisted gallery.", embeddings=True, seed=True)
+    parser.add_argument("--identities", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--dirty-fraction", type=float, default=0.05,
+                        help="Share of identities re-sighted between two incremental snapshots.")
+    parser.add_argument("--sources", type=int, default=4, help="Stores the identities are spread over.")
+    parser.add_argument("--dir", help="Directory for the snapshot files; defaults to a temporary directory.")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="gallery-snapshot-")
+    try:
+        results = run(args.identities, args.dim, args.dirty_fraction, args.sources, args.seed, directory)
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"{'ids':>7} {'dirty':>6} {'full s':>8} {'pause ms':>9} {'incr s':>8} {'pause ms':>9} {'restore s':>10} {'disk MB':>8}")
+    for row in results:
+        print(f"{row['identities']:>7} {row['dirty']:>6} {row['full_snapshot_s']:>8.3f} {row['full_pause_ms']:>9.2f} "
+              f"{row['incremental_snapshot_s']:>8.3f} {row['incremental_pause_ms']:>9.2f} {row['restore_s']:>10.3f} "
+              f"{row['disk_mb']:>8.1f}")
+
+    write_report(results, args.output)
@@ -0,0 +1,289 @@
+import collections
+import contextlib
+import datetime
+import glob
+import json
+import mmap
+import os
+import re
+import subprocess
+import threading
+import time
+
+import numpy as np
+from deep_sort_realtime.deepsort_tracker import DeepSort
+
+from benchmark_common import benchmark_parser, write_report
+from batch_inference import BatchedDetector, BatchedEmbedder, create_embedder
+from detectors import create_detector
+from frame_decoding import decode_for_detector
+from frame_envelope import encode_frame_envelope
+from global_tracker import GlobalTracker
+from video_processing_service import VideoProcessingService
+
+STAGES = ("decode", "detect", "track", "global_match", "publish")
+
+
+class StageTimings:
+    """Thread-safe collection of per-stage durations, pluggable as a VideoProcessingService stage_timer."""
+
+    def __init__(self):
+        self.samples = collections.defaultdict(list)
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            # list.append is atomic, so camera threads can share one instance
+            self.samples[stage].append(time.perf_counter() - started)
+
+    def summary(self):
+        report = {}
+        for stage in STAGES + tuple(sorted(set(self.samples) - set(STAGES))):
+            values = np.array(self.samples.get(stage, ())) * 1000
+            if not len(values):
+                continue
+            report[stage] = {
+                "count": int(len(values)),
+                "mean_ms": float(values.mean()),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p90_ms": float(np.percentile(values, 90)),
+                "p99_ms": float(np.percentile(values, 99)),
+                "max_ms": float(values.max()),
+                "total_s": float(values.sum() / 1000),
+            }
+        return report
+
+
+class FakeServiceBusClient:
+    """Offline stand-in for AzureServiceBusClient that only counts and keeps the messages."""
+
+    def __init__(self):
+        self.messages = collections.defaultdict(list)
+
+    def enqueue_message_to_queue(self, queue_name, message_content, session_id=None):
+        self.messages[queue_name].append(message_content)
+        return True
+
+    def send_message_to_queue(self, queue_name, message_content, session_id=None):
+        self.messages[queue_name].append(message_content)
+
+    def close(self):
+        pass
+
+
+class _FakePartitionContext:
+    def __init__(self, partition_id):
+        self.partition_id = partition_id
+        self.checkpoints = 0
+
+    def update_checkpoint(self, event=None):
+        self.checkpoints += 1
+
+
+class _FakeEvent:
+    def __init__(self, body, sequence_number):
+        self.body = body
+        self.sequence_number = sequence_number
+
+
+class FakeEventHubClient:
+    """Offline stand-in for AzureEventHubClient that replays prepared event bodies in batches, then returns."""
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.partition = _FakePartitionContext("0")
+
+    def receive_batches(self, on_batch_callback, max_batch_size: int = 64, **kwargs):
+        for start in range(0, len(self.bodies), max_batch_size):
+            events = [_FakeEvent(body, start + i) for i, body in enumerate(self.bodies[start:start + max_batch_size])]
+            on_batch_callback(self.partition, events)
+            self.partition.update_checkpoint(events[-1])
+
+    def close(self):
+        pass
+
+
+def discover_cameras(frame_directory):
+    """Camera names with captured frames in a directory, from camera_<name>_frame_<n>.png file names."""
+    names = set()
+    for path in glob.glob(os.path.join(frame_directory, "camera_*_frame_*.png")):
+        match = re.match(r"camera_(.+)_frame_", os.path.basename(path))
+        if match:
+            names.add(match.group(1))
+    return sorted(names)
+
+
+def load_frames(paths, mode, opened):
+    """
+    Encoded frames for one camera.
+
+    :param mode: "disk" reads each file while replaying, "preload" reads everything into memory
+        up front and "mmap" maps the files so decode reads straight from the page cache.
+    :param opened: List collecting mmaps to close after the run.
+    """
+    if mode == "disk":
+        return ((path, np.fromfile(path, np.uint8)) for path in paths)
+    frames = []
+    for path in paths:
+        with open(path, "rb") as f:
+            if mode == "mmap":
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                opened.append(mapped)
+                frames.append((path, mapped))
+            else:
+                frames.append((path, f.read()))
+    return frames
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    recorded = discover_cameras(args.frames_dir)
+    if not recorded:
+        raise SystemExit(f"No camera_<name>_frame_*.png files in {args.frames_dir}.")
+    # Cameras beyond the recorded ones replay a recorded camera's frames under another name
+    cameras = [(recorded[i % len(recorded)] if i < len(recorded) else f"{recorded[i % len(recorded)]}-{i // len(recorded)}",
+                recorded[i % len(recorded)]) for i in range(args.cameras or len(recorded))]
+
+    opened = []
+    paths = {name: VideoProcessingService.capture_frame_files(args.frames_dir, source)[:args.max_frames]
+             for name, source in cameras}
+    frames = {name: load_frames(camera_paths, args.load, opened) for name, camera_paths in paths.items()}
+
+    detector = create_detector(args.backend, args.weights, imgsz=args.imgsz)
+    shared_detector = BatchedDetector(detector, max_batch_size=args.batch or len(cameras), max_latency=args.batch_latency_ms / 1000)
+    embedder = BatchedEmbedder(create_embedder(args.embedder_batch), args.embedder_batch) if args.shared_embedder else None
+    global_tracker = GlobalTracker()
+    service_bus = FakeServiceBusClient()
+    timings = StageTimings()
+
+    def new_tracker():
+        return DeepSort(max_age=30, embedder=None) if embedder else DeepSort(max_age=30)
+
+    def make_service():
+        service = VideoProcessingService(
+            shared_detector, None, global_tracker, service_bus, "benchmark",
+            detector_imgsz=args.imgsz if args.reduced_decode else None, embedder=embedder,
+            publish_tracks=True, stage_timer=timings, tracker_factory=new_tracker
+        )
+        service.source_id = "benchmark"
+        return service
+
+    # Warm the detector up outside the measured run
+    for _, data in load_frames(next(iter(paths.values()))[:2], "preload", opened):
+        detector.detect([decode_for_detector(data, args.imgsz if args.reduced_decode else None)[0]])
+
+    per_camera = {}
+    if args.source == "capture":
+        def replay(camera_name):
+            camera_started = time.perf_counter()
+            count = make_service().replay_frames(frames[camera_name], camera_name, display=False)
+            elapsed = time.perf_counter() - camera_started
+            per_camera[camera_name] = {"frames": count, "seconds": elapsed, "fps": count / elapsed if elapsed else 0.0}
+
+        threads = [threading.Thread(target=replay, args=(name,)) for name, _ in cameras]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total_frames = sum(camera["frames"] for camera in per_camera.values())
+    else:
+        # Interleave the cameras' frames into one partition, the way the producer publishes them
+        loaded = {name: load_frames(camera_paths, "preload", opened) for name, camera_paths in paths.items()}
+        bodies = []
+        for index in range(max(len(camera_frames) for camera_frames in loaded.values())):
+            for name, camera_frames in loaded.items():
+                if index < len(camera_frames):
+                    bodies.append(encode_frame_envelope("benchmark", name, index, time.time(), camera_frames[index][1]))
+        service = make_service()
+        service.event_hub_client = FakeEventHubClient(bodies)
+        started = time.perf_counter()
+        service.run_event_hub_listener(decode_workers=args.decode_workers, queue_size=args.queue_size,
+                                       overflow_policy="block", max_batch_size=args.event_batch,
+                                       inference_workers=args.inference_workers)
+        total_frames = sum(stats["processed"] for stats in service.pipeline.stats().values())
+    elapsed = time.perf_counter() - started
+
+    shared_detector.close()
+    detector.close()
+    if embedder:
+        embedder.close()
+    # Drop every reference into the maps before unmapping them
+    frames.clear()
+    for mapped in opened:
+        mapped.close()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+        "config": vars(args),
+        "total": {"frames": total_frames, "seconds": elapsed, "fps": total_frames / elapsed if elapsed else 0.0},
+        "cameras": per_camera,
+        "stages": timings.summary(),
+        "global_identities": len(global_tracker.global_tracks),
+        "service_bus_messages": sum(len(messages) for messages in service_bus.messages.values()),
+    }
+
+
+def compare(report, baseline):
+    """Print FPS and per-stage p50/p99 changes relative to a baseline report."""
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"vs {baseline.get('commit')}: fps {baseline['total']['fps']:.2f} -> {report['total']['fps']:.2f} "
+          f"({change(report['total']['fps'], baseline['total']['fps'])})")
+    for stage, stats in report["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if old:
+            print(f"  {stage:>12} p50 {change(stats['p50_ms'], old['p50_ms']):>8}  p99 {change(stats['p99_ms'], old['p99_ms']):>8}")
+
+
+if __name__ == "__main__":
+    parser = benchmark_parser("Headless, offline replay of captured frames with per-stage timings.")
+    parser.add_argument("--frames-dir", default="../unity/CapturedFrames")
+    parser.add_argument("--cameras", type=int, help="Number of cameras to replay; extra cameras reuse recorded ones.")
+    parser.add_argument("--max-frames", type=int, help="Frames per camera.")
+    parser.add_argument("--load", choices=["preload", "mmap", "disk"], default="preload")
+    parser.add_argument("--source", choices=["capture", "eventhub"], default="capture",
+                        help="Replay through run_capture_frame's path, or as envelopes through a fake Event Hub "
+                             "(frames are always preloaded for the latter).")
+    parser.add_argument("--backend", default="ultralytics")
+    parser.add_argument("--weights")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--reduced-decode", action="store_true")
+    parser.add_argument("--batch", type=int, help="Detector batch size; defaults to the number of cameras.")
+    parser.add_argument("--batch-latency-ms", type=float, default=20)
+    parser.add_argument("--shared-embedder", action="store_true")
+    parser.add_argument("--embedder-batch", type=int, default=64)
+    parser.add_argument("--decode-workers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--event-batch", type=int, default=64)
+    parser.add_argument("--inference-workers", type=int, default=1,
+                        help="Inference threads of the Event Hub pipeline, each handling different cameras.")
+    parser.add_argument("--baseline", help="Earlier report to compare against.")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    total = report["total"]
+    print(f"{total['frames']} frames in {total['seconds']:.2f}s: {total['fps']:.2f} fps")
+    print(f"{'stage':>12} {'count':>7} {'mean ms':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:>12} {stats['count']:>7} {stats['mean_ms']:>8.2f} {stats['p50_ms']:>8.2f} "
+              f"{stats['p90_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+    write_report(report, args.output)
@@ -0,0 +1,127 @@
+import glob
+import time
+
+import cv2
+import numpy as np
+
+from benchmark_common import benchmark_parser, write_report
+from detectors import PERSON, box_iou, create_detector
+from frame_decoding import REDUCED_COLOR_FLAGS, decode_for_detector, image_size, reduction_factor
+
+
+def load_frames(pattern, count, resolution, quality, seed):
+    """Encoded frames from files matching the pattern, or synthetic JPEGs at the given resolution."""
+    paths = sorted(glob.glob(pattern))[:count] if pattern else []
+    if paths:
+        return [np.fromfile(path, np.uint8).tobytes() for path in paths]
+
+    rng = np.random.default_rng(seed)
+    width, height = resolution
+    frames = []
+    for _ in range(count):
+        # Smooth noise plus a few hard-edged blocks compresses roughly like a store camera image
+        image = cv2.GaussianBlur(rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8), (5, 5), 0)
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_CUBIC)
+        for _ in range(8):
+            x, y = rng.integers(0, width - width // 10), rng.integers(0, height - height // 5)
+            cv2.rectangle(image, (int(x), int(y)), (int(x) + width // 20, int(y) + height // 5),
+                          tuple(int(c) for c in rng.integers(0, 256, 3)), -1)
+        frames.append(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    return frames
+
+
+def time_decode(frames, flag, repeat):
+    """Return milliseconds per frame and the decoded frames of the last pass."""
+    decoded = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        decoded = [cv2.imdecode(np.frombuffer(frame, np.uint8), flag) for frame in frames]
+    return (time.perf_counter() - started) / (repeat * len(frames)) * 1000, decoded
+
+
+def person_boxes(detector, frames, scales):
+    """Person boxes (x1, y1, x2, y2) per frame, in source coordinates."""
+    boxes = []
+    for frame, scale in zip(frames, scales):
+        detections = detector.detect([frame])[0]
+        boxes.append(detections[detections[:, 5] == PERSON, :4] * scale)
+    return boxes
+
+
+def agreement(reference, candidate, threshold):
+    """Recall, precision and mean IoU of candidate boxes against the full-resolution detections."""
+    matched, ious, total_ref, total_cand = 0, [], 0, 0
+    for ref, cand in zip(reference, candidate):
+        total_ref += len(ref)
+        total_cand += len(cand)
+        if not len(ref) or not len(cand):
+            continue
+        iou = box_iou(ref, cand)
+        # Greedy one-to-one matching, best pairs first
+        for flat in np.argsort(iou, axis=None)[::-1]:
+            i, j = np.unravel_index(flat, iou.shape)
+            if iou[i, j] < threshold:
+                break
+            if np.isfinite(iou[i, j]):
+                matched += 1
+                ious.append(iou[i, j])
+                iou[i, :] = -np.inf
+                iou[:, j] = -np.inf
+    return {
+        "recall": matched / total_ref if total_ref else 1.0,
+        "precision": matched / total_cand if total_cand else 1.0,
+        "mean_iou": float(np.mean(ious)) if ious else None,
+    }
+
+
+def run(frames, imgsz, repeat, detector=None, iou_threshold=0.5):
+    width, height = image_size(frames[0]) or (None, None)
+    report = []
+
+    full_ms, full = time_decode(frames, cv2.IMREAD_COLOR, repeat)
+    reference = person_boxes(detector, full, [1.0] * len(full)) if detector else None
+    report.append({"mode": "full", "factor": 1, "decoded": f"{full[0].shape[1]}x{full[0].shape[0]}", "decode_ms": full_ms})
+
+    chosen = reduction_factor(width, height, imgsz) if width else 1
+    for factor, flag in REDUCED_COLOR_FLAGS[::-1]:
+        ms, decoded = time_decode(frames, flag, repeat)
+        row = {
+            "mode": "auto" if factor == chosen else "forced", "factor": factor,
+            "decoded": f"{decoded[0].shape[1]}x{decoded[0].shape[0]}", "decode_ms": ms, "speedup": full_ms / ms,
+        }
+        if detector:
+            scales = [width / frame.shape[1] for frame in decoded]
+            row.update(agreement(reference, person_boxes(detector, decoded, scales), iou_threshold))
+        report.append(row)
+
+    # Confirm the service's decode path picks the same factor
+    _, scale = decode_for_detector(frames[0], imgsz)
+    return {"source": f"{width}x{height}", "imgsz": imgsz, "auto_factor": chosen, "auto_scale": scale, "results": report}
+
+
+if __name__ == "__main__":
+    parser = benchmark_parser("Decode time and detection agreement of reduced-resolution decoding.", seed=True)
+    parser.add_argument("--frames", help="Glob of encoded frames, e.g. 'CapturedFrames/*.jpg'; synthetic 4K JPEGs if omitted.")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--resolution", type=int, nargs=2, default=[3840, 2160], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality of synthetic frames.")
+    parser.add_argument("--imgsz", type=int, default=640, help="Detector input size.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", help="Detector backend (ultralytics, onnx, openvino) to measure detection agreement with full decode.")
+    parser.add_argument("--weights", help="Model file for --backend; defaults to the backend's yolov8n export.")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU at which a reduced-decode box matches a full-decode box.")
+    args = parser.parse_args()
+
+    detector = create_detector(args.backend, args.weights, imgsz=args.imgsz) if args.backend else None
+
+    frames = load_frames(args.frames, args.count, args.resolution, args.quality, args.seed)
+    report = run(frames, args.imgsz, args.repeat, detector, args.iou)
+
+    print(f"source {report['source']}, imgsz {report['imgsz']}, auto factor {report['auto_factor']}")
+    print(f"{'mode':>7} {'factor':>6} {'decoded':>10} {'ms/frame':>9} {'speedup':>8} {'recall':>7} {'precision':>9} {'mIoU':>6}")
+    for row in report["results"]:
+        fmt = lambda key, spec: format(row[key], spec) if row.get(key) is not None else "-"
+        print(f"{row['mode']:>7} {row['factor']:>6} {row['decoded']:>10} {row['decode_ms']:>9.2f} "
+              f"{fmt('speedup', '.2f'):>8} {fmt('recall', '.3f'):>7} {fmt('precision', '.3f'):>9} {fmt('mean_iou', '.3f'):>6}")
+
+    write_report(report, args.output)
@@ -0,0 +1,101 @@
+import time
+
+import numpy as np
+
+from benchmark_common import benchmark_parser, write_report
+from benchmark_gallery_index import make_gallery
+from camera_topology import CameraTopology
+from global_tracker import GlobalTracker
+from metrics import GALLERY_CANDIDATES
+from track_record import TrackRecord
+
+
+def grid_topology(rows, cols, min_transit, max_transit, reentry_max):
+    """A store laid out as a grid of aisles, with a camera per cell and walkways to the four neighbours."""
+    transitions = []
+    for r in range(rows):
+        for c in range(cols):
+            for dr, dc in ((0, 1), (1, 0), (0, -1), (-1, 0)):
+                if 0 <= r + dr < rows and 0 <= c + dc < cols:
+                    transitions.append((f"cam-{r}-{c}", f"cam-{r + dr}-{c + dc}", min_transit, max_transit))
+    return CameraTopology(transitions, reentry_max=reentry_max)
+
+
+def populate(tracker, gallery, cameras, ages, now):
+    """Load one identity per gallery row, last seen on a random camera ``ages`` seconds before now."""
+    by_age = {}
+    for i, age in enumerate(ages):
+        by_age.setdefault(int(age), []).append(i)
+    camera_bits = tracker.camera_bits("store")
+    for age, rows in by_age.items():
+        tracker.restore({
+            i: TrackRecord.first_sighting("store", camera_bits, cameras[i], gallery[i], now - age, tracker.embedding_dtype)
+            for i in rows
+        }, seen_at=now - age)
+
+
+def run(sizes, grid, dim, queries, noise, threshold, seed):
+    rng = np.random.default_rng(seed)
+    rows, cols = grid
+    topology = grid_topology(rows, cols, min_transit=2.0, max_transit=60.0, reentry_max=120.0)
+    report = []
+    for size in sizes:
+        gallery = make_gallery(size, dim, rng)
+        positions = rng.integers(0, [rows, cols], (size, 2))
+        cameras = [f"cam-{r}-{c}" for r, c in positions]
+        ages = rng.uniform(0, 600, size)  # Seconds since each identity was last seen
+
+        # Re-sightings of distinct identities that walked to a neighbouring camera within the transit window
+        recent = np.flatnonzero((ages >= 2) & (ages <= 60))
+        picks = rng.choice(recent, min(queries, len(recent)), replace=False)
+        sightings = []
+        for i in picks:
+            r, c = positions[i]
+            neighbours = [(r + dr, c + dc) for dr, dc in ((0, 1), (1, 0), (0, -1), (-1, 0))
+                          if 0 <= r + dr < rows and 0 <= c + dc < cols]
+            r, c = neighbours[rng.integers(len(neighbours))]
+            feature = gallery[i] + noise * rng.normal(size=dim) / np.sqrt(dim)
+            sightings.append((i, f"cam-{r}-{c}", feature.astype(np.float32)))
+
+        for name, tracker_topology in (("full", None), ("topology", topology)):
+            tracker = GlobalTracker(threshold=threshold, timeout=3600, topology=tracker_topology)
+            now = time.monotonic()
+            populate(tracker, gallery, cameras, ages, now)
+            scored = GALLERY_CANDIDATES.labels("scored").value
+            held = GALLERY_CANDIDATES.labels("held").value
+
+            correct = 0
+            started = time.perf_counter()
+            for i, camera_id, feature in sightings:
+                correct += tracker.match_and_update("store", camera_id, feature) == i
+            elapsed = time.perf_counter() - started
+
+            row = {"size": size, "cameras": rows * cols, "gallery": name,
+                   "correct": correct / len(sightings), "us_per_query": elapsed / len(sightings) * 1e6}
+            if tracker_topology is not None:
+                scored = GALLERY_CANDIDATES.labels("scored").value - scored
+                held = GALLERY_CANDIDATES.labels("held").value - held
+                row.update({"scanned_per_query": scored / len(sightings), "held_per_query": held / len(sightings),
+                            "pruning_ratio": held / scored if scored else float("inf")})
+            report.append(row)
+    return report
+
+
+if __name__ == "__main__":
+    parser = benchmark_parser("Gallery scan size and re-ID accuracy with and without camera topology pruning.", embeddings=True, seed=True)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 10000, 50000])
+    parser.add_argument("--grid", type=int, nargs=2, default=[6, 8], metavar=("ROWS", "COLS"),
+                        help="Cameras laid out as a grid, each connected to its four neighbours.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.5)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.grid, args.dim, args.queries, args.noise, args.threshold, args.seed)
+
+    print(f"{'size':>7} {'gallery':>9} {'correct':>8} {'us/query':>9} {'scanned':>9} {'pruning':>8}")
+    for row in results:
+        print(f"{row['size']:>7} {row['gallery']:>9} {row['correct']:>8.3f} {row['us_per_query']:>9.1f} "
+              f"{row.get('scanned_per_query', row['size']):>9.0f} {row.get('pruning_ratio', 1.0):>8.1f}")
+
+    write_report(results, args.output)
@@ -0,0 +1,99 @@
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from benchmark_common import benchmark_parser, write_report
+from benchmark_gallery_index import make_gallery
+from gallery_index import normalize
+from global_tracker import GlobalTracker
+from track_record import EMBEDDING_DTYPES, CameraBits, TrackRecord, quantize
+
+
+def measure(build):
+    """Bytes allocated (and still held) by build(), and the object it returned."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return held, result
+
+
+def legacy_records(gallery, cameras):
+    """The dict layout track records had before: a camera set, datetimes and float32 features."""
+    now = datetime.now()
+    return [{"source_id": "store", "cameras": set(cams), "last_camera": cams[-1], "features": vector.copy(),
+             "first_seen": now.replace(microsecond=i % 1000000), "last_seen": now.replace(microsecond=(i + 1) % 1000000)}
+            for i, (vector, cams) in enumerate(zip(gallery, cameras))]
+
+
+def compact_records(gallery, cameras, dtype):
+    camera_bits = CameraBits()
+    now = time.monotonic()
+    records = []
+    for vector, cams in zip(gallery, cameras):
+        embedding, scale = quantize(vector, dtype)
+        records.append(TrackRecord("store", camera_bits, camera_bits.encode(cams), cams[-1], embedding, scale,
+                                   len(cams), now - 60, now))
+    return records
+
+
+def ema_fidelity(dim, dtype, updates, rng):
+    """Cosine similarity between a record's quantized moving average and the same average in float64."""
+    base = normalize(rng.normal(size=dim))
+    record = TrackRecord.first_sighting("store", CameraBits(), "cam-0", base, 0.0, dtype)
+    reference = base.astype(np.float64)
+    for n in range(2, updates + 2):
+        sighting = normalize(base + 0.5 * rng.normal(size=dim) / np.sqrt(dim) * 4)
+        weight = max(0.1, 1.0 / n)
+        reference = (1.0 - weight) * reference + weight * sighting
+        record.update(sighting, f"cam-{n % 4}", float(n), 0.1)
+    return float(normalize(record.features) @ normalize(reference))
+
+
+def run(size, dim, store_cameras, seed):
+    rng = np.random.default_rng(seed)
+    gallery = make_gallery(size, dim, rng)
+    cameras = [[f"cam-{c}" for c in rng.choice(store_cameras, rng.integers(1, 5), replace=False)] for _ in range(size)]
+    report = []
+
+    held, _ = measure(lambda: legacy_records(gallery, cameras))
+    report.append({"layout": "dict (before)", "dim": dim, "record_bytes": held / size})
+
+    for dtype in EMBEDDING_DTYPES:
+        record_bytes, _ = measure(lambda: compact_records(gallery, cameras, dtype))
+
+        def build_tracker():
+            tracker = GlobalTracker(timeout=3600, embedding_dtype=dtype)
+            camera_bits = tracker.camera_bits("store")
+            now = time.monotonic()
+            tracker.restore({
+                str(uuid.uuid4()): TrackRecord.first_sighting("store", camera_bits, cams[0], vector, now, dtype)
+                for vector, cams in zip(gallery, cameras)
+            })
+            return tracker
+
+        tracker_bytes, tracker = measure(build_tracker)
+        report.append({"layout": f"TrackRecord {dtype}", "dim": dim, "record_bytes": record_bytes / size,
+                       "tracker_bytes": tracker_bytes / size, "ema_cosine": ema_fidelity(dim, dtype, 200, rng)})
+        assert len(tracker) == size
+    return report
+
+
+if __name__ == "__main__":
+    parser = benchmark_parser("Bytes per identity of gallery track records, by embedding storage.", embeddings=True, seed=True)
+    parser.add_argument("--identities", type=int, default=20000)
+    parser.add_argument("--cameras", type=int, default=48, help="Cameras in the store; each identity visits 1-4 of them.")
+    args = parser.parse_args()
+
+    results = run(args.identities, args.dim, args.cameras, args.seed)
+
+    print(f"{'layout':>22} {'record B/id':>12} {'tracker B/id':>13} {'EMA cosine':>11}")
+    for row in results:
+        print(f"{row['layout']:>22} {row['record_bytes']:>12.0f} {row.get('tracker_bytes', float('nan')):>13.0f} "
+              f"{row.get('ema_cosine', float('nan')):>11.5f}")
+
+    write_report(results, args.output)
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import numpy as np
+
+from benchmark_common import benchmark_parser, write_report
+from gallery_index import normalize
+from global_tracker import GlobalTracker
+
+
+def camera_worker(tracker, source_id, camera_id, people, duration, noise, seed, latencies, barrier):
+    """Repeatedly re-sight random people from the shared population, as one camera thread would."""
+    rng = np.random.default_rng(seed)
+    dim = people.shape[1]
+    barrier.wait()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        person = people[rng.integers(0, len(people))]
+        features = person + noise * rng.normal(size=dim).astype(np.float32) / np.sqrt(dim)
+        started = time.perf_counter()
+        tracker.match_and_update(source_id, camera_id, features)
+        latencies.append(time.perf_counter() - started)
+
+
+def sweeper(tracker, stop, interval):
+    while not stop.wait(interval):
+        tracker.handle_global_tracks()
+
+
+def run_mode(mode, threads, stores, people_per_store, dim, duration, noise, seed):
+    rng = np.random.default_rng(seed)
+    populations = [normalize(rng.normal(size=(people_per_store, dim))) for _ in range(stores)]
+    tracker = GlobalTracker(timeout=duration * 10, **mode["options"])
+
+    # Pre-populate the gallery so every run starts from the same steady state
+    for store, people in enumerate(populations):
+        tracker.match_batch(f"store{store}", "warmup", list(people))
+
+    per_thread = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+    stop = threading.Event()
+    workers = [
+        threading.Thread(target=camera_worker, args=(
+            tracker, f"store{i % stores}", f"cam{i}", populations[i % stores],
+            duration, noise, seed + i, per_thread[i], barrier))
+        for i in range(threads)
+    ]
+    sweep = threading.Thread(target=sweeper, args=(tracker, stop, 0.05))
+    for worker in workers:
+        worker.start()
+    sweep.start()
+    started = time.perf_counter()
+    barrier.wait()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sweep.join()
+
+    latencies = np.array([value for values in per_thread for value in values]) * 1e3
+    return {
+        "mode": mode["name"],
+        "threads": threads,
+        "matches_per_s": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "lock_wait_share": tracker.lock_wait / (elapsed * threads),
+        "gallery_size": len(tracker.global_tracks),
+    }
+
+
+MODES = [
+    {"name": "single-lock", "options": {}},
+    {"name": "sharded", "options": {"shard_by_source": True}},
+    {"name": "sharded+snapshot", "options": {"shard_by_source": True, "snapshot_reads": True}},
+]
+
+
+if __name__ == "__main__":
+    parser = benchmark_parser("GlobalTracker throughput and lock wait with N concurrent camera threads.", embeddings=True, seed=True)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--stores", type=int, default=4)
+    parser.add_argument("--people", type=int, default=200, help="Identities per store.")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds per run.")
+    parser.add_argument("--noise", type=float, default=0.3)
+    args = parser.parse_args()
+
+    results = [
+        run_mode(mode, threads, args.stores, args.people, args.dim, args.duration, args.noise, args.seed)
+        for threads in args.threads for mode in MODES
+    ]
+
+    print(f"{'mode':>18} {'threads':>7} {'matches/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'lock wait':>9}")
+    for row in results:
+        print(f"{row['mode']:>18} {row['threads']:>7} {row['matches_per_s']:>10.0f} {row['p50_ms']:>8.3f} "
+              f"{row['p99_ms']:>8.3f} {row['lock_wait_share']:>9.1%}")
+
+    write_report(results, args.output)
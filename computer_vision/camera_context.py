@@ -0,0 +1,59 @@
+import functools
+import threading
+import time
+
+from expiry import ExpiryScheduler
+
+
+class CameraContext:
+    """
+    Pipeline state of one camera: its own tracker, the lifecycle of its local tracks and its counters.
+
+    A VideoProcessingService keeps one context per (source_id, camera_id) it has seen frames from,
+    so several cameras multiplexed on one Event Hub partition never share a DeepSort tracker.
+    ``lock`` is held while one of the camera's frames is processed and while the context is evicted.
+    """
+
+    def __init__(self, source_id, camera_id, tracker, track_timeout: float, on_track_expired, motion_gate=None):
+        """
+        :param tracker: The camera's DeepSort tracker.
+        :param track_timeout: Seconds a local track may go unseen before it expires.
+        :param on_track_expired: Callback ``on_track_expired(context, track_id, last_seen)``.
+        :param motion_gate: Optional MotionGate deciding which of the camera's frames are run through detection.
+        """
+        self.source_id = source_id
+        self.camera_id = camera_id
+        self.tracker = tracker
+        self.motion_gate = motion_gate
+        self.active_tracks = {}
+        # Tracks updated on the last detected frame; carried over unchanged through frames the motion gate skips
+        self.live_tracks = []
+        self.track_expiry = ExpiryScheduler(track_timeout, on_expire=functools.partial(on_track_expired, self))
+        self.lock = threading.Lock()
+        self.created = self.last_active = time.monotonic()
+        self.frames = 0
+        self.skipped = 0
+        self.shed = 0
+        self.detections = 0
+
+    @property
+    def key(self):
+        return self.source_id, self.camera_id
+
+    def idle_for(self, now: float = None) -> float:
+        """Seconds since the camera's last frame."""
+        return (now if now is not None else time.monotonic()) - self.last_active
+
+    def stats(self):
+        """Frame, skipped, shed and detection counters, active tracks and idle time (plus motion gate stats)."""
+        stats = {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "shed": self.shed,
+            "detections": self.detections,
+            "active_tracks": len(self.active_tracks),
+            "idle_seconds": self.idle_for(),
+        }
+        if self.motion_gate is not None:
+            stats["motion_gate"] = self.motion_gate.stats()
+        return stats
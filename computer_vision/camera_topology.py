@@ -0,0 +1,233 @@
+import json
+import logging
+import math
+import os
+
+import numpy as np
+
+from gallery_index import ExactIndex
+from metrics import GALLERY_CANDIDATES
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+
+class CameraTopology:
+    """
+    Which cameras a person can walk between, and how long that takes.
+
+    A transition ``from -> to`` with a (min, max) transit time says that someone last seen on
+    camera ``from`` may show up on camera ``to`` between min and max seconds later. Re-entering
+    the same camera is always plausible, within ``reentry_max`` seconds. Cameras that do not
+    appear in the topology are never pruned, in either direction.
+    """
+
+    def __init__(self, transitions, reentry_max: float = math.inf):
+        """
+        :param transitions: Iterable of (from_camera, to_camera, min_seconds, max_seconds).
+        :param reentry_max: Seconds after which a track is no longer a candidate on its own last camera.
+        """
+        self.reentry_max = reentry_max
+        self._into = {}
+        for from_camera, to_camera, min_seconds, max_seconds in transitions:
+            if min_seconds > max_seconds:
+                raise ValueError(f"Transition {from_camera} -> {to_camera} has min {min_seconds}s > max {max_seconds}s.")
+            self._into.setdefault(from_camera, {})
+            windows = self._into.setdefault(to_camera, {})
+            previous = windows.get(from_camera)
+            if previous is not None:
+                min_seconds, max_seconds = min(previous[0], min_seconds), max(previous[1], max_seconds)
+            windows[from_camera] = (min_seconds, max_seconds)
+        for camera, windows in self._into.items():
+            windows[camera] = (0.0, reentry_max)
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """
+        Build a topology from its configuration, e.g.::
+
+            {"reentry_max": 600,
+             "transitions": [{"from": "entrance", "to": "aisle-1", "min": 2, "max": 60, "bidirectional": true}]}
+
+        ``min`` defaults to 0, ``max`` to unbounded and ``bidirectional`` to false.
+        """
+        transitions = []
+        for transition in config.get("transitions", []):
+            window = (float(transition.get("min", 0)), float(transition.get("max", math.inf)))
+            transitions.append((transition["from"], transition["to"], *window))
+            if transition.get("bidirectional", False):
+                transitions.append((transition["to"], transition["from"], *window))
+        return cls(transitions, reentry_max=float(config.get("reentry_max", math.inf)))
+
+    def __contains__(self, camera_id):
+        return camera_id in self._into
+
+    @property
+    def cameras(self):
+        return list(self._into)
+
+    def predecessors(self, camera_id):
+        """
+        Cameras a person seen on camera_id may have come from, with their transit windows.
+
+        :return: A mapping {from_camera: (min_seconds, max_seconds)}, or None when camera_id is
+            not part of the topology and every track is a candidate.
+        """
+        return self._into.get(camera_id)
+
+
+def load_camera_topology(value: str = None):
+    """
+    Load a CameraTopology from a JSON document or the path of a JSON file; defaults to CAMERA_TOPOLOGY.
+
+    :return: The topology, or None if nothing is configured.
+    """
+    value = value if value is not None else os.getenv("CAMERA_TOPOLOGY")
+    if not value:
+        return None
+    if not value.lstrip().startswith("{"):
+        with open(value) as f:
+            value = f.read()
+    topology = CameraTopology.from_config(json.loads(value))
+    logging.info(f"Loaded camera topology with {len(topology.cameras)} cameras.")
+    return topology
+
+
+class _CameraBucket(ExactIndex):
+    """The embeddings of the tracks last seen on one camera, with their last-seen times in a parallel column."""
+
+    def __init__(self):
+        super().__init__()
+        self._seen = np.empty(16, dtype=np.float64)
+
+    def upsert(self, key, vector, seen_at: float = 0.0):
+        super().upsert(key, vector)
+        row = self._rows[key]
+        if row >= len(self._seen):
+            self._seen = np.concatenate([self._seen, np.empty(len(self._seen), dtype=np.float64)])
+        self._seen[row] = seen_at
+
+    def remove(self, key):
+        row, last = self._rows[key], len(self._row_ids) - 1
+        super().remove(key)
+        self._seen[row] = self._seen[last]
+
+    def copy(self):
+        clone = _CameraBucket()
+        clone.__dict__.update(super().copy().__dict__)
+        clone._seen = self._seen[:max(len(self._row_ids), 1)].copy()
+        return clone
+
+    def seen(self):
+        return self._seen[:len(self._row_ids)]
+
+
+class TopologyIndex:
+    """
+    Gallery index that only scores the tracks a camera topology deems reachable.
+
+    Each track sits in the bucket of the camera it was last seen on, together with when that
+    was. A query from camera C scans the buckets of C's predecessors (and of cameras missing from
+    the topology) and ignores tracks whose time since last seen falls outside the transit window,
+    so the comparison set shrinks with the store's size instead of growing with it. Searches
+    without a camera, or from one missing from the topology, scan every bucket.
+    """
+
+    def __init__(self, topology: CameraTopology):
+        self.topology = topology
+        self._buckets = {}
+        self._bucket_of = {}
+        self._unlisted = set()  # Cameras with tracks that the topology does not know
+
+    def __len__(self):
+        return len(self._bucket_of)
+
+    def __contains__(self, key):
+        return key in self._bucket_of
+
+    def keys(self):
+        return list(self._bucket_of)
+
+    def upsert(self, key, vector, camera_id=None, seen_at: float = 0.0):
+        """
+        Insert or replace the embedding under key, filed under the camera it was last seen on.
+
+        :param seen_at: Monotonic time the track was last seen.
+        """
+        previous = self._bucket_of.get(key)
+        if previous is not None and previous != camera_id:
+            self._remove_from(previous, key)
+        bucket = self._buckets.get(camera_id)
+        if bucket is None:
+            bucket = self._buckets[camera_id] = _CameraBucket()
+            if camera_id not in self.topology:
+                self._unlisted.add(camera_id)
+        bucket.upsert(key, vector, seen_at)
+        self._bucket_of[key] = camera_id
+
+    def remove(self, key):
+        self._remove_from(self._bucket_of.pop(key), key)
+
+    def _remove_from(self, camera_id, key):
+        bucket = self._buckets[camera_id]
+        bucket.remove(key)
+        if not len(bucket):
+            del self._buckets[camera_id]
+            self._unlisted.discard(camera_id)
+
+    def copy(self):
+        clone = TopologyIndex(self.topology)
+        clone._buckets = {camera_id: bucket.copy() for camera_id, bucket in self._buckets.items()}
+        clone._bucket_of = dict(self._bucket_of)
+        clone._unlisted = set(self._unlisted)
+        return clone
+
+    def candidates(self, camera_id, now: float):
+        """
+        Yield (bucket, eligible) for every bucket a query from camera_id has to scan, where
+        eligible is a boolean mask over the bucket's rows, or None if all of them are.
+        """
+        windows = self.topology.predecessors(camera_id) if camera_id is not None else None
+        if windows is None:
+            yield from ((bucket, None) for bucket in self._buckets.values())
+            return
+        for bucket_camera in self._unlisted:
+            yield self._buckets[bucket_camera], None
+        for bucket_camera, window in windows.items():
+            bucket = self._buckets.get(bucket_camera)
+            if bucket is None:
+                continue
+            elapsed = now - bucket.seen()
+            eligible = (elapsed >= window[0]) & (elapsed <= window[1])
+            if eligible.all():
+                yield bucket, None
+            elif eligible.any():
+                yield bucket, eligible
+
+    def search(self, queries, k: int = 1, camera_id=None, now: float = None):
+        """
+        Find the k nearest reachable embeddings for each query.
+
+        :param camera_id: Camera the queries come from; None scans every bucket.
+        :param now: Monotonic time of the queries, for the transit windows.
+            Counts the embeddings scored, and those the gallery held, in GALLERY_CANDIDATES.
+        :return: (keys, distances) like ExactIndex.search.
+        """
+        keys, blocks = [], []
+        for bucket, eligible in self.candidates(camera_id, now):
+            bucket_keys = bucket.keys()
+            vectors = bucket.vectors()
+            if eligible is not None:
+                bucket_keys = [key for key, keep in zip(bucket_keys, eligible) if keep]
+                vectors = vectors[eligible]
+            keys.extend(bucket_keys)
+            blocks.append(vectors)
+        GALLERY_CANDIDATES.labels("scored").inc(len(queries) * len(keys))
+        GALLERY_CANDIDATES.labels("held").inc(len(queries) * len(self._bucket_of))
+
+        if not keys:
+            return [[] for _ in range(len(queries))], np.empty((len(queries), 0), dtype=np.float32)
+        distances = 1.0 - queries @ np.concatenate(blocks).T
+        k = min(k, len(keys))
+        best = np.argsort(distances, axis=1)[:, :k] if k > 1 else np.argmin(distances, axis=1)[:, None]
+        return [[keys[i] for i in row] for row in best], np.take_along_axis(distances, best, axis=1)
@@ -0,0 +1,150 @@
+import asyncio
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from azure.eventhub import CheckpointStore
+from azure.eventhub.aio import CheckpointStore as AsyncCheckpointStoreBase
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+
+class FileCheckpointStore(CheckpointStore):
+    """
+    A local, file-backed Event Hub checkpoint store.
+
+    Stands in for the blob checkpoint store in tests and single-host deployments; partition
+    ownership and checkpoints are kept in one JSON file that is rewritten atomically. Every call
+    re-reads the file under an exclusive lock on ``<path>.lock``, so consumers in several processes
+    sharing the path see each other's claims and etag checks hold across them. Like the blob
+    store, ownership ``last_modified_time`` is in epoch seconds, which the Event Hub load
+    balancer adds the ownership timeout to.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the JSON file holding ownership and checkpoints.
+        """
+        self.path = path
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._state = {"ownership": {}, "checkpoints": {}}
+
+    @staticmethod
+    def _key(record):
+        return "/".join((record["fully_qualified_namespace"], record["eventhub_name"],
+                         record["consumer_group"], record["partition_id"]))
+
+    @staticmethod
+    def _matches(record, fully_qualified_namespace, eventhub_name, consumer_group):
+        return (record["fully_qualified_namespace"] == fully_qualified_namespace and
+                record["eventhub_name"] == eventhub_name and
+                record["consumer_group"] == consumer_group)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold the thread and file locks and load the current state from disk."""
+        with self._lock, open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(self.path):
+                    with open(self.path) as f:
+                        self._state = json.load(f)
+                yield self._state
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._state, f)
+        os.replace(temp_path, self.path)
+        self.writes += 1
+
+    def list_ownership(self, fully_qualified_namespace, eventhub_name, consumer_group, **kwargs):
+        with self._locked():
+            return [
+                dict(record) for record in self._state["ownership"].values()
+                if self._matches(record, fully_qualified_namespace, eventhub_name, consumer_group)
+            ]
+
+    def claim_ownership(self, ownership_list, **kwargs):
+        claimed = []
+        with self._locked():
+            for ownership in ownership_list:
+                key = self._key(ownership)
+                current = self._state["ownership"].get(key)
+                if current is not None and current.get("etag") != ownership.get("etag"):
+                    continue  # Someone else claimed it since the caller listed ownership
+
+                record = dict(ownership, etag=str(uuid.uuid4()), last_modified_time=time.time())
+                self._state["ownership"][key] = record
+                claimed.append(dict(record))
+            if claimed:
+                self._save()
+        return claimed
+
+    def update_checkpoint(self, checkpoint, **kwargs):
+        with self._locked():
+            self._state["checkpoints"][self._key(checkpoint)] = dict(checkpoint)
+            self._save()
+
+    def list_checkpoints(self, fully_qualified_namespace, eventhub_name, consumer_group, **kwargs):
+        with self._locked():
+            return [
+                dict(record) for record in self._state["checkpoints"].values()
+                if self._matches(record, fully_qualified_namespace, eventhub_name, consumer_group)
+            ]
+
+
+class AsyncCheckpointStore(AsyncCheckpointStoreBase):
+    """Exposes a synchronous CheckpointStore to the azure.eventhub.aio consumer by running its calls on worker threads."""
+
+    def __init__(self, store: CheckpointStore):
+        self.store = store
+
+    async def list_ownership(self, fully_qualified_namespace, eventhub_name, consumer_group, **kwargs):
+        return await asyncio.to_thread(self.store.list_ownership, fully_qualified_namespace, eventhub_name,
+                                       consumer_group, **kwargs)
+
+    async def claim_ownership(self, ownership_list, **kwargs):
+        return await asyncio.to_thread(self.store.claim_ownership, ownership_list, **kwargs)
+
+    async def update_checkpoint(self, checkpoint, **kwargs):
+        await asyncio.to_thread(self.store.update_checkpoint, checkpoint, **kwargs)
+
+    async def list_checkpoints(self, fully_qualified_namespace, eventhub_name, consumer_group, **kwargs):
+        return await asyncio.to_thread(self.store.list_checkpoints, fully_qualified_namespace, eventhub_name,
+                                       consumer_group, **kwargs)
+
+
+def create_checkpoint_store(blob_connection_string: str = None, blob_container: str = None, path: str = None,
+                            asynchronous: bool = False):
+    """
+    Build the configured checkpoint store.
+
+    :param blob_connection_string: Storage connection string for the Azure Blob checkpoint store.
+    :param blob_container: Blob container holding the checkpoints.
+    :param path: Path of a local FileCheckpointStore, used when no blob store is configured.
+    :param asynchronous: Build a store for the azure.eventhub.aio consumer (AsyncAzureEventHubClient).
+    :return: A CheckpointStore, or None to keep checkpoints in memory only.
+    """
+    if blob_connection_string and blob_container:
+        if asynchronous:
+            from azure.eventhub.extensions.checkpointstoreblobaio import BlobCheckpointStore
+        else:
+            from azure.eventhub.extensions.checkpointstoreblob import BlobCheckpointStore
+
+        logging.info(f"Using blob checkpoint store in container '{blob_container}'.")
+        return BlobCheckpointStore.from_connection_string(blob_connection_string, blob_container)
+    if path:
+        logging.info(f"Using file checkpoint store at '{path}'.")
+        store = FileCheckpointStore(path)
+        return AsyncCheckpointStore(store) if asynchronous else store
+    return None
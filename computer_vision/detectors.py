@@ -0,0 +1,257 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+PERSON = 0
+DEFAULT_WEIGHTS = {
+    "ultralytics": "yolov8n.pt",
+    "onnx": "yolov8n.onnx",
+    "openvino": "yolov8n_openvino_model/yolov8n.xml",
+}
+
+
+def letterbox(frame, imgsz: int):
+    """
+    Resize a BGR frame to fit an imgsz x imgsz square, padded with grey the way ultralytics does.
+
+    :return: (CHW float32 RGB tensor in [0, 1], ratio, (pad_x, pad_y)); source = (model - pad) / ratio.
+    """
+    height, width = frame.shape[:2]
+    ratio = min(imgsz / height, imgsz / width)
+    new_width, new_height = round(width * ratio), round(height * ratio)
+    if (new_width, new_height) != (width, height):
+        frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (imgsz - new_width) / 2, (imgsz - new_height) / 2
+    top, left = round(pad_y - 0.1), round(pad_x - 0.1)
+    frame = cv2.copyMakeBorder(frame, top, imgsz - new_height - top, left, imgsz - new_width - left,
+                               cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    tensor = np.ascontiguousarray(frame[:, :, ::-1].transpose(2, 0, 1), dtype=np.float32) / 255.0
+    return tensor, ratio, (left, top)
+
+
+def box_iou(a, b):
+    """Pairwise IoU of two (N, 4) and (M, 4) arrays of x1, y1, x2, y2 boxes."""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+
+class Detector(ABC):
+    """
+    Object detector over batches of BGR frames.
+
+    ``detect`` returns one (N, 6) float32 array per frame with rows of
+    x1, y1, x2, y2, confidence, class in the frame's own pixel coordinates.
+    """
+
+    backend = None
+
+    def __init__(self, imgsz: int = 640, conf: float = 0.25, iou: float = 0.45, classes=(PERSON,)):
+        """
+        :param imgsz: Square model input size.
+        :param conf: Minimum confidence of a detection.
+        :param iou: IoU above which overlapping boxes of the same class are suppressed.
+        :param classes: Class ids to keep; None keeps all.
+        """
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.classes = None if classes is None else tuple(classes)
+
+    @abstractmethod
+    def detect(self, frames):
+        """Detect objects in a batch of BGR frames; one (N, 6) array per frame."""
+
+    def close(self):
+        """Release the runtime's resources."""
+
+
+class UltralyticsDetector(Detector):
+    """Reference backend running the ultralytics model (PyTorch weights, or any format ultralytics can load)."""
+
+    backend = "ultralytics"
+
+    def __init__(self, weights: str = DEFAULT_WEIGHTS["ultralytics"], device: str = None, **kwargs):
+        super().__init__(**kwargs)
+        from ultralytics import YOLO
+
+        # Ultralytics loads OpenVINO models from their directory rather than the .xml file
+        self.weights = os.path.dirname(weights) if weights.endswith(".xml") else weights
+        self.device = device
+        self.model = YOLO(self.weights)
+
+    def detect(self, frames):
+        results = self.model.predict(source=list(frames), imgsz=self.imgsz, conf=self.conf, iou=self.iou,
+                                     classes=list(self.classes) if self.classes else None,
+                                     device=self.device, save=False, verbose=False)
+        return [result.boxes.data.cpu().numpy().astype(np.float32) for result in results]
+
+
+class _ExportedYOLODetector(Detector):
+    """Shared pre- and post-processing for YOLOv8 models exported with a (batch, 4 + classes, anchors) output."""
+
+    dynamic_batch = True
+
+    @abstractmethod
+    def _infer(self, batch):
+        """Run the model on a (batch, 3, imgsz, imgsz) tensor; returns (batch, 4 + classes, anchors) outputs."""
+
+    def detect(self, frames):
+        frames = list(frames)
+        if not frames:
+            return []
+        prepared = [letterbox(frame, self.imgsz) for frame in frames]
+        tensors = np.stack([tensor for tensor, _, _ in prepared])
+        if self.dynamic_batch:
+            outputs = self._infer(tensors)
+        else:
+            outputs = np.concatenate([self._infer(tensor[None]) for tensor in tensors])
+        return [
+            self._postprocess(output, ratio, pad, frame.shape)
+            for output, (_, ratio, pad), frame in zip(outputs, prepared, frames)
+        ]
+
+    def _postprocess(self, output, ratio, pad, shape):
+        predictions = output.T  # (anchors, 4 + classes)
+        scores = predictions[:, 4:]
+        if self.classes is not None:
+            class_ids = np.asarray(self.classes)
+            scores = scores[:, class_ids]
+        best = scores.argmax(axis=1)
+        confidence = scores[np.arange(len(scores)), best]
+        keep = confidence >= self.conf
+        if not keep.any():
+            return np.zeros((0, 6), dtype=np.float32)
+
+        boxes = predictions[keep, :4]
+        confidence = confidence[keep]
+        labels = best[keep] if self.classes is None else class_ids[best[keep]]
+
+        xyxy = np.empty_like(boxes)
+        xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+        xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+        xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - pad[0]) / ratio
+        xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - pad[1]) / ratio
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, shape[1])
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, shape[0])
+
+        # Class-aware NMS: offset each class into its own region so boxes of different classes never overlap
+        offset = labels[:, None] * 7680.0
+        shifted = xyxy + offset
+        indices = cv2.dnn.NMSBoxes(
+            np.concatenate([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]], axis=1).tolist(),
+            confidence.tolist(), self.conf, self.iou
+        )
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        return np.concatenate([xyxy[indices], confidence[indices, None], labels[indices, None]], axis=1).astype(np.float32)
+
+
+class OnnxDetector(_ExportedYOLODetector):
+    """ONNX Runtime backend for FP32 or INT8 (QDQ) models produced by export_detector.py."""
+
+    backend = "onnx"
+
+    def __init__(self, weights: str = DEFAULT_WEIGHTS["onnx"], threads: int = None, providers=None, **kwargs):
+        """
+        :param threads: Intra-op threads; None lets ONNX Runtime use all cores.
+        :param providers: Execution providers; defaults to CPU.
+        """
+        super().__init__(**kwargs)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.weights = weights
+        self.session = ort.InferenceSession(weights, options, providers=providers or ["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        if isinstance(model_input.shape[2], int):
+            self.imgsz = model_input.shape[2]
+
+    def _infer(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVINODetector(_ExportedYOLODetector):
+    """OpenVINO backend for FP32 or INT8 IR models produced by export_detector.py."""
+
+    backend = "openvino"
+
+    def __init__(self, weights: str = DEFAULT_WEIGHTS["openvino"], threads: int = None, device: str = "CPU",
+                 hint: str = "LATENCY", **kwargs):
+        """
+        :param threads: Inference threads; None lets OpenVINO decide.
+        :param hint: OpenVINO performance hint, "LATENCY" or "THROUGHPUT".
+        """
+        super().__init__(**kwargs)
+        import openvino as ov
+
+        config = {"PERFORMANCE_HINT": hint}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        self.weights = weights
+        core = ov.Core()
+        model = core.read_model(weights)
+        self.dynamic_batch = model.input(0).get_partial_shape()[0].is_dynamic
+        self.model = core.compile_model(model, device, config)
+        self._output = self.model.output(0)
+
+    def _infer(self, batch):
+        return self.model(batch)[self._output]
+
+
+_BACKENDS = {
+    "ultralytics": UltralyticsDetector,
+    "onnx": OnnxDetector,
+    "openvino": OpenVINODetector,
+}
+_RUNTIMES = {
+    "onnx": "onnxruntime",
+    "openvino": "openvino",
+}
+
+
+def create_detector(backend: str = "ultralytics", weights: str = None, **kwargs) -> Detector:
+    """
+    Build a detector by backend name.
+
+    :param backend: One of "ultralytics", "onnx" or "openvino".
+    :param weights: Model file; defaults to the backend's yolov8n export.
+    :param kwargs: Options passed to the detector constructor (imgsz, conf, iou, classes, threads, ...).
+    """
+    backend = (backend or "ultralytics").lower()
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown detector backend '{backend}'.")
+    weights = weights or DEFAULT_WEIGHTS[backend]
+    try:
+        return _BACKENDS[backend](weights, **kwargs)
+    except ImportError as e:
+        if backend == "ultralytics":
+            raise
+        # No silent fallback: the export would run through ultralytics without the backend's session options
+        raise ImportError(f"Detector backend '{backend}' requires the {_RUNTIMES[backend]} package; "
+                          f"install it or use DETECTOR_BACKEND=ultralytics.") from e
+
+
+def detector_from_env() -> Detector:
+    """Build the detector configured by the DETECTOR_* environment variables."""
+    backend = os.getenv("DETECTOR_BACKEND", "ultralytics")
+    kwargs = {
+        "imgsz": int(os.getenv("DETECTOR_IMGSZ", "640")),
+        "conf": float(os.getenv("DETECTOR_CONF", "0.25")),
+    }
+    if backend.lower() != "ultralytics" and os.getenv("DETECTOR_THREADS"):
+        kwargs["threads"] = int(os.getenv("DETECTOR_THREADS"))
+    return create_detector(backend, os.getenv("DETECTOR_WEIGHTS") or None, **kwargs)
@@ -0,0 +1,87 @@
+import heapq
+import time
+
+
+class ExpiryScheduler:
+    """
+    Tracks last-seen times and reports keys that have not been seen for ``timeout`` seconds.
+
+    Deadlines live in a min-heap keyed on monotonic time with at most one entry per key.
+    Touching a key only records its new last-seen time; the heap entry is pushed back
+    lazily when it comes due, so each ``advance`` call only visits keys whose deadline
+    has passed instead of sweeping every key. With a timeout of 0 every deadline moves on
+    every touch, so the heap is skipped and ``advance`` expires whatever was not touched at ``now``.
+    """
+
+    def __init__(self, timeout: float, on_expire=None):
+        """
+        :param timeout: Seconds a key may go unseen before it expires.
+        :param on_expire: Callback ``on_expire(key, last_seen)`` invoked for each expired key,
+            where last_seen is the key's last monotonic timestamp.
+        """
+        self.timeout = timeout
+        self.on_expire = on_expire
+        self._last_seen = {}
+        self._heap = []
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def __contains__(self, key):
+        return key in self._last_seen
+
+    def last_seen(self, key):
+        """Monotonic time the key was last touched, or None if it is not scheduled."""
+        return self._last_seen.get(key)
+
+    def touch(self, key, now: float = None):
+        """Record that key was seen at ``now`` (defaults to the current monotonic time)."""
+        if now is None:
+            now = time.monotonic()
+        if self.timeout > 0 and key not in self._last_seen:
+            heapq.heappush(self._heap, (now + self.timeout, key))
+        self._last_seen[key] = now
+
+    def discard(self, key):
+        """Stop tracking key without reporting it; its heap entry is dropped when it comes due."""
+        self._last_seen.pop(key, None)
+
+    def advance(self, now: float = None):
+        """
+        Expire every key whose last-seen time is more than ``timeout`` seconds before ``now``.
+
+        :return: A list of (key, last_seen) pairs that expired, in deadline order.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        if self.timeout <= 0:
+            return self._expire_untouched(now)
+
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] < now:
+            _, key = heapq.heappop(heap)
+            last_seen = self._last_seen.get(key)
+            if last_seen is None:
+                continue  # Discarded since it was scheduled
+
+            deadline = last_seen + self.timeout
+            if deadline < now:
+                del self._last_seen[key]
+                expired.append((key, last_seen))
+                if self.on_expire:
+                    self.on_expire(key, last_seen)
+            else:
+                heapq.heappush(heap, (deadline, key))
+        return expired
+
+    def _expire_untouched(self, now: float):
+        """Expire every key last touched before ``now``, oldest first; one pass with no heap."""
+        expired = sorted(((key, last_seen) for key, last_seen in self._last_seen.items() if last_seen < now),
+                         key=lambda entry: entry[1])
+        for key, last_seen in expired:
+            del self._last_seen[key]
+            if self.on_expire:
+                self.on_expire(key, last_seen)
+        return expired
@@ -0,0 +1,149 @@
+import argparse
+import glob
+import logging
+import os
+import re
+import shutil
+
+import cv2
+
+from detectors import letterbox
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Box decoding ops at the end of the YOLOv8 head; quantizing them makes pixel coordinates and
+# class scores share one INT8 scale through the final Concat, which costs most of the accuracy
+_HEAD_DECODE_OPS = {"Concat", "Mul", "Add", "Sub", "Div", "Sigmoid", "Split", "Slice", "Softmax", "Reshape", "Transpose"}
+
+
+def calibration_frames(pattern: str, count: int, imgsz: int):
+    """Letterboxed (1, 3, imgsz, imgsz) tensors from up to count frames spread evenly over the matching files."""
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise FileNotFoundError(f"No calibration frames match {pattern}.")
+    step = max(1, len(paths) // count)
+    for path in paths[::step][:count]:
+        frame = cv2.imread(path)
+        if frame is not None:
+            yield letterbox(frame, imgsz)[0][None]
+
+
+def export_onnx(weights: str, imgsz: int, output_dir: str) -> str:
+    """Export ultralytics weights to an ONNX model with a dynamic batch dimension."""
+    from ultralytics import YOLO
+
+    exported = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    target = os.path.join(output_dir, os.path.basename(exported))
+    if os.path.abspath(exported) != os.path.abspath(target):
+        shutil.move(exported, target)
+    return target
+
+
+def head_decode_nodes(onnx_path: str):
+    """Names of the box-decoding nodes in the last module of the model, which are kept in float."""
+    import onnx
+
+    graph = onnx.load(onnx_path).graph
+    modules = [int(match.group(1)) for node in graph.node if (match := re.match(r"/model\.(\d+)/", node.name))]
+    if not modules:
+        return []
+    head = f"/model.{max(modules)}/"
+    return [node.name for node in graph.node
+            if node.name.startswith(head) and node.op_type in _HEAD_DECODE_OPS and "/cv" not in node.name]
+
+
+def quantize_onnx(onnx_path: str, output_path: str, frames: str, count: int, imgsz: int) -> str:
+    """INT8 post-training static quantization (QDQ, per-channel weights) calibrated on captured frames."""
+    import onnxruntime as ort
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class CapturedFramesReader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = calibration_frames(frames, count, imgsz)
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {input_name: batch}
+
+    prepared = output_path + ".prep.onnx"
+    quant_pre_process(onnx_path, prepared)
+    try:
+        quantize_static(
+            prepared, output_path, CapturedFramesReader(),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=CalibrationMethod.Percentile,
+            nodes_to_exclude=head_decode_nodes(prepared),
+        )
+    finally:
+        os.remove(prepared)
+    return output_path
+
+
+def export_openvino(onnx_path: str, output_path: str, frames: str = None, count: int = 300, imgsz: int = 640) -> str:
+    """
+    Convert an ONNX model to OpenVINO IR.
+
+    With frames, the FP32 model is quantized to INT8 by NNCF calibrated on them; an already
+    quantized (QDQ) ONNX model is converted as is and runs in INT8 on OpenVINO too.
+    """
+    import openvino as ov
+
+    model = ov.convert_model(onnx_path)
+    if frames:
+        import nncf
+
+        dataset = nncf.Dataset(list(calibration_frames(frames, count, imgsz)))
+        ignored = nncf.IgnoredScope(names=head_decode_nodes(onnx_path), validate=False)
+        model = nncf.quantize(model, dataset, preset=nncf.QuantizationPreset.MIXED, subset_size=count,
+                              ignored_scope=ignored)
+    ov.save_model(model, output_path, compress_to_fp16=False)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the detector to ONNX / OpenVINO, optionally INT8-quantized.")
+    parser.add_argument("--weights", default="yolov8n.pt")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--int8", action="store_true", help="Also write INT8 models calibrated on --frames.")
+    parser.add_argument("--frames", default="../unity/CapturedFrames/*.png",
+                        help="Glob of Unity CapturedFrames used for INT8 calibration.")
+    parser.add_argument("--calibration-count", type=int, default=300)
+    parser.add_argument("--openvino", action="store_true", help="Also write OpenVINO IR models.")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(args.weights))[0]
+
+    onnx_path = export_onnx(args.weights, args.imgsz, args.output_dir)
+    logging.info(f"FP32 ONNX model written to {onnx_path}")
+
+    if args.int8:
+        int8_path = quantize_onnx(onnx_path, os.path.join(args.output_dir, f"{stem}-int8.onnx"),
+                                  args.frames, args.calibration_count, args.imgsz)
+        logging.info(f"INT8 ONNX model written to {int8_path}")
+
+    if args.openvino:
+        ir_dir = os.path.join(args.output_dir, f"{stem}_openvino_model")
+        os.makedirs(ir_dir, exist_ok=True)
+        ir_path = export_openvino(onnx_path, os.path.join(ir_dir, f"{stem}.xml"))
+        logging.info(f"FP32 OpenVINO model written to {ir_path}")
+
+        if args.int8:
+            try:
+                int8_ir_dir = os.path.join(args.output_dir, f"{stem}-int8_openvino_model")
+                os.makedirs(int8_ir_dir, exist_ok=True)
+                ir_path = export_openvino(onnx_path, os.path.join(int8_ir_dir, f"{stem}-int8.xml"),
+                                          args.frames, args.calibration_count, args.imgsz)
+            except ImportError:
+                logging.warning("nncf is not installed; converting the INT8 ONNX model instead.")
+                ir_path = export_openvino(int8_path, os.path.join(int8_ir_dir, f"{stem}-int8.xml"))
+            logging.info(f"INT8 OpenVINO model written to {ir_path}")
@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from reid_wire import CONTENT_TYPE, encode_feature_batch
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+
+class FeatureShipper:
+    """
+    Ships appearance embeddings to the orchestrator's batch re-ID endpoint.
+
+    Embeddings are buffered and flushed by count or age as one compact binary request over a
+    persistent keep-alive session. At most ``max_in_flight`` requests are outstanding; once that
+    cap is reached and the buffer is full, ``submit`` blocks, which pushes back on the caller
+    (e.g. the Event Hub consumer) instead of queueing without bound.
+    """
+
+    def __init__(self, url: str, max_batch: int = 64, max_delay: float = 0.1, max_in_flight: int = 4,
+                 dtype: str = "float16", timeout: float = 5.0, on_response=None):
+        """
+        :param url: The orchestrator's batch endpoint, e.g. http://orchestrator-service:5000/reid/batch.
+        :param max_batch: Flush once this many embeddings are buffered.
+        :param max_delay: Flush once the oldest buffered embedding has waited this many seconds.
+        :param max_in_flight: Maximum number of concurrent requests.
+        :param dtype: Wire dtype of the embeddings ("float16" or "float32").
+        :param timeout: Request timeout in seconds.
+        :param on_response: Callback ``on_response(groups, global_ids)`` with the groups sent and the IDs returned.
+        """
+        self.url = url
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.dtype = dtype
+        self.timeout = timeout
+        self.on_response = on_response
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = CONTENT_TYPE
+
+        self._buffer = {}
+        self._buffered = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="feature-shipper")
+        self._closed = threading.Event()
+        self._timer = threading.Thread(target=self._run_timer, name="feature-shipper-timer", daemon=True)
+        self._timer.start()
+
+    def submit(self, source_id: str, camera_id: str, features, timestamp: float = None):
+        """
+        Buffer embeddings from one camera; blocks while the buffer is full and all requests are in flight.
+
+        :param features: One embedding or a (count, size) array of embeddings.
+        :param timestamp: Capture time in Unix seconds (defaults to now).
+        """
+        features = np.atleast_2d(np.asarray(features, dtype=np.float32))
+        with self._lock:
+            key = (source_id, camera_id)
+            entry = self._buffer.get(key)
+            if entry is None:
+                self._buffer[key] = [timestamp or time.time(), [features]]
+            else:
+                entry[0] = timestamp or time.time()
+                entry[1].append(features)
+            self._buffered += len(features)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = self._buffered >= self.max_batch
+        if full:
+            self.flush()
+
+    def _take(self):
+        with self._lock:
+            groups = [(source_id, camera_id, timestamp, np.concatenate(features))
+                      for (source_id, camera_id), (timestamp, features) in self._buffer.items()]
+            self._buffer = {}
+            self._buffered = 0
+            self._oldest = None
+        return groups
+
+    def flush(self):
+        """Send everything buffered as one request; blocks until an in-flight slot is free."""
+        groups = self._take()
+        if not groups:
+            return
+        body = encode_feature_batch(groups, self.dtype)
+        self._in_flight.acquire()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            self._pool.submit(self._post, groups, body)
+        except Exception:
+            with self._lock:
+                self.in_flight -= 1
+            self._in_flight.release()
+            raise
+
+    def _post(self, groups, body):
+        count = sum(len(features) for _, _, _, features in groups)
+        try:
+            response = self.session.post(self.url, data=body, timeout=self.timeout)
+            response.raise_for_status()
+            with self._lock:
+                self.sent += count
+            if self.on_response:
+                self.on_response(groups, response.json()["global_ids"])
+        except Exception as e:
+            with self._lock:
+                self.failed += count
+            logging.error(f"Error sending {count} features to orchestrator: {e}")
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._in_flight.release()
+
+    def _run_timer(self):
+        while not self._closed.wait(self.max_delay / 2):
+            oldest = self._oldest
+            if oldest is not None and time.monotonic() - oldest >= self.max_delay:
+                try:
+                    self.flush()
+                except Exception as e:
+                    logging.error(f"Error flushing features to orchestrator: {e}")
+
+    def close(self):
+        """Flush what is buffered, wait for in-flight requests and close the session."""
+        self._closed.set()
+        self._timer.join()
+        self.flush()
+        self._pool.shutdown(wait=True)
+        self.session.close()
+        logging.info(f"Feature shipper closed (sent {self.sent}, failed {self.failed}).")
@@ -0,0 +1,73 @@
+import struct
+
+import cv2
+import numpy as np
+
+# cv2 flags that decode at 1/2, 1/4 or 1/8 size; JPEGs are scaled in the DCT domain, other formats after decoding
+REDUCED_COLOR_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def image_size(data):
+    """
+    Read the (width, height) of an encoded JPEG or PNG from its header without decoding it.
+
+    :param data: Encoded image as bytes, bytearray or memoryview.
+    :return: (width, height), or None if the format is not recognized.
+    """
+    view = memoryview(data).cast("B")
+    if view[:8] == b"\x89PNG\r\n\x1a\n" and len(view) >= 24:
+        return struct.unpack_from(">II", view, 16)
+
+    if view[:2] != b"\xff\xd8":
+        return None
+    offset = 2
+    while offset + 9 <= len(view):
+        if view[offset] != 0xFF:
+            offset += 1
+            continue
+        marker = view[offset + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        length = struct.unpack_from(">H", view, offset + 2)[0]
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack_from(">HH", view, offset + 5)
+            return width, height
+        offset += 2 + length
+    return None
+
+
+def reduction_factor(width: int, height: int, imgsz: int) -> int:
+    """
+    Largest JPEG reduction (1, 2, 4 or 8) that keeps the frame's long side at or above the detector input size.
+
+    :param imgsz: The detector's input size (the long side it letterboxes to).
+    """
+    long_side = max(width, height)
+    for factor, _ in REDUCED_COLOR_FLAGS:
+        if long_side / factor >= imgsz:
+            return factor
+    return 1
+
+
+def decode_for_detector(data, imgsz: int = None):
+    """
+    Decode an encoded frame at the smallest resolution the detector can use without losing input detail.
+
+    :param data: Encoded image as bytes, bytearray or memoryview.
+    :param imgsz: The detector's input size; None decodes at full resolution.
+    :return: (frame, scale) where frame coordinates times scale give source coordinates; frame is None on failure.
+    """
+    buffer = np.frombuffer(data, np.uint8)
+    size = image_size(data) if imgsz else None
+    factor = reduction_factor(*size, imgsz) if size else 1
+
+    if factor == 1:
+        return cv2.imdecode(buffer, cv2.IMREAD_COLOR), 1.0
+
+    frame = cv2.imdecode(buffer, dict(REDUCED_COLOR_FLAGS)[factor])
+    if frame is None:
+        return None, 1.0
+    return frame, size[0] / frame.shape[1]
+
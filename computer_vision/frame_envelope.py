@@ -0,0 +1,115 @@
+import base64
+import json
+import struct
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+# Binary frame envelope, little-endian:
+#   magic "SGF1" | version u8 | flags u8 | source_id length u16 | camera_id length u16 | reserved u16
+#   | sequence u64 | capture timestamp f64 (Unix seconds)
+#   | source_id UTF-8 | camera_id UTF-8 | encoded image bytes (rest of the body)
+MAGIC = b"SGF1"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBHHHQd")
+
+
+class FrameEnvelope(NamedTuple):
+    """A decoded frame event; ``image`` is a view into the event body, not a copy."""
+    source_id: str
+    camera_id: str
+    sequence: Optional[int]
+    timestamp: Optional[float]
+    image: memoryview
+
+
+def encode_frame_envelope(source_id: str, camera_id: str, sequence: int, timestamp: float, image: bytes) -> bytes:
+    """
+    Pack an encoded image (e.g. JPEG bytes) and its metadata into a binary envelope.
+
+    :param source_id: Store/source the camera belongs to.
+    :param camera_id: Camera that captured the frame.
+    :param sequence: Per-camera frame sequence number.
+    :param timestamp: Capture time in Unix seconds.
+    :param image: Encoded image bytes.
+    """
+    source = source_id.encode("utf-8")
+    camera = camera_id.encode("utf-8")
+    header = _HEADER.pack(MAGIC, VERSION, 0, len(source), len(camera), 0, sequence, timestamp)
+    return b"".join((header, source, camera, image))
+
+
+def _parse_timestamp(value):
+    """Legacy chunks carry TimeStamp as a string; accept Unix seconds or ISO 8601."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _decode_legacy_chunk(body: memoryview) -> FrameEnvelope:
+    """Decode the JSON ``Chunk`` sent by the .NET VideoStreamService, with base64 FrameData."""
+    payload = json.loads(body.tobytes())
+    if not isinstance(payload, dict):
+        raise ValueError("Legacy frame chunk is not a JSON object.")
+    try:
+        return FrameEnvelope(
+            source_id=payload["SourceId"],
+            camera_id=payload["CameraId"],
+            sequence=None,
+            timestamp=_parse_timestamp(payload.get("TimeStamp")),
+            image=memoryview(base64.b64decode(payload["FrameData"])),
+        )
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Invalid legacy frame chunk: missing or malformed {e}.") from e
+
+
+def decode_frame_envelope(body) -> FrameEnvelope:
+    """
+    Decode a frame event body, auto-detecting the binary envelope or the legacy JSON chunk.
+
+    :param body: The event body as bytes, bytearray or memoryview.
+    :return: The decoded FrameEnvelope; for binary envelopes its image is a zero-copy view of body.
+    :raises ValueError: If the body is malformed or truncated.
+    """
+    view = memoryview(body).cast("B")
+    if view[:4] == MAGIC:
+        if len(view) < _HEADER.size:
+            raise ValueError("Truncated frame envelope.")
+        _, version, _, source_len, camera_len, _, sequence, timestamp = _HEADER.unpack_from(view)
+        if version != VERSION:
+            raise ValueError(f"Unsupported frame envelope version {version}.")
+        offset = _HEADER.size
+        if offset + source_len + camera_len > len(view):
+            raise ValueError("Truncated frame envelope.")
+        source_id = str(view[offset:offset + source_len], "utf-8")
+        offset += source_len
+        camera_id = str(view[offset:offset + camera_len], "utf-8")
+        offset += camera_len
+        return FrameEnvelope(source_id, camera_id, sequence, timestamp, view[offset:])
+
+    if bytes(view[:1]).lstrip() in (b"{", b""):
+        return _decode_legacy_chunk(view)
+
+    raise ValueError("Unrecognized frame event body.")
+
+
+def event_body_view(event) -> memoryview:
+    """
+    Return the body of an Event Hub event as a memoryview without copying single-section bodies.
+
+    :param event: An azure.eventhub EventData.
+    """
+    body = event.body
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return memoryview(body)
+
+    sections = list(body)
+    if len(sections) == 1:
+        return memoryview(sections[0])
+    return memoryview(b"".join(sections))
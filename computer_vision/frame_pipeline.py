@@ -0,0 +1,292 @@
+import collections
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+LATEST = "latest"
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, LATEST)
+
+
+class BoundedFrameQueue:
+    """A bounded per-camera frame queue with a configurable overflow policy."""
+
+    def __init__(self, maxsize: int = 2, policy: str = LATEST, on_put=None):
+        """
+        :param maxsize: Maximum number of queued frames; forced to 1 for the "latest" policy.
+        :param policy: What to do when full: "block" the producer, "drop_oldest" queued frame,
+            or keep only the "latest" frame.
+        :param on_put: Callback invoked after a frame has been queued.
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{policy}'. Expected one of {OVERFLOW_POLICIES}.")
+
+        self.policy = policy
+        self.maxsize = 1 if policy == LATEST else max(1, maxsize)
+        self.on_put = on_put
+        self.enqueued = 0
+        self.dropped = 0
+        self.dequeued = 0
+        self.retired = False
+        self._items = collections.deque()
+        self._not_full = threading.Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item) -> bool:
+        """
+        Queue a frame, applying the overflow policy if the queue is full.
+
+        :return: False if the queue has been retired and the frame must go to its replacement.
+        """
+        with self._not_full:
+            if self.retired:
+                return False
+            if self.policy == BLOCK:
+                while len(self._items) >= self.maxsize:
+                    self._not_full.wait()
+            else:
+                while len(self._items) >= self.maxsize:
+                    self._items.popleft()
+                    self.dropped += 1
+            self._items.append(item)
+            self.enqueued += 1
+        if self.on_put:
+            self.on_put()
+        return True
+
+    def get_nowait(self):
+        """Return the oldest queued frame, or None if the queue is empty."""
+        with self._not_full:
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self.dequeued += 1
+            self._not_full.notify()
+            return item
+
+    def retire(self) -> bool:
+        """Stop accepting frames if the queue is empty; return whether it was retired."""
+        with self._not_full:
+            if not self._items:
+                self.retired = True
+            return self.retired
+
+    def stats(self):
+        return {"queued": len(self._items), "enqueued": self.enqueued, "dropped": self.dropped, "processed": self.dequeued}
+
+
+class _DecodeOrder:
+    """Hands one camera's decoded frames on in submission order, whichever decode thread finishes first."""
+
+    def __init__(self):
+        self.submitted = 0
+        self.delivered = 0
+        self._done = {}
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> bool:
+        """Whether frames have been submitted that were not handed on yet."""
+        return self.delivered < self.submitted
+
+    def next_sequence(self) -> int:
+        with self._lock:
+            self.submitted += 1
+            return self.submitted - 1
+
+    def complete(self, sequence: int, item, deliver):
+        """
+        Record a finished decode and deliver every frame that is now next in line.
+
+        :param item: The decoded frame, or None if decoding failed or discarded it.
+        :param deliver: Callable ``deliver(item)``, run in submission order.
+        """
+        with self._lock:
+            self._done[sequence] = item
+            while self.delivered in self._done:
+                item = self._done.pop(self.delivered)
+                self.delivered += 1
+                if item is not None:
+                    deliver(item)
+
+
+class FramePipeline:
+    """
+    Staged frame pipeline: a decode thread pool feeds bounded per-camera queues that
+    inference threads drain round-robin, so a slow model call never backs up the event
+    consumer and stale frames are dropped instead of processed late.
+
+    Decodes of one camera may finish out of order on the pool, so each frame is numbered on
+    submit and queued only after the frames submitted before it. With several inference threads,
+    different cameras are processed concurrently but each camera's frames are still processed one
+    at a time and in order.
+    """
+
+    def __init__(self, process_fn, decode_workers: int = 2, queue_size: int = 1, policy: str = LATEST,
+                 inference_workers: int = 1):
+        """
+        :param process_fn: Callable ``process_fn(camera_key, item)`` run on an inference thread for each frame.
+        :param decode_workers: Number of decode threads.
+        :param queue_size: Capacity of each per-camera queue.
+        :param policy: Overflow policy of the per-camera queues ("block", "drop_oldest" or "latest").
+        :param inference_workers: Number of inference threads.
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{policy}'. Expected one of {OVERFLOW_POLICIES}.")
+
+        self.process_fn = process_fn
+        self.queue_size = queue_size
+        self.policy = policy
+        self.queues = {}
+        self.decode_failures = 0
+        self._orders = {}
+        self._queues_lock = threading.Lock()
+        self._ready = threading.Condition()
+        # Cameras an inference thread is processing a frame of
+        self._busy = set()
+        self._cursor = 0
+        self._stopped = False
+
+        # Bound in-flight decodes so a burst blocks the consumer instead of growing the pool's backlog
+        self._decode_slots = threading.BoundedSemaphore(decode_workers * 2)
+        self._decode_pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="frame-decode")
+        self._inference = [
+            threading.Thread(target=self._run_inference, name=f"frame-inference-{i}", daemon=True)
+            for i in range(max(1, inference_workers))
+        ]
+        for thread in self._inference:
+            thread.start()
+
+    def _queue(self, camera_key):
+        queue = self.queues.get(camera_key)
+        if queue is None:
+            with self._queues_lock:
+                queue = self.queues.get(camera_key)
+                if queue is None:
+                    queue = self.queues[camera_key] = BoundedFrameQueue(self.queue_size, self.policy, self._notify)
+        return queue
+
+    def _order(self, camera_key):
+        order = self._orders.get(camera_key)
+        if order is None:
+            with self._queues_lock:
+                order = self._orders.setdefault(camera_key, _DecodeOrder())
+        return order
+
+    def _notify(self):
+        with self._ready:
+            self._ready.notify()
+
+    def submit(self, camera_key, payload, decode_fn):
+        """
+        Decode a payload on the decode pool and queue the result for the camera.
+
+        :param camera_key: Key of the per-camera queue.
+        :param payload: Raw payload handed to decode_fn.
+        :param decode_fn: Callable returning the item to queue, or None to discard the payload.
+        """
+        self._decode_slots.acquire()
+        order = self._order(camera_key)
+        sequence = order.next_sequence()
+        try:
+            self._decode_pool.submit(self._decode, camera_key, payload, decode_fn, order, sequence)
+        except Exception:
+            order.complete(sequence, None, lambda frame: self._put(camera_key, frame))
+            self._decode_slots.release()
+            raise
+
+    def _decode(self, camera_key, payload, decode_fn, order, sequence):
+        item = None
+        try:
+            item = decode_fn(payload)
+            if item is None:
+                self.decode_failures += 1
+        except Exception as e:
+            self.decode_failures += 1
+            logging.error(f"Error decoding frame for camera {camera_key}: {e}")
+        finally:
+            try:
+                order.complete(sequence, item, lambda frame: self._put(camera_key, frame))
+            finally:
+                self._decode_slots.release()
+
+    def _put(self, camera_key, item):
+        while not self._queue(camera_key).put(item):
+            pass  # Retired by discard meanwhile; the next _queue call creates a fresh one
+
+    def _claim(self):
+        """
+        Take the next frame of a camera no other inference thread is processing, round-robin
+        across cameras so a busy camera cannot starve the rest.
+
+        :return: (camera_key, item), or None once the pipeline is stopped and drained.
+        """
+        with self._ready:
+            while True:
+                queues = list(self.queues.items())
+                for offset in range(len(queues)):
+                    camera_key, queue = queues[(self._cursor + offset) % len(queues)]
+                    if camera_key in self._busy:
+                        continue
+                    item = queue.get_nowait()
+                    if item is not None:
+                        self._cursor = (self._cursor + offset + 1) % len(queues)
+                        self._busy.add(camera_key)
+                        return camera_key, item
+                if self._stopped and not any(len(queue) for _, queue in queues):
+                    return None
+                self._ready.wait()
+
+    def _run_inference(self):
+        while True:
+            claimed = self._claim()
+            if claimed is None:
+                return
+            camera_key, item = claimed
+            try:
+                self.process_fn(camera_key, item)
+            except Exception as e:
+                logging.error(f"Error processing frame for camera {camera_key}: {e}")
+            finally:
+                with self._ready:
+                    self._busy.discard(camera_key)
+                    self._ready.notify()
+
+    def discard(self, camera_key) -> bool:
+        """
+        Drop an idle camera's queue and its counters.
+
+        :return: False if the camera still has queued or in-flight frames, in which case the queue is kept.
+        """
+        with self._queues_lock:
+            order = self._orders.get(camera_key)
+            if order is not None and order.pending:
+                return False
+            queue = self.queues.get(camera_key)
+            if queue is not None:
+                with self._ready:
+                    if camera_key in self._busy or not queue.retire():
+                        return False
+                    del self.queues[camera_key]
+            self._orders.pop(camera_key, None)
+        return True
+
+    def stats(self):
+        """Per-camera queued, enqueued, dropped and processed frame counters."""
+        return {camera_key: queue.stats() for camera_key, queue in list(self.queues.items())}
+
+    def close(self):
+        """Finish in-flight decodes, drain queued frames and stop the inference thread."""
+        self._decode_pool.shutdown(wait=True)
+        with self._ready:
+            self._stopped = True
+            self._ready.notify_all()
+        for thread in self._inference:
+            thread.join()
+        logging.info(f"Frame pipeline closed: {self.stats()}")
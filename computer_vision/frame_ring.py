@@ -0,0 +1,92 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Per-slot header: sequence, height, width, channels
+_HEADER_FIELDS = 4
+_ALIGN = 64
+
+
+class SharedFrameRing:
+    """
+    Fixed-size ring of frame slots in shared memory, written by one camera process and read by inference processes.
+
+    Frames are copied into a slot once and read in place as NumPy views, so no frame is ever pickled;
+    only the (slot, sequence) pair travels through a queue. A slot's sequence number is written last,
+    so a reader can tell with ``is_current`` whether the slot still holds the frame it was sent.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int, max_frame_bytes: int, owner: bool):
+        self.shm = shm
+        self.slots = slots
+        self.max_frame_bytes = max_frame_bytes
+        self.owner = owner
+        header_bytes = -(-slots * _HEADER_FIELDS * 8 // _ALIGN) * _ALIGN
+        self.slot_bytes = -(-max_frame_bytes // _ALIGN) * _ALIGN
+        self._header = np.ndarray((slots, _HEADER_FIELDS), dtype=np.int64, buffer=shm.buf)
+        self._data = np.ndarray((slots, self.slot_bytes), dtype=np.uint8, buffer=shm.buf, offset=header_bytes)
+
+    @staticmethod
+    def _size(slots, max_frame_bytes):
+        return -(-slots * _HEADER_FIELDS * 8 // _ALIGN) * _ALIGN + slots * -(-max_frame_bytes // _ALIGN) * _ALIGN
+
+    @classmethod
+    def create(cls, slots: int = 2, max_frame_bytes: int = 1920 * 1080 * 3, name: str = None):
+        """Allocate a new ring; the creating process owns it and unlinks it on close."""
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls._size(slots, max_frame_bytes))
+        ring = cls(shm, slots, max_frame_bytes, owner=True)
+        ring._header[:] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name: str, slots: int, max_frame_bytes: int):
+        """Map an existing ring created by another process."""
+        try:
+            # Python 3.13+: keep the resource tracker from unlinking the segment when this process exits
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, slots, max_frame_bytes, owner=False)
+
+    @property
+    def spec(self):
+        """Arguments for ``attach`` in another process."""
+        return self.shm.name, self.slots, self.max_frame_bytes
+
+    def write(self, sequence: int, frame) -> int:
+        """
+        Copy a frame into the slot for this sequence number.
+
+        :return: The slot index.
+        :raises ValueError: If the frame is larger than the ring's slots.
+        """
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.nbytes > self.max_frame_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds the ring's {self.max_frame_bytes}-byte slots.")
+        slot = sequence % self.slots
+        header = self._header[slot]
+        header[0] = -1  # Invalidate while the slot is being rewritten
+        self._data[slot, :frame.nbytes] = frame.reshape(-1)
+        height, width = frame.shape[:2]
+        header[1:] = (height, width, frame.shape[2] if frame.ndim == 3 else 0)
+        header[0] = sequence
+        return slot
+
+    def read(self, slot: int, sequence: int):
+        """Return a view of the frame in a slot, or None if the slot has since been reused."""
+        sequence_in_slot, height, width, channels = (int(value) for value in self._header[slot])
+        if sequence_in_slot != sequence:
+            return None
+        shape = (height, width, channels) if channels else (height, width)
+        return self._data[slot, :int(np.prod(shape))].reshape(shape)
+
+    def is_current(self, slot: int, sequence: int) -> bool:
+        """True while the slot still holds the frame with this sequence number."""
+        return int(self._header[slot, 0]) == sequence
+
+    def close(self):
+        """Unmap the ring, and unlink it if this process created it."""
+        self._header = self._data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
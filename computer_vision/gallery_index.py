@@ -0,0 +1,327 @@
+import logging
+
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+
+def normalize(vectors):
+    """L2-normalize vectors along the last axis."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class ExactIndex:
+    """Brute-force cosine index over a growable matrix of L2-normalized embeddings."""
+
+    def __init__(self):
+        self._embeddings = None
+        self._row_ids = []
+        self._rows = {}
+
+    def __len__(self):
+        return len(self._row_ids)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def keys(self):
+        return list(self._row_ids)
+
+    def upsert(self, key, vector):
+        """
+        Insert or replace the embedding stored under key.
+
+        :param key: Identifier of the embedding (e.g. a global track ID).
+        :param vector: L2-normalized embedding.
+        """
+        row = self._rows.get(key)
+        if row is None:
+            if self._embeddings is None:
+                self._embeddings = np.empty((16, vector.shape[-1]), dtype=np.float32)
+            elif len(self._row_ids) == self._embeddings.shape[0]:
+                grown = np.empty((2 * self._embeddings.shape[0], self._embeddings.shape[1]), dtype=np.float32)
+                grown[:len(self._row_ids)] = self._embeddings[:len(self._row_ids)]
+                self._embeddings = grown
+            row = len(self._row_ids)
+            self._row_ids.append(key)
+            self._rows[key] = row
+        self._embeddings[row] = vector
+
+    def remove(self, key):
+        """Drop an embedding by moving the last row into its slot."""
+        row = self._rows.pop(key)
+        last = len(self._row_ids) - 1
+        if row != last:
+            moved = self._row_ids[last]
+            self._embeddings[row] = self._embeddings[last]
+            self._row_ids[row] = moved
+            self._rows[moved] = row
+        self._row_ids.pop()
+
+    def copy(self):
+        """Return an independent copy holding only the live rows."""
+        clone = ExactIndex()
+        if self._embeddings is not None:
+            clone._embeddings = self._embeddings[:max(len(self._row_ids), 1)].copy()
+        clone._row_ids = list(self._row_ids)
+        clone._rows = dict(self._rows)
+        return clone
+
+    def vectors(self):
+        """Return a view of the live embedding rows."""
+        if self._embeddings is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._embeddings[:len(self._row_ids)]
+
+    def search(self, queries, k: int = 1):
+        """
+        Find the k nearest embeddings for each query.
+
+        :param queries: Array of L2-normalized query embeddings, shape (n, d).
+        :param k: Number of neighbours to return per query.
+        :return: (keys, distances) where keys is a list of n lists and distances an (n, k') cosine distance array.
+        """
+        if not self._row_ids:
+            return [[] for _ in range(len(queries))], np.empty((len(queries), 0), dtype=np.float32)
+
+        distances = 1.0 - queries @ self.vectors().T
+        k = min(k, len(self._row_ids))
+        if k == 1:
+            best = np.argmin(distances, axis=1)[:, None]
+        else:
+            best = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(distances, best, axis=1), axis=1)
+            best = np.take_along_axis(best, order, axis=1)
+
+        keys = [[self._row_ids[row] for row in rows] for rows in best]
+        return keys, np.take_along_axis(distances, best, axis=1)
+
+
+class IVFIndex:
+    """
+    Inverted-file index: embeddings are bucketed by their nearest k-means centroid and
+    a query only scans the ``nprobe`` closest buckets.
+
+    Until ``train_size`` embeddings have been seen the index scans everything; it is
+    (re)trained when the gallery first reaches that size and again whenever it grows
+    by ``retrain_factor``.
+    """
+
+    def __init__(self, nlist: int = 64, nprobe: int = 8, train_size: int = 1024, retrain_factor: float = 4.0, iterations: int = 10, seed: int = 0):
+        """
+        :param nlist: Number of buckets (k-means centroids).
+        :param nprobe: Number of buckets scanned per query; higher means better recall and slower search.
+        :param train_size: Gallery size at which the centroids are first trained.
+        :param retrain_factor: Retrain once the gallery has grown by this factor since the last training.
+        :param iterations: Number of k-means iterations per training.
+        :param seed: Seed for centroid initialization.
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.retrain_factor = retrain_factor
+        self.iterations = iterations
+        self._rng = np.random.default_rng(seed)
+        self._centroids = None
+        self._trained_at = 0
+        self._lists = [ExactIndex()]
+        self._list_of = {}
+
+    def __len__(self):
+        return len(self._list_of)
+
+    def __contains__(self, key):
+        return key in self._list_of
+
+    def keys(self):
+        return list(self._list_of)
+
+    def _assign(self, vectors):
+        return np.argmax(vectors @ self._centroids.T, axis=1)
+
+    def _train(self):
+        """Run spherical k-means over the current gallery and rebuild the buckets."""
+        keys, vectors = [], []
+        for bucket in self._lists:
+            keys.extend(bucket.keys())
+            vectors.append(bucket.vectors())
+        vectors = np.concatenate([v for v in vectors if len(v)])
+
+        nlist = min(self.nlist, len(vectors))
+        centroids = vectors[self._rng.choice(len(vectors), nlist, replace=False)]
+        for _ in range(self.iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            empty = ~np.bincount(assignment, minlength=nlist).astype(bool)
+            sums[empty] = centroids[empty]
+            centroids = normalize(sums)
+
+        self._centroids = centroids
+        self._trained_at = len(vectors)
+        self._lists = [ExactIndex() for _ in range(nlist)]
+        self._list_of = {}
+        for key, vector, bucket in zip(keys, vectors, self._assign(vectors)):
+            self._lists[bucket].upsert(key, vector)
+            self._list_of[key] = bucket
+        logging.info(f"IVF index trained on {len(vectors)} embeddings into {nlist} buckets.")
+
+    def upsert(self, key, vector):
+        bucket = 0 if self._centroids is None else int(self._assign(vector[None])[0])
+        previous = self._list_of.get(key)
+        if previous is not None and previous != bucket:
+            self._lists[previous].remove(key)
+        self._lists[bucket].upsert(key, vector)
+        self._list_of[key] = bucket
+
+        size = len(self._list_of)
+        if (self._centroids is None and size >= self.train_size) or \
+                (self._centroids is not None and size >= self.retrain_factor * self._trained_at):
+            self._train()
+
+    def remove(self, key):
+        self._lists[self._list_of.pop(key)].remove(key)
+
+    def copy(self):
+        """Return an independent copy; centroids are replaced on retraining, never mutated, so they are shared."""
+        clone = IVFIndex.__new__(IVFIndex)
+        clone.__dict__.update(self.__dict__)
+        clone._lists = [bucket.copy() for bucket in self._lists]
+        clone._list_of = dict(self._list_of)
+        return clone
+
+    def search(self, queries, k: int = 1):
+        if self._centroids is None:
+            return self._lists[0].search(queries, k)
+
+        probes = np.argsort(-(queries @ self._centroids.T), axis=1)[:, :self.nprobe]
+        all_keys, all_distances = [], []
+        for query, buckets in zip(queries, probes):
+            probed = [self._lists[bucket] for bucket in buckets if len(self._lists[bucket])]
+            if not probed:
+                all_keys.append([])
+                all_distances.append([])
+                continue
+            keys = [key for bucket in probed for key in bucket._row_ids]
+            distances = 1.0 - np.concatenate([bucket.vectors() for bucket in probed]) @ query
+            order = np.argsort(distances)[:k] if k > 1 else [int(np.argmin(distances))]
+            all_keys.append([keys[i] for i in order])
+            all_distances.append(distances[order])
+
+        width = max((len(d) for d in all_distances), default=0)
+        padded = np.full((len(queries), width), np.inf, dtype=np.float32)
+        for i, distances in enumerate(all_distances):
+            padded[i, :len(distances)] = distances
+        return all_keys, padded
+
+
+class FaissIndex:
+    """Index backed by faiss (inner product over normalized vectors), exact or IVF."""
+
+    def __init__(self, nlist: int = None, nprobe: int = 8, train_size: int = 1024):
+        """
+        :param nlist: Number of IVF buckets; None for an exact flat index.
+        :param nprobe: Number of buckets scanned per query when nlist is set.
+        :param train_size: Gallery size at which the IVF quantizer is trained.
+        """
+        import faiss
+
+        self._faiss = faiss
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self._index = None
+        self._pending = ExactIndex()
+        self._ids = {}
+        self._keys = {}
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, key):
+        return key in self._ids
+
+    def keys(self):
+        return list(self._ids)
+
+    def _build(self, dim):
+        faiss = self._faiss
+        vectors = self._pending.vectors()
+        if self.nlist is None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        else:
+            # IVF needs training data, so buffer vectors in an exact index until there are enough
+            if len(vectors) < self.train_size:
+                return
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFFlat(quantizer, dim, min(self.nlist, len(vectors)), faiss.METRIC_INNER_PRODUCT)
+            index.train(np.ascontiguousarray(vectors))
+            index.nprobe = self.nprobe
+            self._index = index
+        keys = self._pending.keys()
+        self._index.add_with_ids(np.ascontiguousarray(vectors), np.array([self._ids[key] for key in keys], dtype=np.int64))
+        self._pending = None
+
+    def upsert(self, key, vector):
+        if key in self._ids:
+            self.remove(key)
+        self._ids[key] = self._next_id
+        self._keys[self._next_id] = key
+        self._next_id += 1
+
+        if self._index is None:
+            self._pending.upsert(key, vector)
+            self._build(vector.shape[-1])
+        else:
+            self._index.add_with_ids(np.ascontiguousarray(vector[None]), np.array([self._ids[key]], dtype=np.int64))
+
+    def remove(self, key):
+        faiss_id = self._ids.pop(key)
+        del self._keys[faiss_id]
+        if self._index is None:
+            self._pending.remove(key)
+        else:
+            self._index.remove_ids(np.array([faiss_id], dtype=np.int64))
+
+    def copy(self):
+        clone = FaissIndex.__new__(FaissIndex)
+        clone.__dict__.update(self.__dict__)
+        clone._index = None if self._index is None else self._faiss.clone_index(self._index)
+        clone._pending = None if self._pending is None else self._pending.copy()
+        clone._ids = dict(self._ids)
+        clone._keys = dict(self._keys)
+        return clone
+
+    def search(self, queries, k: int = 1):
+        if self._index is None:
+            return self._pending.search(queries, k)
+
+        similarities, ids = self._index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+        keys = [[self._keys[i] for i in row if i >= 0] for row in ids]
+        return keys, 1.0 - similarities
+
+
+def create_index(kind: str = "exact", **kwargs):
+    """
+    Build a gallery index by name.
+
+    :param kind: One of "exact", "ivf" or "faiss".
+    :param kwargs: Options passed to the index constructor.
+    """
+    kind = (kind or "exact").lower()
+    if kind == "exact":
+        return ExactIndex()
+    if kind == "ivf":
+        return IVFIndex(**kwargs)
+    if kind == "faiss":
+        try:
+            return FaissIndex(**kwargs)
+        except ImportError as e:
+            # No silent fallback: the NumPy IVF index is approximate where a flat faiss index is exact
+            raise ImportError("Gallery index 'faiss' requires the faiss package (faiss-cpu); "
+                              "install it or use GALLERY_INDEX=exact or ivf.") from e
+    raise ValueError(f"Unknown gallery index '{kind}'.")
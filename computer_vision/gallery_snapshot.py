@@ -0,0 +1,284 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from metrics import REGISTRY
+from track_record import TrackRecord, from_epoch, quantize, to_epoch
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+SNAPSHOT_SECONDS = REGISTRY.histogram("storeguard_gallery_snapshot_seconds", "Time to write one incremental gallery snapshot.")
+SNAPSHOT_ROWS = REGISTRY.counter("storeguard_gallery_snapshot_rows", "Gallery identities written to or dropped from the snapshot.", ("change",))
+
+EMBEDDINGS_FILE = "embeddings.bin"
+METADATA_FILE = "gallery.json"
+FORMAT_VERSION = 2
+
+
+class GallerySnapshotter:
+    """
+    Persists a GlobalTracker's gallery to a directory so re-ID state survives restarts.
+
+    Embeddings live in a memory-mapped matrix (``embeddings.bin``) with one slot per identity,
+    quantized as the track records store them; the rest of each record is kept as columnar JSON
+    (``gallery.json``) that also maps global IDs to slots. Each snapshot asks the tracker for the
+    identities changed since the previous one, so matching only pauses for copying those, writes
+    just their rows into the mapped matrix, then atomically replaces the metadata. The metadata
+    file is the commit point: a slot freed by an expired identity is only reused once metadata
+    without that identity is on disk, so a crash at any point leaves a consistent snapshot.
+    """
+
+    def __init__(self, tracker, directory: str, interval: float = 5.0):
+        """
+        :param tracker: The GlobalTracker to persist; change tracking is enabled on it.
+        :param directory: Directory holding the snapshot files; created if missing.
+        :param interval: Seconds between background snapshots (see ``start``).
+        """
+        self.tracker = tracker
+        self.directory = directory
+        self.interval = interval
+        self.embeddings_path = os.path.join(directory, EMBEDDINGS_FILE)
+        self.metadata_path = os.path.join(directory, METADATA_FILE)
+        os.makedirs(directory, exist_ok=True)
+
+        self._embeddings = None
+        self._dim = None
+        self._dtype = None
+        # global ID -> [slot, source_id, cameras, last_camera, scale, sightings, first_seen, last_seen]
+        self._entries = {}
+        self._free = []
+        self._releasing = []  # Slots freed since the last commit
+        self._next_slot = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_pause = 0.0  # Seconds the last snapshot held the tracker's shard locks
+        tracker.enable_change_tracking()
+
+    def restore(self, max_age: float = None) -> int:
+        """
+        Load the last snapshot into the tracker. Call before the tracker starts matching.
+
+        :param max_age: Skip identities last seen more than this many seconds ago (wall clock),
+            e.g. shoppers who left while the service was down.
+        :return: The number of identities restored.
+        """
+        with self._lock:
+            metadata = self._read_metadata()
+            if metadata is None:
+                return 0
+            started = time.perf_counter()
+            self._dim, self._dtype = metadata["dim"], np.dtype(metadata["dtype"])
+            self._open_embeddings()
+
+            slots = np.asarray(metadata["slots"], dtype=np.int64)
+            rows = len(self._embeddings) if self._embeddings is not None else 0
+            if len(slots) and slots.max() >= rows:
+                logging.error(f"Ignoring gallery snapshot in {self.directory}: embeddings file is truncated")
+                self._dim, self._dtype, self._embeddings = None, None, None
+                return 0
+            if not len(slots):
+                return 0
+            last_seen = np.asarray(metadata["last_seen"], dtype=np.float64)
+            keep = np.ones(len(slots), dtype=bool)
+            if max_age is not None:
+                keep = last_seen >= time.time() - max_age
+            embeddings = np.array(self._embeddings[slots[keep]])  # One gather, copied out of the mapping
+            requantize = self._dtype.name != self.tracker.embedding_dtype
+
+            tracks = {}
+            for row, i in enumerate(np.flatnonzero(keep)):
+                global_id, source_id = metadata["ids"][i], metadata["source_ids"][i]
+                embedding, scale = embeddings[row], metadata["scales"][i]
+                if requantize:
+                    embedding, scale = quantize(embedding.astype(np.float32) * np.float32(scale),
+                                                self.tracker.embedding_dtype)
+                camera_bits = self.tracker.camera_bits(source_id)
+                tracks[global_id] = TrackRecord(
+                    source_id, camera_bits, camera_bits.encode(metadata["cameras"][i]), metadata["last_cameras"][i],
+                    embedding, scale, metadata["sightings"][i],
+                    from_epoch(metadata["first_seen"][i]), from_epoch(float(last_seen[i])))
+                self._entries[global_id] = [int(slots[i]), source_id, metadata["cameras"][i], metadata["last_cameras"][i],
+                                            metadata["scales"][i], metadata["sightings"][i], metadata["first_seen"][i],
+                                            float(last_seen[i])]
+
+            used = set(slots[keep].tolist())
+            self._next_slot = int(slots.max()) + 1 if len(slots) else 0
+            self._free = [slot for slot in range(self._next_slot) if slot not in used]
+            self.tracker.restore(tracks)
+            if requantize:
+                logging.info(f"Rewriting the gallery snapshot with {self.tracker.embedding_dtype} embeddings")
+                self._entries = {}
+                self._reset(self._dim, self.tracker.embedding_dtype)
+                self._write(tracks, ())
+            elif not keep.all():
+                # Commit without the stale identities before their slots are reused
+                self._commit()
+            logging.info(f"Restored {len(tracks)} global tracks from {self.directory} "
+                         f"({len(slots) - len(tracks)} too old) in {time.perf_counter() - started:.3f}s")
+            return len(tracks)
+
+    def snapshot(self) -> int:
+        """
+        Write the identities changed since the previous snapshot.
+
+        :return: The number of identities written or dropped.
+        """
+        with self._lock:
+            started = time.perf_counter()
+            changed, removed = self.tracker.collect_changes()
+            self.last_pause = time.perf_counter() - started
+            if not changed and not removed:
+                return 0
+            with SNAPSHOT_SECONDS.time():
+                self._write(changed, removed)
+            return len(changed) + len(removed)
+
+    def start(self):
+        """Snapshot every ``interval`` seconds on a daemon thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="gallery-snapshot", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stop the background thread and write a final snapshot."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.snapshot()
+        except Exception as e:
+            logging.error(f"Error writing final gallery snapshot: {e}")
+        self._embeddings = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                logging.error(f"Error writing gallery snapshot: {e}")
+
+    def _write(self, changed, removed):
+        """Write changed TrackRecords into their slots, drop removed IDs and commit."""
+        for global_id in removed:
+            entry = self._entries.pop(global_id, None)
+            if entry is not None:
+                self._releasing.append(entry[0])
+
+        if changed:
+            embeddings = np.stack([track.embedding for track in changed.values()])
+            if (self._dim, self._dtype) != (embeddings.shape[1], embeddings.dtype):
+                self._reset(embeddings.shape[1], embeddings.dtype)
+            slots = np.empty(len(changed), dtype=np.int64)
+            for row, (global_id, track) in enumerate(changed.items()):
+                entry = self._entries.get(global_id)
+                if entry is None:
+                    entry = self._entries[global_id] = [self._allocate()] + [None] * 7
+                entry[1:] = [track.source_id, list(track.cameras), track.last_camera, track.scale,
+                             track.sightings, to_epoch(track.first_seen), to_epoch(track.last_seen)]
+                slots[row] = entry[0]
+            self._ensure_capacity(self._next_slot)
+            self._embeddings[slots] = embeddings
+
+        self._commit()
+        SNAPSHOT_ROWS.labels("written").inc(len(changed))
+        SNAPSHOT_ROWS.labels("dropped").inc(len(removed))
+
+    def _read_metadata(self):
+        if not os.path.exists(self.metadata_path) or not os.path.exists(self.embeddings_path):
+            return None
+        try:
+            with open(self.metadata_path) as f:
+                metadata = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Ignoring unreadable gallery snapshot {self.metadata_path}: {e}")
+            return None
+        if metadata.get("version") != FORMAT_VERSION:
+            logging.warning(f"Ignoring gallery snapshot with format version {metadata.get('version')}")
+            return None
+        return metadata
+
+    def _open_embeddings(self):
+        rows = os.path.getsize(self.embeddings_path) // (self._dim * self._dtype.itemsize)
+        self._embeddings = np.memmap(self.embeddings_path, dtype=self._dtype, mode="r+",
+                                     shape=(rows, self._dim)) if rows else None
+
+    def _reset(self, dim, dtype):
+        """Start an empty snapshot, e.g. on first use or when the embeddings' size or storage type changed."""
+        if self._entries:
+            logging.warning(f"Embeddings changed from {self._dim} x {self._dtype} to {dim} x {dtype}; "
+                            f"discarding the gallery snapshot")
+        self._dim, self._dtype = dim, np.dtype(dtype)
+        self._entries = {}
+        self._free, self._releasing, self._next_slot = [], [], 0
+        self._embeddings = None
+        open(self.embeddings_path, "wb").close()
+
+    def _allocate(self):
+        if self._free:
+            return self._free.pop()
+        self._next_slot += 1
+        return self._next_slot - 1
+
+    def _ensure_capacity(self, rows):
+        """Grow the embeddings file (by doubling) to hold at least ``rows`` slots and re-map it."""
+        capacity = len(self._embeddings) if self._embeddings is not None else 0
+        if rows <= capacity:
+            return
+        capacity = max(rows, 2 * capacity, 1024)
+        if self._embeddings is not None:
+            self._embeddings.flush()
+            self._embeddings = None
+        with open(self.embeddings_path, "r+b") as f:
+            f.truncate(capacity * self._dim * self._dtype.itemsize)
+        self._open_embeddings()
+
+    def _commit(self):
+        """Flush the embeddings, then atomically replace the metadata; freed slots become reusable after."""
+        if self._embeddings is not None:
+            self._embeddings.flush()
+        ids = list(self._entries)
+        columns = list(zip(*self._entries.values())) or [()] * 8
+        metadata = {
+            "version": FORMAT_VERSION,
+            "dim": self._dim,
+            "dtype": self._dtype.name if self._dtype is not None else None,
+            "written_at": time.time(),
+            "ids": ids,
+            "slots": list(columns[0]),
+            "source_ids": list(columns[1]),
+            "cameras": list(columns[2]),
+            "last_cameras": list(columns[3]),
+            "scales": list(columns[4]),
+            "sightings": list(columns[5]),
+            "first_seen": list(columns[6]),
+            "last_seen": list(columns[7]),
+        }
+        temporary = self.metadata_path + ".tmp"
+        with open(temporary, "w") as f:
+            # dumps, unlike dump, runs the C encoder
+            f.write(json.dumps(metadata, separators=(",", ":")))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.metadata_path)
+        self._free.extend(self._releasing)
+        self._releasing = []
+
+
+def create_gallery_snapshotter(tracker, directory: str = None, interval: float = None):
+    """
+    Build a GallerySnapshotter from GALLERY_SNAPSHOT_DIR and GALLERY_SNAPSHOT_INTERVAL, or None if no directory is set.
+    """
+    directory = directory or os.getenv("GALLERY_SNAPSHOT_DIR")
+    if not directory:
+        return None
+    if interval is None:
+        interval = float(os.getenv("GALLERY_SNAPSHOT_INTERVAL", "5"))
+    return GallerySnapshotter(tracker, directory, interval)
@@ -1,65 +1,333 @@
+import functools
 import logging
-from datetime import datetime
+import time
 import threading
 import numpy as np
-from scipy.spatial.distance import cosine
 import uuid
 
+from camera_topology import TopologyIndex
+from expiry import ExpiryScheduler
+from gallery_index import ExactIndex, normalize
+from metrics import GALLERY_MATCHES
+from track_record import EMBEDDING_DTYPES, CameraBits, TrackRecord
+
+
+class _GalleryShard:
+    """
+    One partition of the gallery.
+
+    Writers serialize on ``lock``. With snapshots enabled they also publish an immutable
+    copy of the index, at most every ``refresh`` seconds so the O(gallery) copy is amortized over
+    many writes; readers score against it without taking the lock.
+    With change tracking on, ``dirty`` and ``removed`` collect the IDs written or dropped since
+    the last ``GlobalTracker.collect_changes``.
+    """
+    def __init__(self, index, snapshots: bool, timeout: float, track_changes: bool = False, refresh: float = 0.5):
+        self.index = index
+        self.tracks = {}
+        self.dirty = set() if track_changes else None
+        self.removed = set() if track_changes else None
+        self.expiry = ExpiryScheduler(timeout)
+        self.lock = threading.Lock()
+        self.snapshots = snapshots
+        self.refresh = refresh
+        self.version = 0
+        self.snapshot = (0, index.copy() if snapshots else None)
+        self.published_at = time.monotonic()
+        self.lock_wait = 0.0
+
+    def acquire(self):
+        """Take the writer lock, accounting the time spent waiting for it."""
+        started = time.perf_counter()
+        self.lock.acquire()
+        self.lock_wait += time.perf_counter() - started
+
+    def publish(self, force: bool = False):
+        """
+        Record a change and, once the snapshot is ``refresh`` seconds old, swap in a fresh one;
+        must be called with the lock held.
+        """
+        self.version += 1
+        now = time.monotonic()
+        if self.snapshots and (force or now - self.published_at >= self.refresh):
+            self.snapshot = (self.version, self.index.copy())
+            self.published_at = now
+
 
 class GlobalTracker:
     """Centralized tracker for global person tracking across cameras."""
-    def __init__(self):
-        self.global_tracks = {}
-        self.lock = threading.Lock()
+    def __init__(self, threshold: float = 0.5, timeout: float = 10, index_factory=None,
+                 shard_by_source: bool = False, snapshot_reads: bool = False, on_disappear=None, topology=None,
+                 ema_alpha: float = 0.1, embedding_dtype: str = "int8", snapshot_refresh: float = 0.5):
+        """
+        :param threshold: Maximum cosine distance for a feature to match an existing global track.
+        :param timeout: Seconds a global track may go unseen before it is dropped.
+        :param index_factory: Callable returning an empty gallery index (see gallery_index); defaults to exact search.
+        :param shard_by_source: Partition the gallery by source_id (store), so sources never contend with each other.
+        :param snapshot_reads: Score against an immutable per-shard snapshot outside the lock, re-checking
+            unmatched features against the live index under it; pair it with sharding for large galleries.
+        :param on_disappear: Callback ``on_disappear(global_id, track)`` invoked with the TrackRecord of a global
+            track that expired.
+        :param topology: Optional camera_topology.CameraTopology; features are then only compared with tracks
+            that could have walked to their camera in the time since last seen. Replaces index_factory.
+        :param ema_alpha: Weight of a new sighting in a track's moving-average appearance.
+        :param embedding_dtype: How track records store their appearance: "int8" (with a scale), "float16" or "float32".
+        :param snapshot_refresh: Minimum seconds between two snapshot copies of a shard's index, with snapshot_reads.
+        """
+        if embedding_dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unknown embedding dtype '{embedding_dtype}'; expected one of {EMBEDDING_DTYPES}.")
+        self.threshold = threshold
+        self.timeout = timeout
+        self.topology = topology
+        self.index_factory = functools.partial(TopologyIndex, topology) if topology else index_factory or ExactIndex
+        self.shard_by_source = shard_by_source
+        self.snapshot_reads = snapshot_reads
+        self.snapshot_refresh = snapshot_refresh
+        self.on_disappear = on_disappear
+        self.ema_alpha = ema_alpha
+        self.embedding_dtype = embedding_dtype
+        self.shards = {}
+        self._shards_lock = threading.Lock()
+        self._track_changes = False
+        self._camera_bits = {}
+        self.dim = None  # Embedding size, fixed by the first features matched or restored
+
+    @property
+    def global_tracks(self):
+        """All live global tracks across shards, as TrackRecords keyed by global ID."""
+        return {gid: track for shard in list(self.shards.values()) for gid, track in list(shard.tracks.items())}
 
-    def match_and_update(self, source_id, camera_id, features):
+    def __len__(self):
+        """Number of live global tracks across shards."""
+        return sum(len(shard.tracks) for shard in list(self.shards.values()))
+
+    @property
+    def lock_wait(self):
+        """Total seconds writers have spent waiting on shard locks."""
+        return sum(shard.lock_wait for shard in list(self.shards.values()))
+
+    def _shard(self, source_id):
+        key = source_id if self.shard_by_source else None
+        shard = self.shards.get(key)
+        if shard is None:
+            with self._shards_lock:
+                shard = self.shards.get(key)
+                if shard is None:
+                    shard = self.shards[key] = _GalleryShard(self.index_factory(), self.snapshot_reads, self.timeout,
+                                                             self._track_changes, self.snapshot_refresh)
+        return shard
+
+    def check_dim(self, size: int):
+        """Fix the embedding size on first use and reject features of any other size with ValueError."""
+        if self.dim is None:
+            with self._shards_lock:
+                if self.dim is None:
+                    self.dim = size
+        if size != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {size}.")
+
+    def camera_bits(self, source_id) -> CameraBits:
+        """The camera bit assignment shared by the track records of one source."""
+        camera_bits = self._camera_bits.get(source_id)
+        if camera_bits is None:
+            with self._shards_lock:
+                camera_bits = self._camera_bits.setdefault(source_id, CameraBits())
+        return camera_bits
+
+    def enable_change_tracking(self):
+        """Start recording which global tracks change, for incremental persistence (see gallery_snapshot)."""
+        with self._shards_lock:
+            self._track_changes = True
+            for shard in self.shards.values():
+                shard.acquire()
+                try:
+                    if shard.dirty is None:
+                        # Everything already in the shard counts as changed
+                        shard.dirty, shard.removed = set(shard.tracks), set()
+                finally:
+                    shard.lock.release()
+
+    def collect_changes(self):
         """
-        Match features to global tracks or create a new global track.
+        Copy out the global tracks written and the IDs dropped since the previous call.
+
+        Each shard's lock is held only while its changed tracks are copied, so matching is
+        paused for O(changes), not O(gallery).
+
+        :return: ({global_id: TrackRecord copy}, set of removed global IDs).
         """
-        global_id = None
-        best_score = float('inf')
-        threshold = 0.5  # Similarity threshold
-
-        with self.lock:
-            for gid, track_data in self.global_tracks.items():
-                avg_feature = np.mean(track_data["features"], axis=0)
-                # Print the shapes of avg_feature and features
-                logging.info(f"avg_feature shape: {avg_feature.shape}, features shape: {features.shape}")
-
-                score = cosine(avg_feature.flatten(), features.flatten())
-
-                print(f"Score for global track {gid} is {score}")
-                if score < best_score and score < threshold:
-                    global_id = gid
-                    best_score = score
-
-            if global_id:
-                # Update existing global track
-                print(f"Updating global track {global_id} with camera {camera_id}")
-                average_features = (self.global_tracks[global_id]["features"] + features) / 2
-                self.global_tracks[global_id]["features"] = average_features
-                self.global_tracks[global_id]["cameras"].add(camera_id)
-                self.global_tracks[global_id]["last_seen"] = datetime.now()
+        changed, removed = {}, set()
+        for shard in list(self.shards.values()):
+            shard.acquire()
+            try:
+                if shard.dirty is None:
+                    continue
+                for global_id in shard.dirty:
+                    track = shard.tracks.get(global_id)
+                    if track is not None:
+                        changed[global_id] = track.copy()
+                removed |= shard.removed
+                shard.dirty, shard.removed = set(), set()
+            finally:
+                shard.lock.release()
+        return changed, removed - set(changed)
+
+    def restore(self, tracks, seen_at: float = None):
+        """
+        Load previously persisted global tracks, e.g. after a restart.
+
+        :param tracks: Mapping of global ID to TrackRecord, built with this tracker's ``camera_bits``.
+        :param seen_at: Monotonic time the tracks count as last seen for expiry and topology pruning; defaults
+            to now, giving every restored identity a full timeout to be re-sighted.
+        """
+        seen_at = seen_at if seen_at is not None else time.monotonic()
+        by_source = {}
+        for global_id, track in tracks.items():
+            by_source.setdefault(track.source_id if self.shard_by_source else None, []).append((global_id, track))
+        for source_id, entries in by_source.items():
+            shard = self._shard(source_id)
+            vectors = normalize(np.stack([track.features for _, track in entries]))
+            self.check_dim(vectors.shape[1])
+            shard.acquire()
+            try:
+                for (global_id, track), vector in zip(entries, vectors):
+                    shard.tracks[global_id] = track
+                    self._upsert(shard, global_id, vector, track.last_camera, seen_at)
+                    shard.expiry.touch(global_id, seen_at)
+                shard.publish(force=True)
+            finally:
+                shard.lock.release()
+
+    @staticmethod
+    def _to_feature(features):
+        """Collapse a track's feature history into a single float32 vector."""
+        features = np.asarray(features, dtype=np.float32)
+        if features.ndim > 1:
+            features = features.reshape(-1, features.shape[-1]).mean(axis=0)
+        return features
+
+    def _upsert(self, shard, global_id, vector, camera_id, seen_at):
+        if self.topology is not None:
+            shard.index.upsert(global_id, vector, camera_id, seen_at)
+        else:
+            shard.index.upsert(global_id, vector)
+
+    def _best_matches(self, index, embeddings, camera_id=None, now=None):
+        """
+        Score normalized query embeddings against a gallery index.
+
+        :param camera_id: Camera the embeddings come from, for topology pruning.
+        :param now: Monotonic time of the sighting, for topology pruning.
+        :return: A list of (global_id, cosine distance) per query; global_id is None when nothing is under the threshold.
+        """
+        if self.topology is not None:
+            keys, distances = index.search(embeddings, k=1, camera_id=camera_id, now=now)
+        else:
+            keys, distances = index.search(embeddings, k=1)
+        matches = []
+        for row_keys, row_distances in zip(keys, distances):
+            if not row_keys:
+                matches.append((None, float('inf')))
+            elif row_distances[0] < self.threshold:
+                matches.append((row_keys[0], float(row_distances[0])))
             else:
-                # Create a new global track
-                print(f"Creating new global track with camera {camera_id}")
-                global_id = str(uuid.uuid4())
-                self.global_tracks[global_id] = {
-                    "source_id": source_id,
-                    "cameras": {camera_id},
-                    "features": features,
-                    "first_seen": datetime.now(),
-                    "last_seen": datetime.now(),
-                }
+                matches.append((None, float(row_distances[0])))
+        return matches
+
+    def _update_or_create(self, shard, global_id, source_id, camera_id, features, seen_at=None):
+        """
+        Fold normalized features into a matched global track, or create a new one when global_id is None.
+        """
+        seen_at = seen_at if seen_at is not None else time.monotonic()
+        if global_id:
+            # Update existing global track
+            logging.debug(f"Updating global track {global_id} with camera {camera_id}")
+            track = shard.tracks[global_id]
+            track.update(features, camera_id, seen_at, self.ema_alpha)
+        else:
+            # Create a new global track
+            logging.debug(f"Creating new global track with camera {camera_id}")
+            global_id = str(uuid.uuid4())
+            track = shard.tracks[global_id] = TrackRecord.first_sighting(
+                source_id, self.camera_bits(source_id), camera_id, features, seen_at, self.embedding_dtype)
+        self._upsert(shard, global_id, normalize(track.features), camera_id, seen_at)
+        shard.expiry.touch(global_id, seen_at)
+        if shard.dirty is not None:
+            shard.dirty.add(global_id)
+        return global_id
+
+    def match_and_update(self, source_id, camera_id, features, seen_at: float = None):
+        """
+        Match features to global tracks or create a new global track.
+
+        :return: The global ID the features were assigned to.
+        """
+        return self.match_batch(source_id, camera_id, [features], seen_at)[0]
+
+    def match_batch(self, source_id, camera_id, features_list, seen_at: float = None):
+        """
+        Match several features from one camera against the gallery with a single index search.
+
+        With snapshot reads, scoring runs against the shard's last published snapshot without locking.
+        Under the writer lock, queries whose match has expired meanwhile, or that matched nothing
+        in a snapshot older than the live index, are re-checked against it before new tracks are created.
+
+        :param seen_at: Monotonic time the features were captured (see track_record.from_epoch); defaults to now.
+        :return: The global ID assigned to each entry of features_list, in order.
+        :raises ValueError: If the features' size differs from the gallery's.
+        """
+        if not features_list:
+            return []
+
+        features = [self._to_feature(f) for f in features_list]
+        queries = normalize(np.stack(features))
+        self.check_dim(queries.shape[1])
+        now = seen_at if seen_at is not None else time.monotonic()
+        shard = self._shard(source_id)
+        version, snapshot = shard.snapshot
+        if snapshot is not None:
+            matches = [global_id for global_id, _ in self._best_matches(snapshot, queries, camera_id, now)]
+
+        shard.acquire()
+        try:
+            if snapshot is None:
+                matches = [global_id for global_id, _ in self._best_matches(shard.index, queries, camera_id, now)]
+            elif shard.version != version:
+                stale = [i for i, global_id in enumerate(matches) if global_id is None or global_id not in shard.tracks]
+                if stale:
+                    rechecked = self._best_matches(shard.index, queries[stale], camera_id, now)
+                    for i, (global_id, _) in zip(stale, rechecked):
+                        matches[i] = global_id
+
+            global_ids = [
+                self._update_or_create(shard, global_id, source_id, camera_id, query, now)
+                for global_id, query in zip(matches, queries)
+            ]
+            shard.publish()
+        finally:
+            shard.lock.release()
+
+        created = sum(1 for global_id, assigned in zip(matches, global_ids) if global_id != assigned)
+        GALLERY_MATCHES.labels("new").inc(created)
+        GALLERY_MATCHES.labels("matched").inc(len(global_ids) - created)
+        return global_ids
 
     def handle_global_tracks(self):
-        """Handle active and disappeared tracks globally."""
-        timeout = 10  # Timeout period in seconds
-        current_time = datetime.now()
-
-        with self.lock:
-            for gid, track_data in list(self.global_tracks.items()):
-                last_seen = track_data["last_seen"]
-                if (current_time - last_seen).total_seconds() > timeout:
-                    print(f"Person with global track {gid} has disappeared from all sources.")
-                    del self.global_tracks[gid]
+        """Handle active and disappeared tracks globally, visiting only tracks whose timeout has passed."""
+        for shard in list(self.shards.values()):
+            shard.acquire()
+            try:
+                expired = shard.expiry.advance()
+                for gid, _ in expired:
+                    logging.info(f"Person with global track {gid} has disappeared from all sources.")
+                    track = shard.tracks.pop(gid)
+                    shard.index.remove(gid)
+                    if shard.removed is not None:
+                        shard.dirty.discard(gid)
+                        shard.removed.add(gid)
+                    if self.on_disappear:
+                        self.on_disappear(gid, track)
+                if expired:
+                    shard.publish()
+            finally:
+                shard.lock.release()
@@ -0,0 +1,225 @@
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+
+class FrameShed(Exception):
+    """Raised from a frame's future when the scheduler dropped the frame instead of inferring it."""
+
+
+class _CameraState:
+    def __init__(self, weight, deadline, min_fps, queue_size, window):
+        self.weight = weight
+        self.deadline = deadline
+        self.min_fps = min_fps
+        self.frames = collections.deque(maxlen=queue_size)
+        self.deficit = 0.0
+        self.served = 0
+        self.shed = 0
+        self.window = window
+        self.served_at = collections.deque()
+        self.created = time.monotonic()
+
+    def achieved_fps(self, now):
+        while self.served_at and now - self.served_at[0] > self.window:
+            self.served_at.popleft()
+        return len(self.served_at) / max(min(self.window, now - self.created), 1e-3)
+
+
+class FairInferenceScheduler:
+    """
+    Decides which cameras' frames reach a shared detector when it cannot keep up with all of them.
+
+    Every camera has a weight, a per-frame deadline and a minimum FPS. Frames whose deadline
+    passes before they are picked are shed. Cameras running below their minimum FPS are served
+    first; the remaining capacity is shared by deficit round-robin in proportion to weight.
+    Selected frames are passed to ``infer_fn`` in batches of up to ``max_batch_size``.
+    """
+
+    def __init__(self, infer_fn, max_batch_size: int = 1, weight: float = 1.0, deadline: float = 0.5,
+                 min_fps: float = 0.0, queue_size: int = 2, window: float = 5.0):
+        """
+        :param infer_fn: Callable taking a list of frames and returning a list of results in the same order,
+            e.g. ``Detector.detect``.
+        :param max_batch_size: Maximum number of frames per infer_fn call.
+        :param weight: Default share of a camera under contention.
+        :param deadline: Default seconds a frame may wait before it is shed.
+        :param min_fps: Default minimum FPS a camera is prioritized to reach.
+        :param queue_size: Frames queued per camera; the oldest is shed when a new one arrives on a full queue.
+        :param window: Seconds over which achieved FPS is measured.
+        """
+        if weight <= 0:
+            raise ValueError("weight must be positive.")
+
+        self.infer_fn = infer_fn
+        self.max_batch_size = max_batch_size
+        self.defaults = {"weight": weight, "deadline": deadline, "min_fps": min_fps}
+        self.queue_size = queue_size
+        self.window = window
+        self.cameras = collections.OrderedDict()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._dispatcher = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._dispatcher.start()
+
+    def configure(self, camera_id, weight: float = None, deadline: float = None, min_fps: float = None):
+        """Set a camera's weight, frame deadline (seconds) and minimum FPS; unset values keep their defaults."""
+        if weight is not None and weight <= 0:
+            raise ValueError("weight must be positive.")
+        with self._condition:
+            state = self._camera(camera_id)
+            if weight is not None:
+                state.weight = weight
+            if deadline is not None:
+                state.deadline = deadline
+            if min_fps is not None:
+                state.min_fps = min_fps
+
+    def _camera(self, camera_id):
+        state = self.cameras.get(camera_id)
+        if state is None:
+            state = self.cameras[camera_id] = _CameraState(
+                self.defaults["weight"], self.defaults["deadline"], self.defaults["min_fps"], self.queue_size, self.window
+            )
+        return state
+
+    def submit(self, camera_id, frame) -> Future:
+        """
+        Queue a frame for inference.
+
+        :return: A future resolved with the frame's result, or failed with FrameShed if it was dropped.
+        """
+        future = Future()
+        with self._condition:
+            state = self._camera(camera_id)
+            if len(state.frames) == state.frames.maxlen:
+                _, (_, shed_future) = state.frames[0]
+                state.shed += 1
+                shed_future.set_exception(FrameShed(f"Superseded by a newer frame from camera {camera_id}."))
+            state.frames.append((time.monotonic() + state.deadline, (frame, future)))
+            self._condition.notify()
+        return future
+
+    def detector_for(self, camera_id):
+        """Return a Detector-compatible view of the scheduler for one camera (see ScheduledDetector)."""
+        return ScheduledDetector(self, camera_id)
+
+    def _shed_expired(self, now):
+        for camera_id, state in self.cameras.items():
+            while state.frames and state.frames[0][0] < now:
+                _, (_, future) = state.frames.popleft()
+                state.shed += 1
+                future.set_exception(FrameShed(f"Deadline passed for frame from camera {camera_id}."))
+
+    def _pick(self, now):
+        """Select the next frame: starved cameras first, then deficit round-robin by weight."""
+        starved = []
+        for camera_id, state in self.cameras.items():
+            if state.frames and state.min_fps > 0:
+                ratio = state.achieved_fps(now) / state.min_fps
+                if ratio < 1.0:
+                    starved.append((ratio, camera_id))
+        if starved:
+            camera_id = min(starved)[1]
+            return camera_id, self.cameras[camera_id]
+
+        # The camera at the head of the round keeps the turn while its deficit covers a frame
+        # (one unit each); passing the turn tops the next camera's deficit up by its weight
+        while True:
+            camera_id, state = next(iter(self.cameras.items()))
+            if state.frames and state.deficit >= 1.0:
+                state.deficit -= 1.0
+                return camera_id, state
+            if not state.frames:
+                state.deficit = 0.0
+            self.cameras.move_to_end(camera_id)
+            _, head = next(iter(self.cameras.items()))
+            if head.frames:
+                head.deficit += head.weight
+
+    def _collect(self):
+        with self._condition:
+            while not self._stopped and not any(state.frames for state in self.cameras.values()):
+                self._condition.wait(0.1)
+            now = time.monotonic()
+            self._shed_expired(now)
+
+            batch = []
+            while len(batch) < self.max_batch_size and any(state.frames for state in self.cameras.values()):
+                camera_id, state = self._pick(now)
+                _, (frame, future) = state.frames.popleft()
+                if future.set_running_or_notify_cancel():
+                    state.served += 1
+                    state.served_at.append(now)
+                    batch.append((frame, future))
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                if self._stopped:
+                    return
+                continue
+            try:
+                results = list(self.infer_fn([frame for frame, _ in batch]))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"infer_fn returned {len(results)} results for {len(batch)} frames.")
+            except Exception as e:
+                logging.error(f"Scheduled inference of {len(batch)} frames failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        """Per-camera achieved FPS and served/shed/queued frame counts."""
+        with self._condition:
+            now = time.monotonic()
+            return {
+                camera_id: {
+                    "achieved_fps": state.achieved_fps(now),
+                    "served": state.served,
+                    "shed": state.shed,
+                    "queued": len(state.frames),
+                    "weight": state.weight,
+                    "min_fps": state.min_fps,
+                }
+                for camera_id, state in self.cameras.items()
+            }
+
+    def close(self):
+        """Serve what is queued and stop the dispatcher thread."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._dispatcher.join()
+        logging.info(f"Inference scheduler closed: {self.stats()}")
+
+
+class ScheduledDetector:
+    """Per-camera handle with the ``Detector.detect`` interface that routes frames through the scheduler."""
+
+    def __init__(self, scheduler: FairInferenceScheduler, camera_id):
+        self.scheduler = scheduler
+        self.camera_id = camera_id
+
+    def detect(self, frames):
+        """
+        Infer frames through the scheduler.
+
+        :return: One result per frame, None for frames that were shed.
+        """
+        results = []
+        for future in [self.scheduler.submit(self.camera_id, frame) for frame in frames]:
+            try:
+                results.append(future.result())
+            except FrameShed:
+                results.append(None)
+        return results
@@ -1,31 +1,77 @@
+# First, so startup timings cover the remaining imports
+from startup import Startup, warm_up_detector, warm_up_embedder
+
 import logging
 import os
 
-from deep_sort_realtime.deepsort_tracker import DeepSort
-from ultralytics import YOLO
-
-from azure_event_hub_client import AzureEventHubClient
-from azure_service_bus_client import AzureServiceBusClient
-from azure_app_config_client import AppConfigClient
-from video_processing_service import VideoProcessingService
-
 from dotenv import load_dotenv
 
+from metrics import GALLERY_SIZE, start_metrics_server
+
 # Load environment variables
 load_dotenv()
 
+
+def load_models(startup: Startup, batch_size: int, embedder_batch_size: int):
+    """Import the vision stack, load the detector and the re-ID embedder, and warm both up with dummy inputs."""
+    with startup.phase("import_models"):
+        from batch_inference import create_embedder
+        from detectors import detector_from_env
+
+    with startup.phase("load_models"):
+        # Initialize the detector; DETECTOR_BACKEND selects ultralytics, onnx or openvino
+        detector = detector_from_env()
+        # One re-ID model shared by every camera's tracker
+        embedder = create_embedder(max_batch_size=embedder_batch_size)
+
+    with startup.phase("warm_up"):
+        warm_up_detector(detector, batch_sizes=(1, batch_size))
+        warm_up_embedder(embedder, batch_size=embedder_batch_size)
+    return detector, embedder
+
+
 def main_case1():
     """Case 1 is when single source of video stream is processed.
     There are no multi-cameras to detect similarities between
     sources to track the same object between different sources"""
-    # Fetch configuration settings from Azure App Configuration
-    config_client = AppConfigClient(os.getenv('APP_CONFIG_URL'))
-
-    service_bus_connection_str = config_client.fetch_configuration_value("ServiceBusConnectionString")
-    queue_name = config_client.fetch_configuration_value("SG_QueueName")
-
-    event_hub_connection_str = config_client.fetch_configuration_value("EventHubConnectionString")
-    event_hub_name = config_client.fetch_configuration_value("EventHubName")
+    startup = Startup("video-processing")
+    if os.getenv("METRICS_PORT"):
+        # Up first so liveness and /ready answer (503) while the rest starts
+        start_metrics_server(int(os.getenv("METRICS_PORT")), readiness=startup.ready)
+
+    # Cameras processed concurrently; their frames are detected in shared batches
+    inference_threads = int(os.getenv("INFERENCE_THREADS", "4"))
+    embedder_batch_size = int(os.getenv("EMBEDDER_MAX_BATCH_SIZE", "64"))
+
+    # The models load and warm up while configuration and clients are fetched
+    models = startup.in_background(load_models, startup, inference_threads, embedder_batch_size)
+
+    with startup.phase("imports"):
+        from azure_app_config_client import AppConfigClient
+        from deep_sort_realtime.deepsort_tracker import DeepSort
+
+        from azure_event_hub_client import AsyncAzureEventHubClient, AzureEventHubClient
+        from azure_service_bus_client import AzureServiceBusClient
+        from batch_inference import BatchedDetector, BatchedEmbedder
+        from camera_topology import load_camera_topology
+        from checkpoint_store import create_checkpoint_store
+        from gallery_snapshot import create_gallery_snapshotter
+        from global_tracker import GlobalTracker
+        from video_processing_service import VideoProcessingService, motion_gate_factory_from_env
+
+    with startup.phase("config"):
+        # Fetch configuration settings from Azure App Configuration; the first fetch bulk-loads every
+        # setting (APP_CONFIG_KEY_FILTER / APP_CONFIG_LABEL) and the rest are served from the cache
+        config_client = AppConfigClient(os.getenv('APP_CONFIG_URL'))
+        if os.getenv("APP_CONFIG_SENTINEL_KEY"):
+            config_client.start_refresh(os.getenv("APP_CONFIG_SENTINEL_KEY"),
+                                        interval=float(os.getenv("APP_CONFIG_REFRESH_INTERVAL", "30")))
+
+        service_bus_connection_str = config_client.fetch_configuration_value("ServiceBusConnectionString")
+        queue_name = config_client.fetch_configuration_value("SG_QueueName")
+
+        event_hub_connection_str = config_client.fetch_configuration_value("EventHubConnectionString")
+        event_hub_name = config_client.fetch_configuration_value("EventHubName")
 
     if not all([service_bus_connection_str, queue_name]):
         logging.error("Missing configuration values for Service Bus. Exiting.")
@@ -35,30 +81,82 @@ def main_case1():
         logging.error("Missing configuration values for Event Hub. Exiting.")
         exit(1)
 
-    # Initialize Azure Service Bus Client
-    service_bus_client = AzureServiceBusClient(service_bus_connection_str)
-
-    # Initialize Azure Event Hub Client
-    event_hub_client = AzureEventHubClient(event_hub_connection_str, event_hub_name)
-
+    with startup.phase("clients"):
+        # Initialize Azure Service Bus Client
+        service_bus_client = AzureServiceBusClient(service_bus_connection_str)
+
+        # Initialize Azure Event Hub Client, persisting checkpoints if a store is configured; the async
+        # client receives each partition independently
+        use_async = os.getenv("EVENT_HUB_ASYNC", "true").lower() == "true"
+        checkpoint_store = create_checkpoint_store(
+            blob_connection_string=config_client.fetch_configuration_value("CheckpointStoreConnectionString"),
+            blob_container=config_client.fetch_configuration_value("CheckpointStoreContainer"),
+            path=os.getenv("CHECKPOINT_STORE_PATH"),
+            asynchronous=use_async
+        )
+        event_hub_client_class = AsyncAzureEventHubClient if use_async else AzureEventHubClient
+        event_hub_client = event_hub_client_class(event_hub_connection_str, event_hub_name, checkpoint_store=checkpoint_store)
+
+    detector = shared_detector = embedder = snapshotter = None
     try:
-        # Initialize YOLO model
-        model = YOLO("yolov8n.pt")
-        tracker = DeepSort(max_age=30)
-
-        # Create the Video Processing Service instance
-        video_service = VideoProcessingService(model, tracker, event_hub_client, service_bus_client, queue_name)
+        detector, embedder_model = models.result()
+        shared_detector = BatchedDetector(detector, max_batch_size=inference_threads,
+                                          max_latency=float(os.getenv("INFERENCE_MAX_LATENCY_MS", "20")) / 1000)
+        embedder = BatchedEmbedder(embedder_model, max_batch_size=embedder_batch_size,
+                                   max_latency=float(os.getenv("EMBEDDER_MAX_LATENCY_MS", "10")) / 1000)
+        global_tracker = GlobalTracker(topology=load_camera_topology(),
+                                       ema_alpha=float(os.getenv("GALLERY_EMA_ALPHA", "0.1")),
+                                       embedding_dtype=os.getenv("GALLERY_EMBEDDING_DTYPE", "int8"))
+        GALLERY_SIZE.set_function(lambda: len(global_tracker))
+        snapshotter = create_gallery_snapshotter(global_tracker)
+        if snapshotter:
+            # Pick up the global IDs of people still in the store from before a restart
+            with startup.phase("restore_gallery"):
+                max_age = os.getenv("GALLERY_SNAPSHOT_MAX_AGE")
+                snapshotter.restore(max_age=float(max_age) if max_age else None)
+            snapshotter.start()
+
+        # Create the Video Processing Service instance; every camera found in the frames gets its own
+        # tracker, and cameras without frames for CAMERA_IDLE_TIMEOUT seconds are dropped
+        video_service = VideoProcessingService(shared_detector, None, global_tracker, service_bus_client, queue_name,
+                                               motion_gate_factory=motion_gate_factory_from_env(),
+                                               detector_imgsz=int(os.getenv("REDUCED_DECODE_IMGSZ", "0")) or None,
+                                               embedder=embedder,
+                                               tracker_factory=lambda: DeepSort(max_age=30, embedder=None),
+                                               camera_idle_timeout=float(os.getenv("CAMERA_IDLE_TIMEOUT", "300")))
+        video_service.event_hub_client = event_hub_client
+
+        # Ready once the models are warm; the listener starts consuming right away
+        startup.mark_ready()
 
         # Run the event hub listener to process frames from Azure Event Hub
-        video_service.run_event_hub_listener()
+        video_service.run_event_hub_listener(
+            decode_workers=int(os.getenv("DECODE_WORKERS", "2")),
+            queue_size=int(os.getenv("FRAME_QUEUE_SIZE", "1")),
+            overflow_policy=os.getenv("FRAME_OVERFLOW_POLICY", "latest"),
+            max_batch_size=int(os.getenv("EVENT_HUB_MAX_BATCH_SIZE", "64")),
+            max_wait_time=float(os.getenv("EVENT_HUB_MAX_WAIT_TIME", "1.0")),
+            checkpoint_interval=float(os.getenv("CHECKPOINT_INTERVAL")) if os.getenv("CHECKPOINT_INTERVAL") else None,
+            inference_workers=inference_threads
+        )
 
     except Exception as e:
         logging.error(f"Service encountered an error: {e}")
     finally:
+        startup.mark_not_ready()
+        if snapshotter:
+            snapshotter.close()
+        if shared_detector:
+            shared_detector.close()
+        if embedder:
+            embedder.close()
+        if detector:
+            detector.close()
         service_bus_client.close()
         if event_hub_client:
             event_hub_client.close()
+        config_client.close()
 
 
 if __name__ == "__main__":
-    main_case1()
\ No newline at end of file
+    main_case1()
@@ -0,0 +1,355 @@
+import bisect
+import json
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; spans a ~1 ms decode of a small frame up to a multi-second stall
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    """A metric family; labelled metrics hold one child per combination of label values."""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        self._function = None
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh child holding the value of one combination of label values."""
+
+    def labels(self, *values, **kwargs):
+        """Return the child for these label values, creating it on first use."""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def set_function(self, function):
+        """
+        Compute the value at scrape time instead of tracking it.
+
+        :param function: Returns a number, or for labelled metrics a mapping of label-value tuples to numbers.
+        """
+        self._function = function
+
+    def _samples(self):
+        """Yield (suffix, label values, extra labels, value) tuples."""
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception as e:
+                logging.error(f"Error computing metric {self.name}: {e}")
+                return
+            items = value.items() if isinstance(value, dict) else [((), value)]
+            for key, number in items:
+                yield self._value_suffix, tuple(key), (), number
+            return
+        for key, child in list(self._children.items()):
+            yield from child.samples(key)
+
+    _value_suffix = ""
+
+    def render(self, openmetrics: bool):
+        # OpenMetrics names a counter family without its _total suffix; the Prometheus text format with it
+        family = self.name if openmetrics or self.type_name != "counter" else self.name + "_total"
+        lines = [f"# HELP {family} {self.documentation}", f"# TYPE {family} {self.type_name}"]
+        for suffix, values, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        return lines
+
+    def __getattr__(self, attribute):
+        # Unlabelled metrics forward inc/set/observe/time to their single child
+        if attribute.startswith("_") or "_children" not in self.__dict__ or () not in self._children:
+            raise AttributeError(attribute)
+        return getattr(self._children[()], attribute)
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, key):
+        yield "_total", key, (), self.value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count; exposed with a ``_total`` suffix."""
+
+    type_name = "counter"
+    _value_suffix = "_total"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def samples(self, key):
+        yield "", key, (), self.value
+
+
+class Gauge(_Metric):
+    """A value that goes up and down."""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager observing the elapsed monotonic time of its block, in seconds."""
+        return _Timer(self)
+
+    def samples(self, key):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            yield "_bucket", key, (f'le="{_format_value(float(bound)) if bound != math.inf else "+Inf"}"',), cumulative
+        yield "_count", key, (), cumulative
+        yield "_sum", key, (), total
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+
+class Registry:
+    """Set of metric families rendered together on the metrics endpoint."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self, openmetrics: bool = True) -> str:
+        """Text exposition of every metric, in OpenMetrics or the Prometheus 0.0.4 text format."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render(openmetrics))
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Pipeline metrics shared by the CV service modules
+FRAMES = REGISTRY.counter("storeguard_frames", "Frames handled per camera, by outcome.", ("camera", "outcome"))
+STAGE_SECONDS = REGISTRY.histogram("storeguard_stage_seconds", "Per-frame time spent in each pipeline stage.", ("stage",))
+DETECTIONS = REGISTRY.histogram("storeguard_detections_per_frame", "Person detections per detected frame.", buckets=SIZE_BUCKETS)
+ACTIVE_TRACKS = REGISTRY.gauge("storeguard_active_tracks", "Confirmed local tracks per camera.", ("camera",))
+BATCH_SIZE = REGISTRY.histogram("storeguard_batch_size", "Items per micro-batch.", ("batcher",), buckets=SIZE_BUCKETS)
+PIPELINE_FRAMES = REGISTRY.counter("storeguard_pipeline_frames", "Decode-pipeline frames per camera, by outcome.", ("camera", "outcome"))
+EVENTS = REGISTRY.counter("storeguard_eventhub_events", "Events received from Event Hub, per partition.", ("partition",))
+CHECKPOINTS = REGISTRY.counter("storeguard_eventhub_checkpoints", "Event Hub checkpoints written, per partition.", ("partition",))
+GALLERY_SIZE = REGISTRY.gauge("storeguard_gallery_identities", "Global identities held by the gallery.")
+GALLERY_MATCHES = REGISTRY.counter("storeguard_gallery_matches", "Embeddings matched against the gallery, by result.", ("result",))
+GALLERY_CANDIDATES = REGISTRY.counter("storeguard_gallery_candidates", "Gallery embeddings scored per query, and held by the gallery at the time, with a camera topology.", ("kind",))
+MESSAGES = REGISTRY.counter("storeguard_servicebus_messages", "Service Bus messages, by queue and outcome.", ("queue", "outcome"))
+
+
+class StageTimer:
+    """``stage_timer`` for VideoProcessingService that feeds a per-stage latency histogram."""
+
+    def __init__(self, histogram: Histogram = STAGE_SECONDS):
+        self.histogram = histogram
+
+    def time(self, stage):
+        return self.histogram.labels(stage).time()
+
+
+class LogSampler:
+    """
+    Structured (JSON) logging for hot paths: at most one record per event key per interval.
+
+    Each record carries the number of occurrences suppressed since the previous one, so
+    volumes stay visible without logging every frame.
+    """
+
+    def __init__(self, interval: float = 10.0, logger=None):
+        """
+        :param interval: Minimum seconds between two records with the same key.
+        """
+        self.interval = interval
+        self.logger = logger or logging.getLogger("storeguard.sampled")
+        self._last = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def log(self, event: str, level: int = logging.INFO, key=None, **fields):
+        """
+        Log a structured record for this event unless one with the same key was logged within the interval.
+
+        :param key: Sampling key; defaults to the event name (e.g. pass (event, camera) to sample per camera).
+        """
+        key = key if key is not None else event
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last.get(key, -math.inf) < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, json.dumps({"event": event, "suppressed": suppressed, **fields}, default=str))
+
+
+LOG_SAMPLER = LogSampler()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+    readiness = None
+
+    def _send_status(self, ready: bool):
+        body = b"ok\n" if ready else b"starting\n"
+        self.send_response(200 if ready else 503)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/healthz":
+            self._send_status(True)
+            return
+        if path == "/ready":
+            self._send_status(self.readiness is None or self.readiness.is_set())
+            return
+        if path not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = self.registry.render(openmetrics).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are not worth a log line each
+
+
+def start_metrics_server(port: int, address: str = "0.0.0.0", registry: Registry = REGISTRY,
+                         readiness: threading.Event = None):
+    """
+    Serve the registry on http://address:port/metrics from a daemon thread; returns the server.
+
+    /healthz always answers 200 (liveness); /ready answers 503 until ``readiness`` is set.
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry, "readiness": readiness})
+    server = ThreadingHTTPServer((address, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Serving metrics on http://{address}:{server.server_address[1]}/metrics")
+    return server
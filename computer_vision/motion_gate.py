@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Decides per frame whether a camera's full detection needs to run.
+
+    Each frame is shrunk to a small blurred grayscale copy and compared against the copy
+    taken the last time detection ran. Detection runs when enough pixels changed, or when
+    ``max_skip`` frames in a row have been skipped so slow drifts are still picked up.
+    """
+
+    def __init__(self, motion_threshold: float = 0.005, pixel_threshold: int = 25, max_skip: int = 15, width: int = 160):
+        """
+        :param motion_threshold: Fraction of changed pixels above which the frame counts as moving.
+        :param pixel_threshold: Minimum absolute grayscale difference (0-255) for a pixel to count as changed.
+        :param max_skip: Maximum number of consecutive frames to skip before forcing detection.
+        :param width: Width of the downscaled comparison image; height keeps the aspect ratio.
+        """
+        self.motion_threshold = motion_threshold
+        self.pixel_threshold = pixel_threshold
+        self.max_skip = max_skip
+        self.width = width
+        self.frames = 0
+        self.skipped = 0
+        self._reference = None
+        self._consecutive_skips = 0
+
+    @property
+    def skip_ratio(self) -> float:
+        """Fraction of frames on which detection was skipped."""
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def _thumbnail(self, frame):
+        height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def should_detect(self, frame) -> bool:
+        """Return True if detection should run on this frame."""
+        self.frames += 1
+        thumbnail = self._thumbnail(frame)
+
+        if self._reference is not None and self._reference.shape == thumbnail.shape \
+                and self._consecutive_skips < self.max_skip:
+            changed = np.count_nonzero(cv2.absdiff(thumbnail, self._reference) > self.pixel_threshold)
+            if changed < self.motion_threshold * thumbnail.size:
+                self.skipped += 1
+                self._consecutive_skips += 1
+                return False
+
+        self._reference = thumbnail
+        self._consecutive_skips = 0
+        return True
+
+    def stats(self):
+        return {"frames": self.frames, "skipped": self.skipped, "skip_ratio": self.skip_ratio}
@@ -0,0 +1,281 @@
+import logging
+import multiprocessing
+import queue
+import time
+
+from frame_ring import SharedFrameRing
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Sequence numbers of successive incarnations of a camera worker never overlap, so results
+# addressed to a crashed predecessor cannot be mistaken for the new worker's own
+_GENERATION_STRIDE = 1 << 40
+
+
+class RingDetector:
+    """
+    Detector stand-in used inside a camera process.
+
+    Frames are written to the camera's shared-memory ring and only (camera, slot, sequence)
+    is sent to the inference processes; the (N, 6) detection arrays come back on the
+    camera's result queue.
+    """
+
+    def __init__(self, ring: SharedFrameRing, camera_index: int, requests, results, generation: int = 0,
+                 timeout: float = 5.0):
+        """
+        :param timeout: Seconds to wait for a frame's detections before treating it as shed.
+        """
+        self.ring = ring
+        self.camera_index = camera_index
+        self.requests = requests
+        self.results = results
+        self.sequence = generation * _GENERATION_STRIDE
+        self.timeout = timeout
+
+    def detect(self, frames):
+        return [self._detect_one(frame) for frame in frames]
+
+    def _detect_one(self, frame):
+        self.sequence += 1
+        sequence = self.sequence
+        slot = self.ring.write(sequence, frame)
+        self.requests.put((self.camera_index, slot, sequence))
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                result_sequence, detections = self.results.get(timeout=max(remaining, 0.001))
+            except queue.Empty:
+                logging.warning(f"No detections for frame {sequence} within {self.timeout}s; skipping it.")
+                return None
+            if result_sequence == sequence:
+                return detections
+            # Otherwise a late result for a frame that already timed out
+
+    def close(self):
+        pass
+
+
+class QueueGlobalTracker:
+    """Forwards global matching requests from a camera process to the supervisor, which owns the GlobalTracker."""
+
+    def __init__(self, tracks):
+        self.tracks = tracks
+
+    def match_and_update(self, source_id, camera_id, features):
+        self.tracks.put((source_id, camera_id, features))
+
+
+def inference_worker(ring_specs, requests, result_queues, stopped, max_batch_size):
+    """Serve detection requests from every camera's ring with one detector, batching what is queued."""
+    from detectors import detector_from_env
+    from startup import warm_up_detector
+
+    rings = [SharedFrameRing.attach(*spec) for spec in ring_specs]
+    detector = detector_from_env()
+    # Before taking requests, so a restarted worker's first batch is not its slowest
+    warm_up_detector(detector, batch_sizes=(1, max_batch_size))
+    try:
+        while not stopped.is_set():
+            try:
+                batch = [requests.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(batch) < max_batch_size:
+                try:
+                    batch.append(requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            pending, frames = [], []
+            for camera_index, slot, sequence in batch:
+                frame = rings[camera_index].read(slot, sequence)
+                if frame is not None:
+                    pending.append((camera_index, slot, sequence))
+                    frames.append(frame)
+            if not frames:
+                continue
+
+            for (camera_index, slot, sequence), detections in zip(pending, detector.detect(frames)):
+                # Drop results for frames overwritten while they were being inferred
+                if rings[camera_index].is_current(slot, sequence):
+                    result_queues[camera_index].put((sequence, detections))
+    finally:
+        detector.close()
+        for ring in rings:
+            ring.close()
+
+
+def camera_worker(camera_name, camera_index, ring_spec, requests, results, tracks, generation,
+                  service_bus_connection_str, queue_name, result_timeout):
+    """Run one camera's decode, motion gating and tracking, with detection served by the inference processes."""
+    from azure_service_bus_client import AzureServiceBusClient
+    from video_processing_service import start_camera_stream
+
+    ring = SharedFrameRing.attach(*ring_spec)
+    sb_client = AzureServiceBusClient(service_bus_connection_str) if service_bus_connection_str else None
+    detector = RingDetector(ring, camera_index, requests, results, generation, result_timeout)
+    try:
+        start_camera_stream(camera_name, QueueGlobalTracker(tracks), detector, sb_client, queue_name, display=False)
+    finally:
+        if sb_client:
+            sb_client.close()
+        ring.close()
+
+
+class _Worker:
+    def __init__(self, name, target, args_fn):
+        self.name = name
+        self.target = target
+        self.args_fn = args_fn
+        self.process = None
+        self.generation = -1
+        self.restarts = []
+        self.restart_at = None  # Monotonic time a pending restart is due
+
+
+class MultiProcessRunner:
+    """
+    Runs every camera in its own process and detection in a pool of inference processes.
+
+    Camera and inference processes exchange frames through one SharedFrameRing per camera;
+    only slot numbers, detection arrays and track embeddings cross process boundaries. The
+    supervisor (the calling process) owns the rings and the GlobalTracker, and restarts
+    workers that crash, up to ``max_restarts`` within ``restart_window`` seconds each.
+    """
+
+    def __init__(self, camera_names, global_tracker, service_bus_connection_str=None, queue_name=None,
+                 inference_workers: int = 1, max_batch_size: int = 8, slots: int = 2,
+                 max_frame_bytes: int = 1920 * 1080 * 3, result_timeout: float = 5.0,
+                 max_restarts: int = 5, restart_window: float = 60.0):
+        """
+        :param camera_names: Cameras to run, one process each.
+        :param global_tracker: GlobalTracker that receives every camera's confirmed track embeddings.
+        :param inference_workers: Number of detector processes.
+        :param max_batch_size: Maximum frames per detect call in an inference process.
+        :param slots: Frames per camera ring; also bounds how many of a camera's frames can be in flight.
+        :param max_frame_bytes: Largest decoded frame a ring slot holds.
+        :param result_timeout: Seconds a camera waits for detections before skipping the frame.
+        """
+        self.camera_names = list(camera_names)
+        self.global_tracker = global_tracker
+        self.service_bus_connection_str = service_bus_connection_str
+        self.queue_name = queue_name
+        self.max_batch_size = max_batch_size
+        self.result_timeout = result_timeout
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+
+        # Spawned rather than forked, so workers do not inherit the parent's model or thread state
+        self._context = multiprocessing.get_context("spawn")
+        self.rings = [SharedFrameRing.create(slots, max_frame_bytes) for _ in self.camera_names]
+        self.requests = self._context.Queue()
+        self.results = [self._context.Queue() for _ in self.camera_names]
+        self.tracks = self._context.Queue()
+        self.stopped = self._context.Event()
+
+        ring_specs = [ring.spec for ring in self.rings]
+        self.inference = [
+            _Worker(f"inference-{i}", inference_worker,
+                    lambda worker: (ring_specs, self.requests, self.results, self.stopped, self.max_batch_size))
+            for i in range(inference_workers)
+        ]
+        self.cameras = [
+            _Worker(f"camera-{name}", camera_worker,
+                    lambda worker, name=name, index=index: (
+                        name, index, ring_specs[index], self.requests, self.results[index], self.tracks,
+                        worker.generation, self.service_bus_connection_str, self.queue_name, self.result_timeout))
+            for index, name in enumerate(self.camera_names)
+        ]
+
+    def _start(self, worker):
+        worker.generation += 1
+        worker.process = self._context.Process(target=worker.target, args=worker.args_fn(worker),
+                                               name=worker.name, daemon=True)
+        worker.process.start()
+
+    def _supervise(self, worker) -> bool:
+        """
+        Schedule a restart of the worker if it died abnormally, and start it once the backoff has passed;
+        return False once it is gone for good.
+        """
+        if worker.restart_at is not None:
+            if time.monotonic() >= worker.restart_at:
+                worker.restart_at = None
+                self._start(worker)
+            return True
+        if worker.process.is_alive():
+            return True
+        if worker.process.exitcode == 0 and worker in self.cameras:
+            return False  # The camera ran out of frames
+
+        now = time.monotonic()
+        worker.restarts = [at for at in worker.restarts if now - at < self.restart_window]
+        if len(worker.restarts) >= self.max_restarts:
+            logging.error(f"{worker.name} exited with code {worker.process.exitcode} "
+                          f"{len(worker.restarts)} times in {self.restart_window}s; giving up on it.")
+            return False
+        worker.restarts.append(now)
+        # Back off exponentially on repeated crashes; the supervisor keeps draining tracks meanwhile
+        delay = min(2 ** (len(worker.restarts) - 1) * 0.5, 10.0)
+        logging.warning(f"{worker.name} exited with code {worker.process.exitcode}; restarting in {delay}s.")
+        worker.restart_at = now + delay
+        return True
+
+    def _next_check(self, check_interval):
+        """When to supervise next: after check_interval, or sooner if a restart falls due."""
+        due = [worker.restart_at for worker in self.cameras + self.inference if worker.restart_at is not None]
+        return min([time.monotonic() + check_interval] + due)
+
+    def _drain_tracks(self, timeout):
+        try:
+            source_id, camera_id, features = self.tracks.get(timeout=timeout)
+        except queue.Empty:
+            return
+        self.global_tracker.match_and_update(source_id, camera_id, features)
+        while True:
+            try:
+                source_id, camera_id, features = self.tracks.get_nowait()
+            except queue.Empty:
+                return
+            self.global_tracker.match_and_update(source_id, camera_id, features)
+
+    def run(self, check_interval: float = 1.0):
+        """Start the workers and supervise them until every camera has finished."""
+        for worker in self.inference + self.cameras:
+            self._start(worker)
+        logging.info(f"Started {len(self.cameras)} camera and {len(self.inference)} inference processes.")
+
+        running = list(self.cameras)
+        next_check = self._next_check(check_interval)
+        try:
+            while running:
+                self._drain_tracks(timeout=0.1)
+                if time.monotonic() >= next_check:
+                    running = [worker for worker in running if self._supervise(worker)]
+                    alive = [worker for worker in self.inference if self._supervise(worker)]
+                    if not alive:
+                        logging.error("No inference process left; stopping.")
+                        break
+                    self.inference = alive
+                    next_check = self._next_check(check_interval)
+            self._drain_tracks(timeout=0)
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop every worker and release the rings."""
+        self.stopped.set()
+        for worker in self.cameras + self.inference:
+            if worker.process is None:
+                continue
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        for ring in self.rings:
+            ring.close()
+        self.rings = []
@@ -1,54 +1,172 @@
-from flask import Flask, request
-import threading
-import time
+import asyncio
+import functools
 import json
+import logging
 import os
-from azure.servicebus import ServiceBusClient, ServiceBusMessage
+import sys
+import time
+from datetime import timezone
 
-app = Flask(__name__)
+import numpy as np
+from aiohttp import web
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from azure_service_bus_client import AzureServiceBusClient
+from camera_topology import load_camera_topology
+from gallery_index import create_index
+from gallery_snapshot import create_gallery_snapshotter
+from global_tracker import GlobalTracker
+from metrics import GALLERY_SIZE, OPENMETRICS_CONTENT_TYPE, PROMETHEUS_CONTENT_TYPE, REGISTRY
+from reid_wire import CONTENT_TYPE, decode_feature_batch
+from track_record import from_epoch, to_datetime
 
 SERVICEBUS_CONNECTION_STR = os.environ.get('SERVICEBUS_CONNECTION_STR')
 QUEUE_NAME = os.environ.get('QUEUE_NAME')
+PORT = int(os.environ.get('PORT', '5000'))
+SWEEP_INTERVAL = float(os.environ.get('SWEEP_INTERVAL', '1.0'))
+
+logging.basicConfig(level=logging.INFO)
 
-active_persons = {}
-lock = threading.Lock()
 
-def cleanup_inactive_persons():
+def send_departure(service_bus_client, global_id, track):
+    """Report a person who has left all cameras; buffered and batched by the Service Bus sender."""
+    message_content = json.dumps({
+        'uuid': global_id,
+        'start_time': to_datetime(track.first_seen).astimezone(timezone.utc).isoformat(),
+        'end_time': to_datetime(track.last_seen).astimezone(timezone.utc).isoformat(),
+        'source_id': track.source_id,
+        'cameras': sorted(track.cameras),
+    })
+    service_bus_client.enqueue_message_to_queue(QUEUE_NAME, message_content)
+    logging.info(f"Person {global_id} has left all cameras")
+
+
+async def sweep_global_tracks(app):
+    """Expire global tracks in the background; the expiry engine only visits tracks that are due."""
+    tracker = app['tracker']
     while True:
-        time.sleep(5)
-        current_time = time.time()
-        with lock:
-            inactive_persons = [person_id for person_id, last_seen in active_persons.items() if current_time - last_seen > 5]
-            for person_id in inactive_persons:
-                print(f"Person {person_id} has left all cameras")
-                send_message_to_service_bus(person_id)
-                del active_persons[person_id]
-
-def send_message_to_service_bus(person_id):
-    servicebus_client = ServiceBusClient.from_connection_string(conn_str=SERVICEBUS_CONNECTION_STR)
-    with servicebus_client:
-        sender = servicebus_client.get_queue_sender(queue_name=QUEUE_NAME)
-        with sender:
-            message = ServiceBusMessage(json.dumps({'person_id': person_id}))
-            sender.send_messages(message)
-            print(f"Sent message to Service Bus for person {person_id}")
-
-@app.route('/process_features', methods=['POST'])
-def process_features():
-    data = request.json
-    camera_id = data['camera_id']
-    features = data['features']
-    timestamp = data['timestamp']
-
-    person_id = 'person123'
-
-    with lock:
-        active_persons[person_id] = timestamp
-
-    print(f"Received features from {camera_id} for person {person_id}")
-    return '', 200
+        await asyncio.sleep(SWEEP_INTERVAL)
+        await asyncio.get_running_loop().run_in_executor(None, tracker.handle_global_tracks)
+
+
+def capture_time(timestamp):
+    """Monotonic time of a capture timestamp in Unix seconds, never later than now; None if it is unset."""
+    if not timestamp or not np.isfinite(timestamp):
+        return None
+    return min(from_epoch(timestamp), time.monotonic())
+
+
+async def match_groups(tracker, groups):
+    """
+    Match every group's embeddings against the gallery at their capture time, one batched search per group,
+    off the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(
+        loop.run_in_executor(None, tracker.match_batch, group.source_id, group.camera_id,
+                             list(np.asarray(group.features, dtype=np.float32)), capture_time(group.timestamp))
+        for group in groups
+    ))
+
+
+async def reid_batch(request):
+    """
+    Assign global IDs to a batch of embeddings.
+
+    The body is a binary batch (see reid_wire); the response lists the global IDs per group,
+    in the order of the embeddings.
+    """
+    if request.content_type != CONTENT_TYPE:
+        raise web.HTTPUnsupportedMediaType(text=f"Expected {CONTENT_TYPE}")
+    tracker = request.app['tracker']
+    try:
+        groups = decode_feature_batch(await request.read())
+        # Validated up front, so a bad group does not leave the others half-matched
+        for group in groups:
+            if len(group.features):
+                tracker.check_dim(group.features.shape[1])
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+
+    global_ids = await match_groups(tracker, groups)
+    return web.json_response({'global_ids': global_ids})
+
+
+async def process_features(request):
+    """Legacy single-detection endpoint taking JSON features."""
+    tracker = request.app['tracker']
+    try:
+        data = await request.json()
+        camera_id = data['camera_id']
+        source_id = data.get('source_id', camera_id)
+        features = np.asarray(data['features'], dtype=np.float32)
+        if features.ndim not in (1, 2) or not features.size:
+            raise ValueError("features must be a non-empty vector or list of vectors")
+        tracker.check_dim(features.shape[-1])
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise web.HTTPBadRequest(text=f"Invalid features request: {e!r}")
+
+    loop = asyncio.get_running_loop()
+    person_id = await loop.run_in_executor(None, tracker.match_and_update, source_id, camera_id, features)
+    return web.json_response({'global_id': person_id})
+
+
+async def metrics(request):
+    """Prometheus scrape endpoint, in OpenMetrics when the scraper asks for it."""
+    openmetrics = 'application/openmetrics-text' in request.headers.get('Accept', '')
+    return web.Response(
+        body=REGISTRY.render(openmetrics).encode(),
+        headers={'Content-Type': OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE},
+    )
+
+
+async def start_background_tasks(app):
+    app['sweeper'] = asyncio.create_task(sweep_global_tracks(app))
+    if app['snapshotter']:
+        app['snapshotter'].start()
+
+
+async def stop_background_tasks(app):
+    app['sweeper'].cancel()
+    await asyncio.gather(app['sweeper'], return_exceptions=True)
+    if app['snapshotter']:
+        app['snapshotter'].close()
+    app['service_bus_client'].close()
+
+
+def create_app():
+    service_bus_client = AzureServiceBusClient(SERVICEBUS_CONNECTION_STR)
+    tracker = GlobalTracker(
+        threshold=float(os.environ.get('REID_THRESHOLD', '0.5')),
+        timeout=float(os.environ.get('TRACK_TIMEOUT', '5')),
+        index_factory=functools.partial(create_index, os.environ.get('GALLERY_INDEX', 'exact')),
+        shard_by_source=os.environ.get('GALLERY_SHARD_BY_SOURCE', 'true').lower() == 'true',
+        on_disappear=functools.partial(send_departure, service_bus_client),
+        # CAMERA_TOPOLOGY (JSON or a path to it) limits matching to cameras a person could have walked from
+        topology=load_camera_topology(),
+        ema_alpha=float(os.environ.get('GALLERY_EMA_ALPHA', '0.1')),
+        embedding_dtype=os.environ.get('GALLERY_EMBEDDING_DTYPE', 'int8'),
+    )
+
+    GALLERY_SIZE.set_function(lambda: len(tracker))
+
+    # Persist the gallery under GALLERY_SNAPSHOT_DIR so global IDs survive restarts and redeploys
+    snapshotter = create_gallery_snapshotter(tracker)
+    if snapshotter:
+        max_age = os.environ.get('GALLERY_SNAPSHOT_MAX_AGE')
+        snapshotter.restore(max_age=float(max_age) if max_age else None)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app['tracker'] = tracker
+    app['snapshotter'] = snapshotter
+    app['service_bus_client'] = service_bus_client
+    app.router.add_post('/reid/batch', reid_batch)
+    app.router.add_post('/process_features', process_features)
+    app.router.add_get('/metrics', metrics)
+    app.on_startup.append(start_background_tasks)
+    app.on_cleanup.append(stop_background_tasks)
+    return app
+
 
 if __name__ == '__main__':
-    cleanup_thread = threading.Thread(target=cleanup_inactive_persons, daemon=True)
-    cleanup_thread.start()
-    app.run(host='0.0.0.0', port=5000)
+    web.run_app(create_app(), host='0.0.0.0', port=PORT)
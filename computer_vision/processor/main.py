@@ -1,39 +1,30 @@
 import sys
-import json
 import os
 from azure.eventhub import EventHubConsumerClient
 import time
-import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from feature_shipper import FeatureShipper
 
 EVENTHUB_CONNECTION_STR = os.environ.get('EVENTHUB_CONNECTION_STR')
 EVENTHUB_NAME = ''
 
 ORCHESTRATOR_URL = os.environ.get('ORCHESTRATOR_URL')
+SOURCE_ID = os.environ.get('SOURCE_ID', 'default')
 
-def on_event(partition_context, event):
-    frame_data = event.body_as_str()
-    print(f"Received frame from {EVENTHUB_NAME}: {frame_data}")
+shipper = None
 
+def on_event(partition_context, event):
     person_detected = True
     if person_detected:
-        features = {
-            'camera_id': EVENTHUB_NAME,
-            'features': [0.1, 0.2, 0.3],
-            'timestamp': time.time()
-        }
-        try:
-            response = requests.post(ORCHESTRATOR_URL, json=features)
-            if response.status_code == 200:
-                print(f"Features sent to orchestrator from {EVENTHUB_NAME}")
-            else:
-                print(f"Failed to send features: {response.status_code}")
-        except Exception as e:
-            print(f"Error sending features to orchestrator: {e}")
+        # Buffered and sent in batches over a keep-alive session; blocks here when the orchestrator
+        # falls behind, which stops this consumer from pulling more events until it catches up
+        shipper.submit(SOURCE_ID, EVENTHUB_NAME, [0.1, 0.2, 0.3], timestamp=time.time())
 
     partition_context.update_checkpoint(event)
 
 def main():
-    global EVENTHUB_NAME
+    global EVENTHUB_NAME, shipper
     if len(sys.argv) != 2:
         print("Usage: python processor.py <camera_id>")
         sys.exit(1)
@@ -50,6 +41,13 @@ def main():
         eventhub_name=EVENTHUB_NAME
     )
 
+    shipper = FeatureShipper(
+        ORCHESTRATOR_URL,
+        max_batch=int(os.environ.get('SHIP_MAX_BATCH', '64')),
+        max_delay=float(os.environ.get('SHIP_MAX_DELAY', '0.1')),
+        max_in_flight=int(os.environ.get('SHIP_MAX_IN_FLIGHT', '4'))
+    )
+
     print(f"Processor for {EVENTHUB_NAME} started")
 
     try:
@@ -60,6 +58,8 @@ def main():
             )
     except KeyboardInterrupt:
         print("Processor stopped")
+    finally:
+        shipper.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,93 @@
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+# Binary re-identification request, little-endian:
+#   magic "SGRI" | version u8 | reserved u8 | group count u16
+#   then per group (one source/camera each):
+#     dtype code u8 | reserved u8 | source_id length u16 | camera_id length u16 | reserved u16
+#     | embedding count u32 | embedding size u32 | timestamp f64 (Unix seconds)
+#     | source_id UTF-8 | camera_id UTF-8 | count * size embeddings of the given dtype
+MAGIC = b"SGRI"
+VERSION = 1
+CONTENT_TYPE = "application/x-storeguard-reid"
+_HEADER = struct.Struct("<4sBxH")
+_GROUP = struct.Struct("<BxHHxxIId")
+_DTYPES = {1: np.dtype("<f2"), 2: np.dtype("<f4")}
+_DTYPE_CODES = {dtype: code for code, dtype in _DTYPES.items()}
+
+
+class FeatureGroup(NamedTuple):
+    """Embeddings from one camera; ``features`` is a (count, size) view into the request body."""
+    source_id: str
+    camera_id: str
+    timestamp: float
+    features: np.ndarray
+
+
+def encode_feature_batch(groups, dtype="float16") -> bytes:
+    """
+    Pack groups of embeddings into one binary request body.
+
+    :param groups: Iterable of (source_id, camera_id, timestamp, features) where features is a (count, size) array.
+    :param dtype: Wire dtype of the embeddings, "float16" (half the size) or "float32".
+    """
+    dtype = np.dtype(dtype).newbyteorder("<")
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"Unsupported embedding dtype '{dtype}'. Use float16 or float32.")
+
+    groups = list(groups)
+    parts = [_HEADER.pack(MAGIC, VERSION, len(groups))]
+    for source_id, camera_id, timestamp, features in groups:
+        features = np.ascontiguousarray(np.atleast_2d(features), dtype=dtype)
+        source = source_id.encode("utf-8")
+        camera = camera_id.encode("utf-8")
+        parts.append(_GROUP.pack(_DTYPE_CODES[dtype], len(source), len(camera),
+                                 features.shape[0], features.shape[1], timestamp))
+        parts.extend((source, camera, features.tobytes()))
+    return b"".join(parts)
+
+
+def _unpack(layout: struct.Struct, view, offset: int = 0):
+    if offset + layout.size > len(view):
+        raise ValueError("Truncated re-identification batch.")
+    return layout.unpack_from(view, offset)
+
+
+def decode_feature_batch(body) -> list:
+    """
+    Unpack a binary request body into FeatureGroups without copying the embeddings.
+
+    :param body: The request body as bytes, bytearray or memoryview.
+    :raises ValueError: If the body is malformed or truncated.
+    """
+    view = memoryview(body).cast("B")
+    magic, version, group_count = _unpack(_HEADER, view)
+    if magic != MAGIC:
+        raise ValueError("Not a re-identification batch.")
+    if version != VERSION:
+        raise ValueError(f"Unsupported re-identification batch version {version}.")
+
+    groups = []
+    offset = _HEADER.size
+    for _ in range(group_count):
+        code, source_len, camera_len, count, size, timestamp = _unpack(_GROUP, view, offset)
+        if code not in _DTYPES:
+            raise ValueError(f"Unsupported embedding dtype code {code}.")
+        offset += _GROUP.size
+        if offset + source_len + camera_len > len(view):
+            raise ValueError("Truncated re-identification batch.")
+        source_id = str(view[offset:offset + source_len], "utf-8")
+        offset += source_len
+        camera_id = str(view[offset:offset + camera_len], "utf-8")
+        offset += camera_len
+
+        dtype = _DTYPES[code]
+        length = count * size * dtype.itemsize
+        if offset + length > len(view):
+            raise ValueError("Truncated re-identification batch.")
+        features = np.frombuffer(view, dtype=dtype, count=count * size, offset=offset).reshape(count, size)
+        offset += length
+        groups.append(FeatureGroup(source_id, camera_id, timestamp, features))
+    return groups
@@ -0,0 +1,116 @@
+import contextlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from metrics import REGISTRY
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+# Close to interpreter start: main modules import this one first
+PROCESS_STARTED = time.perf_counter()
+
+STARTUP_SECONDS = REGISTRY.gauge("storeguard_startup_phase_seconds", "Duration of each startup phase.", ("phase",))
+READY = REGISTRY.gauge("storeguard_ready", "1 once startup has finished and frames are being consumed.")
+
+
+class Startup:
+    """
+    Times the startup phases of a service and signals readiness once they are done.
+
+    Phases may run concurrently, e.g. loading the model in the background while configuration
+    and clients are fetched; ``mark_ready`` logs every phase's duration and the total since the
+    process started, and sets the ``ready`` event served by the metrics server's /ready endpoint.
+    """
+
+    def __init__(self, name: str = "service", readiness_file: str = None):
+        """
+        :param name: Service name used in log lines.
+        :param readiness_file: Optional path created on readiness, for exec-style readiness probes;
+            defaults to READINESS_FILE.
+        """
+        self.name = name
+        self.readiness_file = readiness_file if readiness_file is not None else os.getenv("READINESS_FILE")
+        self.ready = threading.Event()
+        self.phases = {}
+        self._lock = threading.Lock()
+        self._background = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager recording how long a startup phase takes."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            STARTUP_SECONDS.labels(name).set(self.phases[name])
+            logging.info(f"{self.name} startup: {name} took {elapsed:.2f}s")
+
+    def in_background(self, function, *args, **kwargs):
+        """
+        Run startup work on a background thread, overlapping it with the caller's own phases;
+        the function times its own phases with ``phase``.
+
+        :return: A Future with the function's result; ``result()`` re-raises its exception.
+        """
+        if self._background is None:
+            self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup")
+        return self._background.submit(function, *args, **kwargs)
+
+    def mark_ready(self):
+        """Report the phase timings and signal that the service is ready."""
+        if self._background is not None:
+            self._background.shutdown(wait=False)
+            self._background = None
+        total = time.perf_counter() - PROCESS_STARTED
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items())
+        logging.info(f"{self.name} ready {total:.2f}s after start ({phases})")
+        STARTUP_SECONDS.labels("total").set(total)
+        READY.set(1)
+        if self.readiness_file:
+            with open(self.readiness_file, "w") as f:
+                f.write(f"{total:.3f}\n")
+        self.ready.set()
+
+    def mark_not_ready(self):
+        """Withdraw readiness, e.g. when consumption stops before shutdown."""
+        self.ready.clear()
+        READY.set(0)
+        if self.readiness_file and os.path.exists(self.readiness_file):
+            os.remove(self.readiness_file)
+
+
+def warm_up_detector(detector, batch_sizes=(1,), frame_shape=None):
+    """
+    Run a detector on blank frames so model fusing, graph compilation and allocator growth
+    happen before the first real frame.
+
+    :param detector: A detectors.Detector (not a batching wrapper, whose batches would be size 1).
+    :param batch_sizes: Batch sizes to run once each; include the production batch size so
+        backends that specialize per input shape are warm for it too.
+    :param frame_shape: (height, width) of the dummy frames; defaults to the detector's input size.
+    """
+    height, width = frame_shape or (detector.imgsz, detector.imgsz)
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    for batch_size in dict.fromkeys(batch_sizes):
+        detector.detect([frame] * batch_size)
+
+
+def warm_up_embedder(embedder, batch_size: int = 1, crop_shape=(128, 64)):
+    """
+    Run a re-ID embedder on blank person crops ahead of the first real detections.
+
+    :param embedder: A deep_sort_realtime embedder exposing ``predict(crops)``, or a BatchedEmbedder.
+    :param batch_size: Number of crops in the warm-up batch.
+    :param crop_shape: (height, width) of the dummy crops.
+    """
+    model = getattr(embedder, "embedder", embedder)
+    model.predict([np.zeros((*crop_shape, 3), dtype=np.uint8)] * batch_size)
@@ -0,0 +1,117 @@
+import threading
+
+import numpy as np
+import pytest
+
+from batch_inference import BatchedEmbedder, MicroBatcher
+
+
+def test_items_from_many_threads_are_batched_in_order():
+    calls = []
+
+    def double(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=4, max_latency=0.05)
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, batcher(i))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    assert results == {i: i * 2 for i in range(8)}
+    assert all(len(batch) <= 4 for batch in calls)
+    assert batcher.items == 8 and batcher.average_batch_size > 1
+
+
+def test_batch_is_flushed_after_max_latency():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=64, max_latency=0.01)
+    assert batcher.submit("frame").result(timeout=1) == "frame"
+    batcher.close()
+
+
+def test_failing_batch_fails_every_future():
+    def fail(items):
+        raise ValueError("model crashed")
+
+    batcher = MicroBatcher(fail, max_batch_size=2, max_latency=0.05)
+    futures = [batcher.submit(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(ValueError, match="model crashed"):
+            future.result(timeout=1)
+    batcher.close()
+
+
+def test_short_batch_result_fails_every_future():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=3, max_latency=0.05)
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="returned 2 results for 3 items"):
+            future.result(timeout=1)
+    batcher.close()
+
+
+def test_submit_after_close_is_rejected():
+    batcher = MicroBatcher(lambda items: items)
+    batcher.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        batcher.submit(1)
+
+
+def test_close_flushes_queued_items():
+    release = threading.Event()
+
+    def slow(items):
+        release.wait(1)
+        return items
+
+    batcher = MicroBatcher(slow, max_batch_size=1, max_latency=0.0)
+    futures = [batcher.submit(i) for i in range(3)]
+    release.set()
+    batcher.close()
+    assert [future.result(timeout=0) for future in futures] == [0, 1, 2]
+
+
+class ShapeEmbedder:
+    """Embeds a crop as its (height, width); like the re-ID model, fails the whole batch on an empty crop."""
+
+    def predict(self, crops):
+        if any(crop.size == 0 for crop in crops):
+            raise ValueError("empty crop")
+        return [crop.shape[:2] for crop in crops]
+
+
+def test_embedder_drops_detections_without_a_crop_and_keeps_alignment():
+    embedder = BatchedEmbedder(ShapeEmbedder(), max_batch_size=16, max_latency=0.01)
+    frame = np.zeros((100, 200, 3), dtype=np.uint8)
+    detections = [
+        ((10, 10, 0, 40), 0.9, "person"),    # no width
+        ((20, 10, 30, 40), 0.8, "person"),
+        ((50, 60, 20, 0), 0.7, "person"),    # no height
+        ((250, 10, 20, 40), 0.6, "person"),  # outside the frame
+        ((190, 90, 30, 30), 0.5, "person"),  # clipped to 10 x 10
+    ]
+    kept, embeds = embedder.embed(frame, detections)
+    embedder.close()
+
+    assert kept == [detections[1], detections[4]]
+    assert embeds == [(40, 30), (10, 10)]
+
+
+def test_degenerate_box_does_not_fail_other_cameras_in_the_shared_batch():
+    embedder = BatchedEmbedder(ShapeEmbedder(), max_batch_size=16, max_latency=0.05)
+    frame = np.zeros((100, 200, 3), dtype=np.uint8)
+    results = {}
+    cameras = {"a": [((0, 0, 0, 10), 0.9, "person")], "b": [((0, 0, 10, 20), 0.9, "person")]}
+    threads = [threading.Thread(target=lambda c=c: results.__setitem__(c, embedder.embed(frame, cameras[c])))
+               for c in cameras]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    embedder.close()
+
+    assert results == {"a": ([], []), "b": (cameras["b"], [(20, 10)])}
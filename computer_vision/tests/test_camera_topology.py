@@ -0,0 +1,89 @@
+import math
+
+import numpy as np
+import pytest
+
+from camera_topology import CameraTopology, TopologyIndex, load_camera_topology
+from gallery_index import normalize
+from global_tracker import GlobalTracker
+
+CONFIG = {
+    "reentry_max": 600,
+    "transitions": [
+        {"from": "entrance", "to": "aisle-1", "min": 2, "max": 60, "bidirectional": True},
+        {"from": "aisle-1", "to": "checkout", "max": 300},
+    ],
+}
+
+
+def vectors(count, dim=16, seed=0):
+    return normalize(np.random.default_rng(seed).normal(size=(count, dim))).astype(np.float32)
+
+
+def test_config_builds_transit_windows():
+    topology = CameraTopology.from_config(CONFIG)
+    assert topology.predecessors("aisle-1") == {"entrance": (2.0, 60.0), "aisle-1": (0.0, 600.0)}
+    assert topology.predecessors("checkout") == {"aisle-1": (0.0, 300.0), "checkout": (0.0, 600.0)}
+    assert topology.predecessors("entrance") == {"aisle-1": (2.0, 60.0), "entrance": (0.0, 600.0)}
+    assert topology.predecessors("parking") is None and "parking" not in topology
+
+
+def test_repeated_transitions_widen_the_window():
+    topology = CameraTopology([("a", "b", 5, 10), ("a", "b", 2, 8)])
+    assert topology.predecessors("b")["a"] == (2, 10)
+    assert topology.predecessors("b")["b"] == (0.0, math.inf)
+    with pytest.raises(ValueError):
+        CameraTopology([("a", "b", 10, 5)])
+
+
+def test_load_from_json_or_path(tmp_path, monkeypatch):
+    path = tmp_path / "topology.json"
+    path.write_text('{"transitions": [{"from": "a", "to": "b"}]}')
+    assert load_camera_topology(str(path)).cameras == ["a", "b"]
+    monkeypatch.setenv("CAMERA_TOPOLOGY", '{"transitions": []}')
+    assert load_camera_topology().cameras == []
+    monkeypatch.delenv("CAMERA_TOPOLOGY")
+    assert load_camera_topology() is None
+
+
+def test_search_only_scores_reachable_tracks():
+    index = TopologyIndex(CameraTopology.from_config(CONFIG))
+    at_entrance, at_checkout, unlisted, too_recent = vectors(4)
+    index.upsert("at-entrance", at_entrance, "entrance", seen_at=100.0)
+    index.upsert("at-checkout", at_checkout, "checkout", seen_at=100.0)
+    index.upsert("unlisted", unlisted, "parking", seen_at=100.0)
+    index.upsert("too-recent", too_recent, "entrance", seen_at=109.0)
+
+    reachable = lambda camera_id, now: sorted(index.search(vectors(4), k=4, camera_id=camera_id, now=now)[0][0])
+    # Entrance -> aisle-1 takes 2-60s; checkout cannot reach aisle-1; unlisted cameras are never pruned
+    assert reachable("aisle-1", 110.0) == ["at-entrance", "unlisted"]
+    assert reachable("aisle-1", 200.0) == ["unlisted"]
+    assert reachable("parking", 110.0) == ["at-checkout", "at-entrance", "too-recent", "unlisted"]
+    assert reachable(None, 110.0) == ["at-checkout", "at-entrance", "too-recent", "unlisted"]
+
+
+def test_moving_and_removing_tracks_keeps_buckets_consistent():
+    index = TopologyIndex(CameraTopology.from_config(CONFIG))
+    first, second = vectors(2)
+    index.upsert("a", first, "entrance", seen_at=0.0)
+    index.upsert("b", second, "entrance", seen_at=0.0)
+    snapshot = index.copy()
+    index.upsert("a", first, "checkout", seen_at=50.0)
+    index.remove("b")
+
+    assert len(index) == 1 and "b" not in index
+    assert index.search(first[None], camera_id="checkout", now=60.0)[0] == [["a"]]
+    assert index.search(first[None], camera_id="aisle-1", now=60.0)[0] == [[]]
+    # The copy is unaffected
+    assert sorted(snapshot.keys()) == ["a", "b"]
+    assert snapshot.search(first[None], camera_id="aisle-1", now=30.0)[0] == [["a"]]
+
+
+def test_tracker_does_not_match_across_unreachable_cameras():
+    tracker = GlobalTracker(threshold=0.3, topology=CameraTopology.from_config(CONFIG))
+    person = vectors(1)[0]
+    first = tracker.match_and_update("store", "checkout", person, seen_at=100.0)
+    # Nobody walks from checkout to the entrance, but re-entering checkout is plausible
+    assert tracker.match_and_update("store", "entrance", person, seen_at=110.0) != first
+    assert tracker.match_and_update("store", "checkout", person, seen_at=120.0) == first
+    assert len(tracker) == 2
@@ -0,0 +1,85 @@
+import asyncio
+import multiprocessing
+import time
+
+from checkpoint_store import AsyncCheckpointStore, FileCheckpointStore
+
+NAMESPACE, EVENTHUB, GROUP = "storeguard.servicebus.windows.net", "frames", "$Default"
+
+
+def ownership(partition_id, owner_id, etag=None):
+    record = {"fully_qualified_namespace": NAMESPACE, "eventhub_name": EVENTHUB, "consumer_group": GROUP,
+              "partition_id": partition_id, "owner_id": owner_id}
+    if etag is not None:
+        record["etag"] = etag
+    return record
+
+
+def listed(store):
+    return {record["partition_id"]: record for record in store.list_ownership(NAMESPACE, EVENTHUB, GROUP)}
+
+
+def test_ownership_times_support_the_load_balancer_arithmetic(tmp_path):
+    store = FileCheckpointStore(str(tmp_path / "checkpoints.json"))
+    claimed = store.claim_ownership([ownership("0", "pod-a")])
+    # The Event Hub load balancer compares last_modified_time + ownership_timeout with time.time()
+    assert claimed[0]["last_modified_time"] + 60 > time.time()
+    assert listed(store)["0"]["last_modified_time"] + 60 > time.time()
+
+    # Renewing and releasing reuse the listed record, as repeated balance cycles do
+    renewed = store.claim_ownership([listed(store)["0"]])
+    assert renewed[0]["etag"] != claimed[0]["etag"]
+    released = dict(renewed[0], owner_id="")
+    assert store.claim_ownership([released])
+    assert listed(store)["0"]["owner_id"] == ""
+
+
+def test_stale_etag_loses_the_claim(tmp_path):
+    store = FileCheckpointStore(str(tmp_path / "checkpoints.json"))
+    first = store.claim_ownership([ownership("0", "pod-a")])[0]
+    store.claim_ownership([dict(first, owner_id="pod-b")])
+    assert store.claim_ownership([dict(first, owner_id="pod-c")]) == []
+    assert listed(store)["0"]["owner_id"] == "pod-b"
+
+
+def test_stores_sharing_a_path_see_each_others_claims(tmp_path):
+    path = str(tmp_path / "checkpoints.json")
+    pod_a, pod_b = FileCheckpointStore(path), FileCheckpointStore(path)
+
+    claim = pod_a.claim_ownership([ownership("0", "pod-a")])[0]
+    assert listed(pod_b)["0"]["owner_id"] == "pod-a"
+    # pod-b has not seen pod-a's etag, so its claim of the partition must fail
+    assert pod_b.claim_ownership([ownership("0", "pod-b", etag="stale")]) == []
+    assert pod_b.claim_ownership([dict(claim, owner_id="pod-b")])
+    assert listed(pod_a)["0"]["owner_id"] == "pod-b"
+
+    pod_a.update_checkpoint(dict(ownership("0", "pod-a"), offset="10", sequence_number=10))
+    pod_b.update_checkpoint(dict(ownership("1", "pod-b"), offset="20", sequence_number=20))
+    checkpoints = pod_a.list_checkpoints(NAMESPACE, EVENTHUB, GROUP)
+    assert sorted(checkpoint["sequence_number"] for checkpoint in checkpoints) == [10, 20]
+
+
+def _claim_partitions(path, owner_id, partitions):
+    store = FileCheckpointStore(path)
+    for partition_id in partitions:
+        store.claim_ownership([ownership(partition_id, owner_id)])
+
+
+def test_processes_sharing_a_path_do_not_lose_claims(tmp_path):
+    path = str(tmp_path / "checkpoints.json")
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_claim_partitions, args=(path, f"pod-{i}", [f"{i}-{n}" for n in range(20)]))
+               for i in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert len(listed(FileCheckpointStore(path))) == 60
+
+
+def test_async_store_returns_epoch_seconds(tmp_path):
+    store = AsyncCheckpointStore(FileCheckpointStore(str(tmp_path / "checkpoints.json")))
+    claimed = asyncio.run(store.claim_ownership([ownership("0", "pod-a")]))
+    records = asyncio.run(store.list_ownership(NAMESPACE, EVENTHUB, GROUP))
+    assert isinstance(claimed[0]["last_modified_time"], float)
+    assert records[0]["last_modified_time"] == claimed[0]["last_modified_time"]
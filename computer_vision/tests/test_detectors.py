@@ -0,0 +1,36 @@
+import sys
+
+import numpy as np
+import pytest
+
+from detectors import box_iou, create_detector, letterbox
+
+
+@pytest.mark.parametrize("backend, runtime", [("onnx", "onnxruntime"), ("openvino", "openvino")])
+def test_requested_backend_without_its_runtime_fails_loudly(monkeypatch, backend, runtime):
+    monkeypatch.setitem(sys.modules, runtime, None)
+    monkeypatch.setitem(sys.modules, "ultralytics", None)
+    with pytest.raises(ImportError, match=f"'{backend}' requires the {runtime} package"):
+        create_detector(backend)
+
+
+def test_missing_ultralytics_is_reraised(monkeypatch):
+    monkeypatch.setitem(sys.modules, "ultralytics", None)
+    with pytest.raises(ImportError, match="ultralytics"):
+        create_detector("ultralytics")
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown detector backend"):
+        create_detector("tensorrt")
+
+
+def test_letterbox_pads_to_a_square():
+    tensor, ratio, (left, top) = letterbox(np.zeros((360, 640, 3), dtype=np.uint8), 320)
+    assert tensor.shape == (3, 320, 320) and ratio == 0.5 and (left, top) == (0, 70)
+
+
+def test_box_iou():
+    a = np.array([[0, 0, 10, 10]], dtype=np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=np.float32)
+    np.testing.assert_allclose(box_iou(a, b), [[1.0, 1 / 3, 0.0]], atol=1e-6)
@@ -0,0 +1,54 @@
+from expiry import ExpiryScheduler
+
+
+def test_keys_expire_after_the_timeout_in_deadline_order():
+    expired = []
+    scheduler = ExpiryScheduler(5.0, on_expire=lambda key, last_seen: expired.append((key, last_seen)))
+    scheduler.touch("a", 0.0)
+    scheduler.touch("b", 1.0)
+    scheduler.touch("c", 2.0)
+
+    assert scheduler.advance(5.5) == [("a", 0.0)]
+    assert scheduler.advance(10.0) == [("b", 1.0), ("c", 2.0)]
+    assert expired == [("a", 0.0), ("b", 1.0), ("c", 2.0)]
+    assert len(scheduler) == 0
+
+
+def test_touch_postpones_expiry():
+    scheduler = ExpiryScheduler(5.0)
+    scheduler.touch("a", 0.0)
+    scheduler.touch("a", 4.0)
+    assert scheduler.advance(6.0) == []
+    assert scheduler.last_seen("a") == 4.0
+    assert scheduler.advance(9.5) == [("a", 4.0)]
+    assert len(scheduler._heap) == 0
+
+
+def test_discarded_keys_are_not_reported():
+    scheduler = ExpiryScheduler(1.0)
+    scheduler.touch("a", 0.0)
+    scheduler.discard("a")
+    assert "a" not in scheduler
+    assert scheduler.advance(5.0) == []
+
+
+def test_zero_timeout_expires_keys_missing_from_the_latest_touch():
+    scheduler = ExpiryScheduler(0.0)
+    for key in ("a", "b", "c"):
+        scheduler.touch(key, 1.0)
+    assert scheduler.advance(1.0) == []
+
+    scheduler.touch("a", 2.0)
+    scheduler.touch("c", 2.0)
+    assert scheduler.advance(2.0) == [("b", 1.0)]
+    assert sorted(key for key in ("a", "b", "c") if key in scheduler) == ["a", "c"]
+
+
+def test_zero_timeout_does_not_use_the_heap():
+    scheduler = ExpiryScheduler(0.0)
+    for frame in range(100):
+        for key in range(50):
+            scheduler.touch(key, float(frame))
+        scheduler.advance(float(frame))
+    assert scheduler._heap == []
+    assert len(scheduler) == 50
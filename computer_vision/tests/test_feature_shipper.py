@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from feature_shipper import FeatureShipper
+from reid_wire import decode_feature_batch
+
+
+class Orchestrator:
+    """A local /reid/batch endpoint returning one ID per embedding, or failing with ``status``."""
+
+    def __init__(self):
+        self.requests = []
+        self.status = 200
+        orchestrator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                groups = decode_feature_batch(self.rfile.read(int(self.headers["Content-Length"])))
+                orchestrator.requests.append(groups)
+                body = json.dumps({"global_ids": [[f"{g.camera_id}-{i}" for i in range(len(g.features))]
+                                                  for g in groups]}).encode()
+                self.send_response(orchestrator.status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/reid/batch"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def orchestrator():
+    server = Orchestrator()
+    yield server
+    server.server.shutdown()
+
+
+def test_full_buffer_is_sent_as_one_request_per_batch(orchestrator):
+    responses = []
+    shipper = FeatureShipper(orchestrator.url, max_batch=4, max_delay=60,
+                             on_response=lambda groups, ids: responses.append(ids))
+    shipper.submit("store", "cam-1", np.ones((2, 8)), timestamp=100.0)
+    shipper.submit("store", "cam-2", np.ones(8))
+    shipper.submit("store", "cam-1", np.ones(8), timestamp=101.0)
+    shipper.close()
+
+    assert len(orchestrator.requests) == 1
+    groups = {group.camera_id: group for group in orchestrator.requests[0]}
+    assert groups["cam-1"].features.shape == (3, 8) and groups["cam-1"].timestamp == 101.0
+    assert responses == [[["cam-1-0", "cam-1-1", "cam-1-2"], ["cam-2-0"]]]
+    assert (shipper.sent, shipper.failed, shipper.in_flight) == (4, 0, 0)
+
+
+def test_buffer_is_flushed_by_age(orchestrator):
+    shipper = FeatureShipper(orchestrator.url, max_batch=100, max_delay=0.05)
+    shipper.submit("store", "cam-1", np.ones(8))
+    deadline = time.monotonic() + 2
+    while not orchestrator.requests and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(orchestrator.requests) == 1
+    shipper.close()
+
+
+def test_failed_requests_are_counted(orchestrator):
+    orchestrator.status = 500
+    shipper = FeatureShipper(orchestrator.url, max_batch=2, max_delay=60)
+    shipper.submit("store", "cam-1", np.ones((2, 8)))
+    shipper.close()
+    assert (shipper.sent, shipper.failed, shipper.in_flight) == (0, 2, 0)
+
+
+def test_timer_survives_a_failing_flush(orchestrator):
+    shipper = FeatureShipper(orchestrator.url, max_batch=100, max_delay=0.05)
+    flush, calls = shipper.flush, []
+
+    def fail_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("encoder failed")
+        flush()
+
+    shipper.flush = fail_once
+    shipper.submit("store", "cam-1", np.ones(8))
+    deadline = time.monotonic() + 2
+    while not orchestrator.requests and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(calls) >= 2 and len(orchestrator.requests) == 1
+    shipper.close()
@@ -0,0 +1,47 @@
+import base64
+import json
+
+import pytest
+
+from frame_envelope import FrameEnvelope, decode_frame_envelope, encode_frame_envelope
+
+
+def test_binary_envelope_round_trip_is_zero_copy():
+    body = bytearray(encode_frame_envelope("store-1", "cam-é", 42, 1700000000.5, b"\xff\xd8jpeg"))
+    envelope = decode_frame_envelope(body)
+    assert envelope[:4] == ("store-1", "cam-é", 42, 1700000000.5)
+    assert bytes(envelope.image) == b"\xff\xd8jpeg"
+    body[-1] = ord("G")
+    assert bytes(envelope.image) == b"\xff\xd8jpeG"
+
+
+def test_legacy_json_chunk_is_accepted():
+    chunk = {"SourceId": "store-1", "CameraId": "cam-1", "TimeStamp": "2024-05-01T12:00:00+00:00",
+             "FrameData": base64.b64encode(b"png").decode()}
+    envelope = decode_frame_envelope(json.dumps(chunk).encode())
+    assert isinstance(envelope, FrameEnvelope)
+    assert (envelope.source_id, envelope.camera_id, envelope.sequence) == ("store-1", "cam-1", None)
+    assert envelope.timestamp == 1714564800.0
+    assert bytes(envelope.image) == b"png"
+
+
+@pytest.mark.parametrize("cut", range(4, 40))
+def test_truncated_binary_envelope_raises_value_error(cut):
+    body = encode_frame_envelope("store-1", "cam-1", 1, 0.0, b"")
+    with pytest.raises(ValueError, match="Truncated"):
+        decode_frame_envelope(body[:cut])
+
+
+@pytest.mark.parametrize("body", [b"[1]", b"1", b'"frame"', b"{}", b'{"SourceId": "s", "CameraId": "c"}',
+                                  b'{"SourceId": "s", "CameraId": "c", "FrameData": 5}', b"{not json",
+                                  b"\x00\x01binary"])
+def test_malformed_bodies_raise_value_error(body):
+    with pytest.raises(ValueError):
+        decode_frame_envelope(body)
+
+
+def test_unsupported_version_is_rejected():
+    body = bytearray(encode_frame_envelope("s", "c", 1, 0.0, b""))
+    body[4] = 9
+    with pytest.raises(ValueError, match="version 9"):
+        decode_frame_envelope(body)
@@ -0,0 +1,82 @@
+import random
+import threading
+import time
+
+import pytest
+
+from frame_pipeline import BoundedFrameQueue, FramePipeline
+
+
+def test_latest_policy_keeps_only_the_newest_frame():
+    queue = BoundedFrameQueue(maxsize=4, policy="latest")
+    for frame in range(3):
+        queue.put(frame)
+    assert queue.get_nowait() == 2 and queue.get_nowait() is None
+    assert queue.stats() == {"queued": 0, "enqueued": 3, "dropped": 2, "processed": 1}
+
+
+def test_drop_oldest_policy_keeps_the_newest_frames():
+    queue = BoundedFrameQueue(maxsize=2, policy="drop_oldest")
+    for frame in range(4):
+        queue.put(frame)
+    assert [queue.get_nowait(), queue.get_nowait()] == [2, 3]
+    assert queue.dropped == 2
+
+
+def test_block_policy_waits_for_room():
+    queue = BoundedFrameQueue(maxsize=1, policy="block")
+    queue.put(0)
+    producer = threading.Thread(target=queue.put, args=(1,))
+    producer.start()
+    time.sleep(0.05)
+    assert producer.is_alive()
+    assert queue.get_nowait() == 0
+    producer.join(1)
+    assert queue.get_nowait() == 1 and queue.dropped == 0
+
+
+def test_retired_queue_refuses_frames():
+    queue = BoundedFrameQueue(policy="latest")
+    assert queue.retire()
+    assert queue.put(0) is False
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        BoundedFrameQueue(policy="newest")
+
+
+@pytest.mark.parametrize("policy", ["block", "drop_oldest", "latest"])
+def test_camera_frames_are_processed_in_order_despite_parallel_decode(policy):
+    processed = {}
+
+    def process(camera_key, frame):
+        processed.setdefault(camera_key, []).append(frame)
+
+    def decode(frame):
+        # Random decode times make the pool finish frames out of order
+        time.sleep(random.random() * 0.002)
+        if frame % 37 == 0:
+            raise ValueError("corrupt frame")
+        return None if frame % 41 == 0 else frame
+
+    pipeline = FramePipeline(process, decode_workers=4, queue_size=4, policy=policy, inference_workers=2)
+    for frame in range(600):
+        pipeline.submit(frame % 3, frame, decode)
+    pipeline.close()
+
+    for frames in processed.values():
+        assert frames == sorted(frames)
+    if policy == "block":
+        assert sum(map(len, processed.values())) == 600 - pipeline.decode_failures
+
+
+def test_idle_camera_is_discarded_only_without_frames_in_flight():
+    release = threading.Event()
+    pipeline = FramePipeline(lambda camera_key, frame: None, decode_workers=1)
+    pipeline.submit("cam", 1, lambda frame: release.wait(1) and frame)
+    assert pipeline.discard("cam") is False
+    release.set()
+    pipeline.close()
+    assert pipeline.discard("cam") is True
+    assert "cam" not in pipeline.queues
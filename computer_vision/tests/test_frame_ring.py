@@ -0,0 +1,81 @@
+import multiprocessing
+import queue
+import threading
+
+import numpy as np
+import pytest
+
+from frame_ring import SharedFrameRing
+from multiprocess_runner import RingDetector
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing.create(slots=2, max_frame_bytes=48 * 64 * 3)
+    yield ring
+    ring.close()
+
+
+def frame(value, shape=(48, 64, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_frames_round_trip_in_place(ring):
+    slot = ring.write(1, frame(7))
+    assert ring.is_current(slot, 1)
+    np.testing.assert_array_equal(ring.read(slot, 1), frame(7))
+
+    gray = frame(9, shape=(10, 20))
+    slot = ring.write(2, gray)
+    np.testing.assert_array_equal(ring.read(slot, 2), gray)
+
+
+def test_reused_slot_no_longer_serves_the_old_frame(ring):
+    slot = ring.write(1, frame(1))
+    assert ring.write(3, frame(3)) == slot
+    assert ring.read(slot, 1) is None and not ring.is_current(slot, 1)
+    assert ring.read(slot, 3)[0, 0, 0] == 3
+    assert ring.read(1, 2) is None  # Never written
+
+
+def test_oversized_frame_is_rejected(ring):
+    with pytest.raises(ValueError, match="exceeds"):
+        ring.write(1, frame(0, shape=(49, 64, 3)))
+
+
+def _read_in_child(spec, slot, sequence, results):
+    ring = SharedFrameRing.attach(*spec)
+    try:
+        results.put(int(ring.read(slot, sequence).sum()))
+    finally:
+        ring.close()
+
+
+def test_another_process_reads_the_frame(ring):
+    slot = ring.write(5, frame(2))
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_read_in_child, args=(ring.spec, slot, 5, results))
+    process.start()
+    process.join(30)
+    assert results.get(timeout=5) == 2 * 48 * 64 * 3
+
+
+def test_ring_detector_waits_for_its_own_frame(ring):
+    requests, results = queue.Queue(), queue.Queue()
+    detector = RingDetector(ring, 0, requests, results, generation=1, timeout=1.0)
+
+    def serve():
+        camera_index, slot, sequence = requests.get(timeout=1)
+        results.put((sequence - 1, "late result for an earlier frame"))
+        results.put((sequence, ring.read(slot, sequence).max()))
+
+    server = threading.Thread(target=serve)
+    server.start()
+    assert detector.detect([frame(4)]) == [4]
+    server.join()
+
+
+def test_ring_detector_sheds_a_frame_without_detections(ring):
+    detector = RingDetector(ring, 0, queue.Queue(), queue.Queue(), timeout=0.05)
+    assert detector.detect([frame(1)]) == [None]
@@ -0,0 +1,104 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from gallery_index import normalize
+from gallery_snapshot import EMBEDDINGS_FILE, METADATA_FILE, GallerySnapshotter
+from global_tracker import GlobalTracker
+
+
+def people(count, dim=64, seed=0):
+    return normalize(np.random.default_rng(seed).normal(size=(count, dim))).astype(np.float32)
+
+
+def populated(directory, count=3, **kwargs):
+    tracker = GlobalTracker(threshold=0.3, **kwargs)
+    snapshotter = GallerySnapshotter(tracker, str(directory))
+    ids = tracker.match_batch("store", "cam-1", list(people(count)))
+    return tracker, snapshotter, ids
+
+
+def restored(directory, **kwargs):
+    tracker = GlobalTracker(threshold=0.3, **{"embedding_dtype": "int8", **kwargs})
+    snapshotter = GallerySnapshotter(tracker, str(directory))
+    return tracker, snapshotter, snapshotter.restore()
+
+
+def test_restored_gallery_matches_the_same_identities(tmp_path):
+    tracker, snapshotter, ids = populated(tmp_path)
+    tracker.match_and_update("store", "cam-2", people(3)[0])
+    assert snapshotter.snapshot() == 3
+
+    restored_tracker, _, count = restored(tmp_path)
+    assert count == 3 and set(restored_tracker.global_tracks) == set(ids)
+    first = restored_tracker.global_tracks[ids[0]]
+    assert first.cameras == {"cam-1", "cam-2"} and first.sightings == 2
+    assert restored_tracker.match_and_update("store", "cam-3", people(3)[1]) == ids[1]
+
+
+def test_only_changed_identities_are_rewritten_and_expired_ones_dropped(tmp_path):
+    tracker, snapshotter, ids = populated(tmp_path, timeout=0.05)
+    assert snapshotter.snapshot() == 3
+    assert snapshotter.snapshot() == 0
+
+    time.sleep(0.1)
+    tracker.match_and_update("store", "cam-1", people(3)[0])
+    tracker.handle_global_tracks()
+    assert snapshotter.snapshot() == 3  # One re-sighted, two expired
+    with open(tmp_path / METADATA_FILE) as f:
+        metadata = json.load(f)
+    assert metadata["ids"] == [ids[0]]
+
+    # Slots of expired identities are reused once the commit without them is on disk
+    tracker.match_batch("store", "cam-1", list(people(2, seed=1)))
+    snapshotter.snapshot()
+    with open(tmp_path / METADATA_FILE) as f:
+        assert sorted(json.load(f)["slots"]) == [0, 1, 2]
+
+
+def test_identities_older_than_max_age_are_skipped(tmp_path):
+    tracker, snapshotter, ids = populated(tmp_path)
+    snapshotter.snapshot()
+    path = tmp_path / METADATA_FILE
+    metadata = json.loads(path.read_text())
+    stale = metadata["ids"][1]
+    metadata["last_seen"][1] -= 3600
+    path.write_text(json.dumps(metadata))
+
+    tracker = GlobalTracker(threshold=0.3)
+    assert GallerySnapshotter(tracker, str(tmp_path)).restore(max_age=600) == 2
+    assert set(tracker.global_tracks) == set(ids) - {stale}
+    # The stale identity is also gone from the snapshot on disk
+    assert stale not in json.loads(path.read_text())["ids"]
+
+
+def test_snapshot_is_rewritten_for_a_new_embedding_dtype(tmp_path):
+    _, snapshotter, ids = populated(tmp_path, embedding_dtype="float32")
+    snapshotter.snapshot()
+
+    tracker, _, count = restored(tmp_path, embedding_dtype="int8")
+    assert count == 3 and tracker.global_tracks[ids[0]].embedding.dtype == np.int8
+    assert json.loads((tmp_path / METADATA_FILE).read_text())["dtype"] == "int8"
+    assert tracker.match_and_update("store", "cam-2", people(3)[2]) == ids[2]
+
+
+def test_missing_truncated_or_foreign_snapshots_are_ignored(tmp_path):
+    assert restored(tmp_path)[2] == 0
+
+    _, snapshotter, _ = populated(tmp_path)
+    snapshotter.snapshot()
+    with open(tmp_path / EMBEDDINGS_FILE, "r+b") as f:
+        f.truncate(64)
+    assert restored(tmp_path)[2] == 0
+
+    path = tmp_path / METADATA_FILE
+    metadata = json.loads(path.read_text())
+    metadata["version"] = 1
+    path.write_text(json.dumps(metadata))
+    assert restored(tmp_path)[2] == 0
+
+    path.write_text("{")
+    assert restored(tmp_path)[2] == 0
+    assert os.path.exists(tmp_path / EMBEDDINGS_FILE)
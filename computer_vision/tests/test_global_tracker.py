@@ -0,0 +1,105 @@
+import time
+
+import numpy as np
+
+from gallery_index import normalize
+from global_tracker import GlobalTracker
+
+
+def people(count, dim=64, seed=0):
+    return normalize(np.random.default_rng(seed).normal(size=(count, dim)))
+
+
+def sighting(person, noise=0.05, seed=1):
+    rng = np.random.default_rng(seed)
+    return (person + noise * rng.normal(size=person.shape) / np.sqrt(len(person))).astype(np.float32)
+
+
+def test_resighting_matches_the_same_global_track():
+    tracker = GlobalTracker(threshold=0.3)
+    alice, bob = people(2)
+
+    first = tracker.match_and_update("store", "cam-1", alice)
+    assert tracker.match_and_update("store", "cam-2", sighting(alice)) == first
+    assert tracker.match_and_update("store", "cam-2", bob) != first
+    assert len(tracker) == 2
+    assert tracker.global_tracks[first].cameras == {"cam-1", "cam-2"}
+
+
+def test_match_batch_assigns_each_feature_in_order():
+    tracker = GlobalTracker(threshold=0.3)
+    gallery = people(5)
+    ids = tracker.match_batch("store", "cam-1", list(gallery))
+    assert len(set(ids)) == 5
+
+    resighted = tracker.match_batch("store", "cam-2", [sighting(gallery[i], seed=i) for i in (3, 0, 4)])
+    assert resighted == [ids[3], ids[0], ids[4]]
+    assert tracker.match_batch("store", "cam-2", []) == []
+
+
+def test_feature_history_is_averaged():
+    tracker = GlobalTracker(threshold=0.3)
+    alice = people(1)[0]
+    first = tracker.match_and_update("store", "cam-1", alice)
+    history = np.stack([sighting(alice, seed=i) for i in range(4)])
+    assert tracker.match_and_update("store", "cam-1", history) == first
+
+
+def test_unseen_tracks_expire_and_are_reported():
+    disappeared = []
+    tracker = GlobalTracker(threshold=0.3, timeout=0.05,
+                            on_disappear=lambda global_id, track: disappeared.append(global_id))
+    alice, bob = people(2)
+    alice_id = tracker.match_and_update("store", "cam-1", alice)
+
+    time.sleep(0.1)
+    bob_id = tracker.match_and_update("store", "cam-1", bob)
+    tracker.handle_global_tracks()
+
+    assert disappeared == [alice_id]
+    assert list(tracker.global_tracks) == [bob_id]
+    # An expired identity is not matched any more
+    assert tracker.match_and_update("store", "cam-1", alice) != alice_id
+
+
+def test_sources_are_sharded_and_never_matched_across():
+    tracker = GlobalTracker(threshold=0.3, shard_by_source=True)
+    alice = people(1)[0]
+    first = tracker.match_and_update("store-1", "cam-1", alice)
+    second = tracker.match_and_update("store-2", "cam-1", alice)
+    assert first != second
+    assert set(tracker.shards) == {"store-1", "store-2"}
+    assert tracker.match_and_update("store-1", "cam-2", sighting(alice)) == first
+
+
+def test_stale_snapshot_is_rechecked_against_the_live_index():
+    # The snapshot is never refreshed after the first publish, so every read sees an outdated gallery
+    tracker = GlobalTracker(threshold=0.3, shard_by_source=True, snapshot_reads=True, snapshot_refresh=3600)
+    alice, bob = people(2)
+    tracker.match_and_update("store", "cam-1", bob)
+    shard = tracker.shards["store"]
+    published = shard.snapshot
+
+    alice_id = tracker.match_and_update("store", "cam-1", alice)
+    assert shard.snapshot is published and alice_id not in shard.snapshot[1]
+    assert tracker.match_and_update("store", "cam-2", sighting(alice)) == alice_id
+    assert len(tracker) == 2
+
+
+def test_snapshot_is_refreshed_after_the_interval():
+    tracker = GlobalTracker(threshold=0.3, snapshot_reads=True, snapshot_refresh=0.0)
+    alice_id = tracker.match_and_update("store", "cam-1", people(1)[0])
+    version, snapshot = tracker.shards[None].snapshot
+    assert version == tracker.shards[None].version and alice_id in snapshot
+
+
+def test_expired_track_in_snapshot_is_not_matched():
+    tracker = GlobalTracker(threshold=0.3, timeout=0.05, snapshot_reads=True, snapshot_refresh=3600)
+    alice = people(1)[0]
+    alice_id = tracker.match_and_update("store", "cam-1", alice)
+    tracker.shards[None].publish(force=True)
+
+    time.sleep(0.1)
+    tracker.handle_global_tracks()
+    assert alice_id in tracker.shards[None].snapshot[1]
+    assert tracker.match_and_update("store", "cam-1", alice) != alice_id
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+from inference_scheduler import FairInferenceScheduler, FrameShed
+
+
+def test_results_are_returned_per_frame_in_batches():
+    batches = []
+
+    def infer(frames):
+        batches.append(list(frames))
+        return [frame * 10 for frame in frames]
+
+    scheduler = FairInferenceScheduler(infer, max_batch_size=4, deadline=5.0, queue_size=8)
+    futures = [scheduler.submit("cam-1", i) for i in range(6)]
+    assert [future.result(timeout=1) for future in futures] == [i * 10 for i in range(6)]
+    scheduler.close()
+    assert all(len(batch) <= 4 for batch in batches)
+    assert scheduler.stats()["cam-1"]["served"] == 6
+
+
+def test_short_results_fail_every_future_of_the_batch():
+    release = threading.Event()
+
+    def infer(frames):
+        release.wait(1)
+        return frames[:1]
+
+    scheduler = FairInferenceScheduler(infer, max_batch_size=4, deadline=5.0, queue_size=8)
+    blocked = scheduler.submit("cam-1", "blocked")
+    time.sleep(0.05)
+    futures = [scheduler.submit(camera_id, camera_id) for camera_id in ("a", "b", "c")]
+    release.set()
+    assert blocked.result(timeout=1) == "blocked"
+    for future in futures:
+        with pytest.raises(RuntimeError, match="1 results for 3 frames"):
+            future.result(timeout=1)
+    scheduler.close()
+
+
+def test_failing_inference_fails_the_batch():
+    def infer(frames):
+        raise ValueError("model crashed")
+
+    scheduler = FairInferenceScheduler(infer, deadline=5.0)
+    with pytest.raises(ValueError, match="model crashed"):
+        scheduler.submit("cam-1", "frame").result(timeout=1)
+    scheduler.close()
+
+
+def test_full_queue_sheds_the_oldest_frame():
+    release = threading.Event()
+    scheduler = FairInferenceScheduler(lambda frames: release.wait(1) and frames, deadline=5.0, queue_size=1)
+    busy = scheduler.submit("cam-1", "busy")
+    time.sleep(0.05)
+    superseded = scheduler.submit("cam-1", "old")
+    latest = scheduler.submit("cam-1", "new")
+    release.set()
+    with pytest.raises(FrameShed):
+        superseded.result(timeout=1)
+    assert busy.result(timeout=1) == "busy" and latest.result(timeout=1) == "new"
+    scheduler.close()
+    assert scheduler.stats()["cam-1"]["shed"] == 1
+
+
+def test_frames_past_their_deadline_are_shed():
+    release = threading.Event()
+    scheduler = FairInferenceScheduler(lambda frames: release.wait(1) and frames, deadline=0.01, queue_size=4)
+    scheduler.submit("cam-1", "busy")
+    time.sleep(0.05)
+    late = scheduler.submit("cam-1", "late")
+    time.sleep(0.05)
+    release.set()
+    with pytest.raises(FrameShed, match="Deadline"):
+        late.result(timeout=1)
+    scheduler.close()
+
+
+def test_weights_share_a_saturated_detector():
+    release = threading.Event()
+    served = []
+
+    def infer(frames):
+        release.wait(1)
+        served.extend(frames)
+        return frames
+
+    scheduler = FairInferenceScheduler(infer, deadline=10.0, queue_size=40)
+    scheduler.configure("heavy", weight=3.0)
+    scheduler.configure("light", weight=1.0)
+    scheduler.submit("light", "warmup")
+    time.sleep(0.05)
+    futures = [scheduler.submit(camera_id, camera_id) for _ in range(40) for camera_id in ("heavy", "light")]
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    scheduler.close()
+
+    first = served[1:41]
+    assert 2.0 <= first.count("heavy") / first.count("light") <= 4.0
+
+
+def test_starved_camera_is_served_first():
+    release = threading.Event()
+    served = []
+
+    def infer(frames):
+        release.wait(1)
+        served.extend(frames)
+        return frames
+
+    scheduler = FairInferenceScheduler(infer, deadline=10.0, queue_size=10)
+    scheduler.configure("busy", weight=10.0)
+    scheduler.configure("slow", min_fps=1000.0)
+    scheduler.submit("busy", "warmup")
+    time.sleep(0.05)
+    futures = [scheduler.submit("busy", "busy") for _ in range(5)] + [scheduler.submit("slow", "slow")]
+    release.set()
+    for future in futures:
+        future.result(timeout=1)
+    scheduler.close()
+    assert served[1] == "slow"
+
+
+def test_weight_must_be_positive():
+    with pytest.raises(ValueError):
+        FairInferenceScheduler(lambda frames: frames, weight=0)
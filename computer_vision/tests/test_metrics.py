@@ -0,0 +1,109 @@
+import logging
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics import LogSampler, Registry, start_metrics_server
+
+
+def test_counter_family_naming_per_format():
+    registry = Registry()
+    frames = registry.counter("frames", "Frames seen.", ("camera", "outcome"))
+    frames.labels("cam-1", "processed").inc()
+    frames.labels(camera="cam-1", outcome="processed").inc(2)
+
+    assert registry.render(openmetrics=True) == (
+        "# HELP frames Frames seen.\n"
+        "# TYPE frames counter\n"
+        'frames_total{camera="cam-1",outcome="processed"} 3\n'
+        "# EOF\n"
+    )
+    assert registry.render(openmetrics=False).splitlines()[:2] == ["# HELP frames_total Frames seen.",
+                                                                  "# TYPE frames_total counter"]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 0.5))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        latency.observe(value)
+    with latency.time():
+        pass
+
+    lines = registry.render().splitlines()
+    assert lines[2:6] == [
+        'latency_seconds_bucket{le="0.1"} 3',
+        'latency_seconds_bucket{le="0.5"} 4',
+        'latency_seconds_bucket{le="+Inf"} 5',
+        "latency_seconds_count 5",
+    ]
+    assert float(lines[6].split()[1]) == pytest.approx(2.45, abs=0.01)
+
+
+def test_gauges_label_escaping_and_functions():
+    registry = Registry()
+    tracks = registry.gauge("tracks", "Tracks.", ("camera",))
+    tracks.labels('lobby "east"\\\n').set(4)
+    tracks.labels("door").set(2)
+    tracks.labels("door").dec()
+    size = registry.gauge("size", "Size.")
+    size.set_function(lambda: 12)
+    broken = registry.gauge("broken", "Fails at scrape time.")
+    broken.set_function(lambda: 1 / 0)
+
+    lines = registry.render().splitlines()
+    assert 'tracks{camera="lobby \\"east\\"\\\\\\n"} 4' in lines
+    assert 'tracks{camera="door"} 1' in lines
+    assert "size 12" in lines
+    assert "# TYPE broken gauge" in lines and not any(line.startswith("broken ") for line in lines)
+
+
+def test_duplicate_registration_is_rejected():
+    registry = Registry()
+    registry.counter("frames", "Frames.")
+    with pytest.raises(ValueError):
+        registry.gauge("frames", "Frames again.")
+
+
+def test_log_sampler_counts_suppressed_records(caplog):
+    sampler = LogSampler(interval=60.0, logger=logging.getLogger("test.sampled"))
+    with caplog.at_level(logging.INFO, logger="test.sampled"):
+        for _ in range(3):
+            sampler.log("frame_dropped", camera="cam-1")
+        sampler.log("frame_dropped", key=("frame_dropped", "cam-2"), camera="cam-2")
+        sampler._last["frame_dropped"] -= 61
+        sampler.log("frame_dropped", camera="cam-1")
+
+    assert [record.getMessage() for record in caplog.records] == [
+        '{"event": "frame_dropped", "suppressed": 0, "camera": "cam-1"}',
+        '{"event": "frame_dropped", "suppressed": 0, "camera": "cam-2"}',
+        '{"event": "frame_dropped", "suppressed": 2, "camera": "cam-1"}',
+    ]
+
+
+def test_metrics_server_negotiates_format_and_readiness():
+    registry = Registry()
+    registry.counter("frames", "Frames.").inc()
+    readiness = threading.Event()
+    server = start_metrics_server(0, "127.0.0.1", registry, readiness)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(base + "/ready")
+        assert error.value.code == 503
+        readiness.set()
+        assert urllib.request.urlopen(base + "/ready").status == 200
+        assert urllib.request.urlopen(base + "/healthz").status == 200
+
+        request = urllib.request.Request(base + "/metrics", headers={"Accept": "application/openmetrics-text"})
+        with urllib.request.urlopen(request) as response:
+            assert response.headers["Content-Type"].startswith("application/openmetrics-text")
+            assert response.read().decode().endswith("# EOF\n")
+        with urllib.request.urlopen(base + "/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "frames_total 1" in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
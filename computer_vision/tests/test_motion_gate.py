@@ -0,0 +1,39 @@
+import numpy as np
+
+from motion_gate import MotionGate
+
+
+def frame(value=0, box=None):
+    image = np.full((120, 160, 3), value, dtype=np.uint8)
+    if box is not None:
+        x, y = box
+        image[y:y + 40, x:x + 20] = 255
+    return image
+
+
+def test_static_frames_are_skipped_and_motion_detected():
+    gate = MotionGate(max_skip=100)
+    assert gate.should_detect(frame(box=(10, 10)))
+    assert not any(gate.should_detect(frame(box=(10, 10))) for _ in range(5))
+    assert gate.should_detect(frame(box=(80, 60)))
+    assert gate.stats() == {"frames": 7, "skipped": 5, "skip_ratio": 5 / 7}
+
+
+def test_detection_is_forced_after_max_skip_frames():
+    gate = MotionGate(max_skip=3)
+    decisions = [gate.should_detect(frame()) for _ in range(9)]
+    assert decisions == [True, False, False, False, True, False, False, False, True]
+
+
+def test_small_changes_stay_under_the_threshold():
+    gate = MotionGate(motion_threshold=0.05, max_skip=100)
+    gate.should_detect(frame())
+    noisy = frame()
+    noisy[0:4, 0:4] = 255
+    assert not gate.should_detect(noisy)
+
+
+def test_resolution_change_forces_detection():
+    gate = MotionGate(max_skip=100)
+    gate.should_detect(frame())
+    assert gate.should_detect(np.zeros((90, 160, 3), dtype=np.uint8))
@@ -0,0 +1,73 @@
+import asyncio
+import importlib.util
+import os
+import time
+
+import numpy as np
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from gallery_index import normalize
+from global_tracker import GlobalTracker
+from reid_wire import CONTENT_TYPE, encode_feature_batch
+
+_spec = importlib.util.spec_from_file_location(
+    "orchestrator_main", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "orchestrator", "main.py"))
+orchestrator = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(orchestrator)
+
+
+def request(tracker, method, path, **kwargs):
+    """Send one request to the orchestrator's handlers and return (status, body)."""
+    async def send():
+        app = web.Application()
+        app['tracker'] = tracker
+        app.router.add_post('/reid/batch', orchestrator.reid_batch)
+        app.router.add_post('/process_features', orchestrator.process_features)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.request(method, path, **kwargs)
+            body = await (response.json() if response.status == 200 else response.text())
+            return response.status, body
+    return asyncio.run(send())
+
+
+def batch(groups):
+    return {"data": encode_feature_batch(groups), "headers": {"Content-Type": CONTENT_TYPE}}
+
+
+def test_reid_batch_matches_at_the_capture_time():
+    tracker = GlobalTracker(threshold=0.3)
+    people = normalize(np.random.default_rng(0).normal(size=(2, 16)))
+    captured = time.time() - 3
+
+    status, body = request(tracker, "POST", "/reid/batch", **batch([("store", "cam-1", captured, people)]))
+    assert status == 200 and len(set(body["global_ids"][0])) == 2
+    track = tracker.global_tracks[body["global_ids"][0][0]]
+    assert 2.5 < time.monotonic() - track.last_seen < 3.5
+
+    status, again = request(tracker, "POST", "/reid/batch", **batch([("store", "cam-2", time.time(), people[::-1])]))
+    assert again["global_ids"][0] == body["global_ids"][0][::-1]
+
+
+def test_reid_batch_rejects_malformed_bodies_and_dimensions():
+    tracker = GlobalTracker()
+    request(tracker, "POST", "/reid/batch", **batch([("store", "cam-1", time.time(), np.ones((1, 16)))]))
+
+    status, _ = request(tracker, "POST", "/reid/batch", data=b"SG", headers={"Content-Type": CONTENT_TYPE})
+    assert status == 400
+    status, text = request(tracker, "POST", "/reid/batch", **batch([("store", "cam-1", time.time(), np.ones((1, 8)))]))
+    assert status == 400 and "16-dimensional" in text
+    assert len(tracker) == 1
+
+
+def test_process_features_validates_the_payload():
+    tracker = GlobalTracker()
+    status, body = request(tracker, "POST", "/process_features", json={"camera_id": "cam-1", "features": [1.0] * 16})
+    assert status == 200 and body["global_id"]
+
+    for payload in ({"features": [1.0] * 16}, {"camera_id": "cam-1"}, [1, 2],
+                    {"camera_id": "cam-1", "features": [1.0] * 8}, {"camera_id": "cam-1", "features": "abc"}):
+        status, _ = request(tracker, "POST", "/process_features", json=payload)
+        assert status == 400, payload
+    status, _ = request(tracker, "POST", "/process_features", data=b"{", headers={"Content-Type": "application/json"})
+    assert status == 400
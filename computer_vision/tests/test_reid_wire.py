@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from reid_wire import decode_feature_batch, encode_feature_batch
+
+
+def groups():
+    rng = np.random.default_rng(0)
+    return [("store-1", "cam-1", 1700000000.25, rng.normal(size=(3, 8))),
+            ("store-1", "cam-ü", 1700000001.0, rng.normal(size=(1, 8)))]
+
+
+@pytest.mark.parametrize("dtype", ["float16", "float32"])
+def test_round_trip(dtype):
+    decoded = decode_feature_batch(encode_feature_batch(groups(), dtype))
+    assert [(g.source_id, g.camera_id, g.timestamp) for g in decoded] == [g[:3] for g in groups()]
+    for group, (_, _, _, features) in zip(decoded, groups()):
+        assert group.features.dtype == np.dtype(dtype)
+        np.testing.assert_allclose(group.features, features, rtol=1e-3, atol=1e-3)
+
+
+def test_every_truncation_raises_value_error():
+    body = encode_feature_batch(groups())
+    for cut in range(len(body)):
+        with pytest.raises(ValueError):
+            decode_feature_batch(body[:cut])
+
+
+def test_bad_magic_version_and_dtype_are_rejected():
+    body = bytearray(encode_feature_batch(groups()))
+    with pytest.raises(ValueError, match="Not a re-identification batch"):
+        decode_feature_batch(b"JSON" + bytes(body[4:]))
+    body[4] = 2
+    with pytest.raises(ValueError, match="version 2"):
+        decode_feature_batch(bytes(body))
+    body[4], body[8] = 1, 7
+    with pytest.raises(ValueError, match="dtype code 7"):
+        decode_feature_batch(bytes(body))
+    with pytest.raises(ValueError, match="Unsupported embedding dtype"):
+        encode_feature_batch(groups(), "int8")
@@ -0,0 +1,68 @@
+import pytest
+from azure.servicebus.exceptions import MessageSizeExceededError
+
+from azure_service_bus_client import AzureServiceBusClient, ServiceBusBatchSender
+
+CONNECTION_STRING = "Endpoint=sb://storeguard.servicebus.windows.net/;SharedAccessKeyName=test;SharedAccessKey=dGVzdA=="
+
+
+class FakeBatch:
+    """A message batch holding up to 100 characters of message bodies."""
+
+    def __init__(self):
+        self.messages = []
+        self.size = 0
+
+    def add_message(self, message):
+        size = len(str(message))
+        if self.size + size > 100:
+            raise MessageSizeExceededError(message="batch is full")
+        self.messages.append(str(message))
+        self.size += size
+
+
+class FakeSender:
+    def __init__(self):
+        self.batches = []
+        self.closed = False
+
+    def create_message_batch(self):
+        return FakeBatch()
+
+    def send_messages(self, batch):
+        self.batches.append(batch.messages)
+
+    def close(self):
+        self.closed = True
+
+
+def test_buffered_messages_are_sent_in_batches_on_close():
+    sender = FakeSender()
+    batch_sender = ServiceBusBatchSender(sender, "tracks", max_delay=0.2)
+    for i in range(30):
+        assert batch_sender.send(f"m{i:03d}")
+    batch_sender.close()
+
+    assert [message for batch in sender.batches for message in batch] == [f"m{i:03d}" for i in range(30)]
+    assert len(sender.batches) > 1 and sender.closed
+    assert (batch_sender.sent, batch_sender.failed) == (30, 0)
+    assert batch_sender.send("late") is False and batch_sender.dropped == 1
+
+
+def test_message_too_large_after_a_split_is_dropped_alone():
+    sender = FakeSender()
+    batch_sender = ServiceBusBatchSender(sender, "tracks", max_delay=0.2)
+    for content in ("a" * 40, "b" * 40, "c" * 500, "d" * 10):
+        batch_sender.send(content, session_id="cam-1")
+    batch_sender.send("e" * 10, session_id="cam-2")
+    batch_sender.close()
+
+    assert [[message[0] for message in batch] for batch in sender.batches] == [["a", "b"], ["d"], ["e"]]
+    assert (batch_sender.sent, batch_sender.failed) == (4, 1)
+
+
+def test_closed_client_refuses_new_messages():
+    client = AzureServiceBusClient(CONNECTION_STRING)
+    client.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        client.enqueue_message_to_queue("tracks", "hello")
@@ -0,0 +1,61 @@
+import time
+
+import numpy as np
+import pytest
+
+from gallery_index import normalize
+from track_record import CameraBits, TrackRecord, from_epoch, quantize, to_epoch
+
+
+def embedding(dim=128, seed=0):
+    return normalize(np.random.default_rng(seed).normal(size=(1, dim)))[0].astype(np.float32)
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("int8", 0.01), ("float16", 0.001), ("float32", 0.0)])
+def test_quantized_embeddings_round_trip(dtype, tolerance):
+    vector = embedding()
+    stored, scale = quantize(vector, dtype)
+    assert stored.dtype == np.dtype(dtype)
+    np.testing.assert_allclose(stored.astype(np.float32) * scale, vector, atol=tolerance)
+    assert not np.shares_memory(stored, vector)
+
+
+def test_zero_vector_keeps_a_usable_scale():
+    stored, scale = quantize(np.zeros(8, dtype=np.float32))
+    assert scale == 1.0 and not stored.any()
+
+
+def test_cameras_are_encoded_as_a_mask_shared_by_the_source():
+    bits = CameraBits()
+    assert bits.encode(["door", "aisle", "door"]) == 0b11
+    assert bits.bit("checkout") == 0b100
+    assert bits.decode(0b101) == {"door", "checkout"}
+
+
+def test_first_sightings_are_averaged_with_equal_weights():
+    bits = CameraBits()
+    first, second, third = embedding(seed=1), embedding(seed=2), embedding(seed=3)
+    record = TrackRecord.first_sighting("store", bits, "door", first, seen_at=1.0, dtype="float32")
+    record.update(second, "aisle", seen_at=2.0, alpha=0.1)
+    record.update(third, "aisle", seen_at=3.0, alpha=0.1)
+
+    np.testing.assert_allclose(record.features, (first + second + third) / 3, atol=1e-6)
+    assert record.cameras == {"door", "aisle"} and record.last_camera == "aisle"
+    assert (record.sightings, record.first_seen, record.last_seen) == (3, 1.0, 3.0)
+
+
+def test_updates_replace_the_stored_embedding_so_copies_stay_consistent():
+    record = TrackRecord.first_sighting("store", CameraBits(), "door", embedding(seed=1), seen_at=1.0)
+    copy = record.copy()
+    before = copy.features.copy()
+    record.update(embedding(seed=2), "door", seen_at=2.0, alpha=0.1)
+
+    assert record.embedding.dtype == np.int8
+    np.testing.assert_array_equal(copy.features, before)
+    assert copy.sightings == 1 and record.sightings == 2
+
+
+def test_epoch_conversion_round_trips():
+    now = time.monotonic()
+    assert from_epoch(to_epoch(now)) == pytest.approx(now, abs=1e-3)
+    assert to_epoch(now) == pytest.approx(time.time(), abs=1.0)
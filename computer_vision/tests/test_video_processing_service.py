@@ -0,0 +1,143 @@
+import time
+
+import numpy as np
+
+from global_tracker import GlobalTracker
+from motion_gate import MotionGate
+from video_processing_service import VideoProcessingService
+
+
+class FakeTrack:
+    def __init__(self, track_id, features):
+        self.track_id = track_id
+        self.features = [features]
+        self.time_since_update = 0
+
+    def is_confirmed(self):
+        return True
+
+
+class FakeKalmanTracker:
+    def __init__(self, tracks):
+        self.tracks = tracks
+        self.predictions = 0
+
+    def predict(self):
+        self.predictions += 1
+        for track in self.tracks:
+            track.time_since_update += 1
+
+
+class FakeDeepSort:
+    """Keeps one confirmed track per detection slot, as DeepSort would for people who stay put."""
+
+    def __init__(self):
+        self.tracker = FakeKalmanTracker([])
+        self.updates = 0
+
+    def update_tracks(self, detections, embeds=None, frame=None):
+        self.updates += 1
+        rng = np.random.default_rng(len(self.tracker.tracks))
+        while len(self.tracker.tracks) < len(detections):
+            self.tracker.tracks.append(FakeTrack(len(self.tracker.tracks) + 1, rng.normal(size=32).astype(np.float32)))
+        for track in self.tracker.tracks:
+            track.time_since_update = 0
+        return list(self.tracker.tracks)
+
+
+class FakeDetector:
+    def __init__(self, boxes):
+        self.boxes = np.asarray(boxes, dtype=np.float32)
+        self.calls = 0
+
+    def detect(self, frames):
+        self.calls += len(frames)
+        return [self.boxes for _ in frames]
+
+
+class FakeServiceBus:
+    def __init__(self):
+        self.messages = []
+
+    def enqueue_message_to_queue(self, queue_name, message_content):
+        self.messages.append(message_content)
+
+
+def static_service(boxes, global_tracker):
+    service_bus = FakeServiceBus()
+    tracker = FakeDeepSort()
+    detector = FakeDetector(boxes)
+    service = VideoProcessingService(detector, tracker, global_tracker, service_bus, "tracks", track_timeout=0,
+                                     motion_gate_factory=lambda camera_id: MotionGate(max_skip=1000),
+                                     publish_tracks=True)
+    return service, tracker, detector, service_bus
+
+
+def test_static_frames_keep_tracks_and_global_identities_alive():
+    global_tracker = GlobalTracker(threshold=0.3, timeout=0.2)
+    service, tracker, detector, service_bus = static_service(
+        [[10, 10, 40, 90, 0.9, 0], [60, 10, 90, 90, 0.8, 0]], global_tracker)
+    camera = service.camera(None, "cam-1")
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+
+    for _ in range(40):
+        service.process_frame(frame, camera=camera)
+        global_tracker.handle_global_tracks()
+        time.sleep(0.01)
+
+    assert detector.calls == 1 and camera.skipped == 39
+    assert tracker.tracker.predictions == 0
+    assert service_bus.messages == []
+    assert sorted(camera.active_tracks) == ["1", "2"]
+    assert len(global_tracker) == 2
+
+    # The first frame with motion still finds the same people
+    moved = frame.copy()
+    moved[20:60, 100:140] = 255
+    service.process_frame(moved, camera=camera)
+    assert detector.calls == 2 and service_bus.messages == []
+    assert sorted(camera.active_tracks) == ["1", "2"] and len(global_tracker) == 2
+
+
+def test_tracks_missing_from_a_detected_frame_are_reported():
+    global_tracker = GlobalTracker(threshold=0.3)
+    service, tracker, detector, service_bus = static_service([[10, 10, 40, 90, 0.9, 0]], global_tracker)
+    camera = service.camera(None, "cam-1")
+    service.process_frame(np.zeros((120, 160, 3), dtype=np.uint8), camera=camera)
+
+    tracker.tracker.tracks[0].time_since_update = 2
+    tracker.update_tracks = lambda detections, embeds=None, frame=None: list(tracker.tracker.tracks)
+    moved = np.full((120, 160, 3), 255, dtype=np.uint8)
+    service.process_frame(moved, camera=camera)
+    assert len(service_bus.messages) == 1 and camera.active_tracks == {}
+
+
+class RecordingEmbedder:
+    def __init__(self):
+        self.crops = []
+
+    def embed(self, frame, detections):
+        self.crops.append([box for box, _, _ in detections])
+        return detections, [np.full(8, i, dtype=np.float32) for i in range(len(detections))]
+
+
+def test_boxes_without_area_never_reach_the_embedder_or_tracker():
+    tracker = FakeDeepSort()
+    received = []
+    update_tracks = tracker.update_tracks
+
+    def record(detections, embeds=None, frame=None):
+        received.append((detections, embeds))
+        return update_tracks(detections, embeds, frame)
+
+    tracker.update_tracks = record
+    embedder = RecordingEmbedder()
+    # Truncation makes the first box zero-width; the last has no height
+    detector = FakeDetector([[10.2, 10, 10.9, 50, 0.9, 0], [20, 10, 40, 60, 0.8, 0], [50, 30, 70, 30.5, 0.7, 0]])
+    service = VideoProcessingService(detector, tracker, GlobalTracker(threshold=0.3), FakeServiceBus(), "tracks",
+                                     embedder=embedder)
+    service.process_frame(np.zeros((120, 160, 3), dtype=np.uint8), scale=2.0, camera=service.camera(None, "cam-1"))
+
+    assert embedder.crops == [[(20, 10, 20, 50)]]
+    (detections, embeds), = received
+    assert [box for box, _, _ in detections] == [(40, 20, 40, 100)] and len(embeds) == 1
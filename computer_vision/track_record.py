@@ -0,0 +1,147 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+EMBEDDING_DTYPES = ("int8", "float16", "float32")
+
+
+def quantize(vector, dtype: str = "int8"):
+    """
+    Store a float vector compactly.
+
+    :param dtype: "int8" (symmetric, with a per-vector scale), "float16" or "float32".
+    :return: (stored array, scale); the vector is approximately ``stored * scale``.
+    """
+    if dtype == "int8":
+        peak = float(np.max(np.abs(vector))) if len(vector) else 0.0
+        scale = peak / 127 if peak > 0 else 1.0
+        return np.round(vector / scale).astype(np.int8), scale
+    # Always a copy: a view would keep the caller's whole batch of embeddings alive
+    return np.array(vector, dtype=dtype), 1.0
+
+
+def to_epoch(monotonic: float) -> float:
+    """Unix time of a ``time.monotonic()`` timestamp."""
+    return time.time() - (time.monotonic() - monotonic)
+
+
+def from_epoch(epoch: float) -> float:
+    """``time.monotonic()`` timestamp of a Unix time."""
+    return time.monotonic() - (time.time() - epoch)
+
+
+def to_datetime(monotonic: float) -> datetime:
+    """Local wall-clock datetime of a ``time.monotonic()`` timestamp."""
+    return datetime.now() - timedelta(seconds=time.monotonic() - monotonic)
+
+
+class CameraBits:
+    """Bit positions of one source's cameras; the records of that source share it to encode camera sets as masks."""
+
+    __slots__ = ("ids", "_bits", "_lock")
+
+    def __init__(self):
+        self.ids = []
+        self._bits = {}
+        self._lock = threading.Lock()
+
+    def bit(self, camera_id) -> int:
+        """The mask bit of camera_id, assigning the next free one on first use."""
+        bit = self._bits.get(camera_id)
+        if bit is None:
+            with self._lock:
+                bit = self._bits.get(camera_id)
+                if bit is None:
+                    bit = self._bits[camera_id] = 1 << len(self.ids)
+                    self.ids.append(camera_id)
+        return bit
+
+    def encode(self, camera_ids) -> int:
+        mask = 0
+        for camera_id in camera_ids:
+            mask |= self.bit(camera_id)
+        return mask
+
+    def decode(self, mask: int) -> set:
+        cameras, position = set(), 0
+        while mask:
+            if mask & 1:
+                cameras.add(self.ids[position])
+            mask >>= 1
+            position += 1
+        return cameras
+
+
+class TrackRecord:
+    """
+    One global identity in the gallery.
+
+    The appearance is an exponential moving average of the L2-normalized embeddings of every
+    sighting, stored quantized (see ``quantize``); the first sightings are averaged with equal
+    weights until ``1 / sightings`` drops below the smoothing factor, so early embeddings are not
+    overweighted. Cameras are a bitmask over the source's CameraBits and times are
+    ``time.monotonic()`` seconds (see ``to_datetime``).
+    """
+
+    __slots__ = ("source_id", "camera_bits", "camera_mask", "last_camera", "embedding", "scale", "sightings",
+                 "first_seen", "last_seen")
+
+    def __init__(self, source_id, camera_bits: CameraBits, camera_mask: int, last_camera, embedding, scale: float,
+                 sightings: int, first_seen: float, last_seen: float):
+        self.source_id = source_id
+        self.camera_bits = camera_bits
+        self.camera_mask = camera_mask
+        self.last_camera = last_camera
+        self.embedding = embedding
+        self.scale = scale
+        self.sightings = sightings
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+
+    @classmethod
+    def first_sighting(cls, source_id, camera_bits: CameraBits, camera_id, features, seen_at: float,
+                       dtype: str = "int8"):
+        """
+        :param features: L2-normalized float32 embedding of the sighting.
+        :param seen_at: Monotonic time of the sighting.
+        """
+        embedding, scale = quantize(features, dtype)
+        return cls(source_id, camera_bits, camera_bits.bit(camera_id), camera_id, embedding, scale, 1, seen_at, seen_at)
+
+    @property
+    def features(self):
+        """The dequantized appearance embedding, as float32."""
+        if self.embedding.dtype == np.int8:
+            return self.embedding.astype(np.float32) * np.float32(self.scale)
+        return self.embedding.astype(np.float32)
+
+    @property
+    def cameras(self) -> set:
+        return self.camera_bits.decode(self.camera_mask)
+
+    def update(self, features, camera_id, seen_at: float, alpha: float):
+        """
+        Fold a new sighting into the record.
+
+        :param features: L2-normalized float32 embedding of the sighting.
+        :param alpha: Smoothing factor: the weight of the new embedding once warmed up.
+        """
+        self.sightings += 1
+        weight = max(alpha, 1.0 / self.sightings)
+        # The stored array is replaced, never written in place, so copies of the record stay consistent
+        self.embedding, self.scale = quantize((1.0 - weight) * self.features + weight * features,
+                                              self.embedding.dtype.name)
+        self.camera_mask |= self.camera_bits.bit(camera_id)
+        self.last_camera = camera_id
+        self.last_seen = seen_at
+
+    def copy(self):
+        return TrackRecord(self.source_id, self.camera_bits, self.camera_mask, self.last_camera, self.embedding,
+                           self.scale, self.sightings, self.first_seen, self.last_seen)
+
+    def __repr__(self):
+        return (f"TrackRecord(source_id={self.source_id!r}, cameras={sorted(map(str, self.cameras))}, "
+                f"last_camera={self.last_camera!r}, sightings={self.sightings}, "
+                f"first_seen={to_datetime(self.first_seen):%H:%M:%S}, last_seen={to_datetime(self.last_seen):%H:%M:%S})")
@@ -1,8 +1,11 @@
-import base64
+# First, so startup timings cover the remaining imports
+from startup import Startup, warm_up_detector, warm_up_embedder
+
+import functools
 import glob
 import os
 import threading
-from pyexpat import features
+import time
 
 import cv2
 import datetime
@@ -11,12 +14,18 @@ import json
 
 import numpy as np
 from dotenv import load_dotenv
-from deep_sort_realtime.deepsort_tracker import DeepSort
-from ultralytics import YOLO
 
-from azure_app_config_client import AppConfigClient
-from azure_service_bus_client import AzureServiceBusClient
+from batch_inference import BatchedDetector, BatchedEmbedder, create_embedder
+from camera_context import CameraContext
+from detectors import PERSON, detector_from_env
+from frame_decoding import decode_for_detector
+from frame_envelope import decode_frame_envelope, event_body_view
+from frame_pipeline import FramePipeline, LATEST
+from gallery_index import create_index
 from global_tracker import GlobalTracker
+from metrics import (ACTIVE_TRACKS, DETECTIONS, FRAMES, GALLERY_SIZE, LOG_SAMPLER, PIPELINE_FRAMES, StageTimer,
+                     start_metrics_server)
+from motion_gate import MotionGate
 
 # Load environment variables
 load_dotenv()
@@ -26,94 +35,282 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 
 
 class VideoProcessingService:
-    """Class to process video stream or Event Hub frames for human detection and send messages."""
-    def __init__(self, model, tracker, global_tracker, service_bus_client, queue_name):
+    """
+    Class to process video stream or Event Hub frames for human detection and send messages.
+
+    Each camera gets its own CameraContext (tracker, local track lifecycle and counters), created on
+    its first frame and evicted once it has been idle for ``camera_idle_timeout`` seconds, so one
+    service can multiplex many cameras without mixing their detections.
+    """
+    def __init__(self, detector, tracker, global_tracker, service_bus_client, queue_name, track_timeout: float = 0.0,
+                 motion_gate_factory=None, detector_imgsz: int = None, embedder=None, publish_tracks: bool = False,
+                 stage_timer=None, tracker_factory=None, camera_idle_timeout: float = None):
+        """
+        :param detector: A detectors.Detector, or a shared BatchedDetector / ScheduledDetector wrapping one.
+        :param tracker: DeepSort tracker of the first camera; may be None when tracker_factory is given.
+        :param track_timeout: Seconds a local track may go unseen before its disappearance is reported;
+            0 reports it on the first frame it is missing from.
+        :param motion_gate_factory: Optional callable ``motion_gate_factory(camera_id)`` returning a MotionGate;
+            when set, detection is skipped on frames of that camera without enough motion.
+        :param detector_imgsz: The detector's input size; when set, JPEG frames are decoded at the smallest
+            1/2, 1/4 or 1/8 reduction that still covers it, and boxes are scaled back to source coordinates.
+        :param embedder: Optional BatchedEmbedder shared with other cameras' services; the trackers must then be
+            built with ``DeepSort(embedder=None)``.
+        :param publish_tracks: Report local track appearances and disappearances to Service Bus.
+        :param stage_timer: Object whose ``time(stage)`` context manager records how long the decode, detect,
+            track, global_match and publish stages of each frame take; defaults to the metrics stage histogram.
+        :param tracker_factory: Callable returning a new tracker for each further camera; required to process
+            frames of more than one camera.
+        :param camera_idle_timeout: Seconds without frames after which a camera's context is evicted and its
+            active tracks reported as disappeared; None keeps contexts forever.
+        """
         self.event_hub_client = None
-        self.model = model
-        self.tracker = tracker
+        self.pipeline = None
+        self.detector = detector
         self.global_tracker = global_tracker
         self.service_bus_client = service_bus_client
         self.queue_name = queue_name
+        # Source reported for single-camera inputs (video stream, captured frames)
         self.source_id = None
-        self.camera_id = None
-        self.active_tracks = {}
-
-    def process_frame(self, frame):
-        """Process a single frame for human detection."""
-        # Perform detection with YOLO
-        results = self.model.predict(source=frame, save=False)
-        detections = []
-
-        # Extract detections for "person" class
-        for detection in results[0].boxes:
-            x1, y1, x2, y2 = detection.xyxy[0]
-            conf = detection.conf[0]
-            cls = detection.cls[0]
+        self.track_timeout = track_timeout
+        self.tracker_factory = tracker_factory
+        self.camera_idle_timeout = camera_idle_timeout
+        self.cameras = {}
+        self._cameras_lock = threading.Lock()
+        self._spare_tracker = tracker
+        self._next_eviction = 0.0
+        self.motion_gate_factory = motion_gate_factory
+        self.detector_imgsz = detector_imgsz
+        self.embedder = embedder
+        self.publish_tracks = publish_tracks
+        self.stage_timer = stage_timer if stage_timer is not None else StageTimer()
+
+    def camera(self, source_id, camera_id) -> CameraContext:
+        """The camera's context, created on its first frame."""
+        with self._cameras_lock:
+            context = self.cameras.get((source_id, camera_id))
+            if context is None:
+                context = self.cameras[(source_id, camera_id)] = self._create_camera(source_id, camera_id)
+                logging.info(f"Tracking camera {camera_id} of source {source_id} ({len(self.cameras)} cameras).")
+            context.last_active = time.monotonic()
+            return context
+
+    def _create_camera(self, source_id, camera_id):
+        if self._spare_tracker is not None:
+            tracker, self._spare_tracker = self._spare_tracker, None
+        elif self.tracker_factory is not None:
+            tracker = self.tracker_factory()
+        else:
+            raise ValueError(f"A tracker_factory is needed to track camera {camera_id} besides the first one.")
+        motion_gate = self.motion_gate_factory(camera_id) if self.motion_gate_factory is not None else None
+        return CameraContext(source_id, camera_id, tracker, self.track_timeout, self._on_track_expired, motion_gate)
+
+    def evict_idle_cameras(self, now: float = None):
+        """
+        Drop the contexts of cameras idle for longer than camera_idle_timeout, reporting their active tracks
+        as disappeared. Cameras with a frame in progress are left for the next call.
 
-            if int(cls) == 0:  # Class 0 is "person"
-                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                width, height = x2 - x1, y2 - y1
-                detections.append(((x1, y1, width, height), conf.item(), "person"))
+        :return: Keys of the evicted cameras.
+        """
+        if self.camera_idle_timeout is None:
+            return []
+        now = now if now is not None else time.monotonic()
+        evicted = []
+        with self._cameras_lock:
+            for key, context in list(self.cameras.items()):
+                if context.idle_for(now) <= self.camera_idle_timeout or not context.lock.acquire(blocking=False):
+                    continue
+                try:
+                    if self.pipeline is not None and not self.pipeline.discard(key):
+                        continue  # Frames arrived meanwhile
+                    del self.cameras[key]
+                    self._flush_tracks(context)
+                    ACTIVE_TRACKS.labels(context.camera_id).set(0)
+                    evicted.append(key)
+                finally:
+                    context.lock.release()
+        if evicted:
+            logging.info(f"Evicted {len(evicted)} idle cameras: {evicted}")
+        return evicted
+
+    def _maybe_evict(self):
+        """Evict idle cameras at most a few times per idle timeout."""
+        if self.camera_idle_timeout is None:
+            return
+        now = time.monotonic()
+        if now >= self._next_eviction:
+            self._next_eviction = now + self.camera_idle_timeout / 4
+            self.evict_idle_cameras(now)
+
+    def _flush_tracks(self, context):
+        """Report every active track of a camera as disappeared at its last-seen time."""
+        for track_id in list(context.active_tracks):
+            last_seen = context.track_expiry.last_seen(track_id)
+            context.track_expiry.discard(track_id)
+            self._on_track_expired(context, track_id, last_seen if last_seen is not None else time.monotonic())
+
+    def camera_stats(self):
+        """Per-camera counters, keyed by (source_id, camera_id)."""
+        with self._cameras_lock:
+            return {key: context.stats() for key, context in self.cameras.items()}
+
+    def motion_stats(self):
+        """Per-camera frame, skipped-frame and skip-ratio counters of the motion gates."""
+        with self._cameras_lock:
+            return {context.camera_id: context.motion_gate.stats() for context in self.cameras.values()
+                    if context.motion_gate is not None}
+
+    def _stage(self, name):
+        return self.stage_timer.time(name)
+
+    def process_frame(self, frame, scale: float = 1.0, camera: CameraContext = None):
+        """
+        Process a single frame for human detection.
 
-        tracks = self.tracker.update_tracks(detections, frame=frame)
+        :param scale: Factor from frame to source coordinates when the frame was decoded at reduced resolution.
+        :param camera: Context of the camera the frame came from; defaults to the service's single camera.
+        """
+        if camera is None:
+            camera = self.camera(self.source_id, None)
+        with camera.lock:
+            camera.last_active = time.monotonic()
+            self._process_frame(camera, frame, scale)
+
+    def _process_frame(self, camera, frame, scale):
+        camera.frames += 1
+        tracker = camera.tracker
+        if camera.motion_gate is None or camera.motion_gate.should_detect(frame):
+            with self._stage("detect"):
+                detections = self.detect(frame)
+            if detections is None:
+                camera.shed += 1
+                FRAMES.labels(camera.camera_id, "shed").inc()
+                return  # Shed by the inference scheduler
+            camera.detections += len(detections)
+            FRAMES.labels(camera.camera_id, "processed").inc()
+            DETECTIONS.observe(len(detections))
+            with self._stage("track"):
+                if self.embedder is not None:
+                    detections, embeds = self.embedder.embed(frame, detections)
+                elif scale != 1.0:
+                    embeds = tracker.generate_embeds(frame, detections)
+                else:
+                    embeds = None
+                if scale != 1.0:
+                    # Embeddings are cropped from the reduced frame with its own boxes, but tracking is in source coordinates
+                    detections = self._rescale(detections, scale)
+                    kept = [i for i, (box, _, _) in enumerate(detections) if box[2] > 0 and box[3] > 0]
+                    if len(kept) < len(detections):
+                        detections = [detections[i] for i in kept]
+                        embeds = [embeds[i] for i in kept]
+                tracks = tracker.update_tracks(detections, embeds=embeds, frame=frame if embeds is None else None)
+            camera.live_tracks = [track for track in tracks
+                                  if track.is_confirmed() and track.time_since_update <= 1]
+        else:
+            # Static frame: nobody moved, so the tracks of the last detected frame are still in view.
+            # The tracker is left untouched (predicting would age them into misses and, past max_age,
+            # deletion); their global identities and local expiry are refreshed below as if re-detected.
+            camera.skipped += 1
+            FRAMES.labels(camera.camera_id, "skipped").inc()
+            tracks = camera.live_tracks
 
         # Match tracks to global tracker
-        for track in tracks:
-            if not track.is_confirmed() or track.time_since_update > 1:
-                continue
+        with self._stage("global_match"):
+            active = 0
+            for track in tracks:
+                if not track.is_confirmed() or track.time_since_update > 1:
+                    continue
 
-            self.global_tracker.match_and_update(
-                self.source_id,
-                self.camera_id,
-                np.array(track.features)
-            )
+                active += 1
+                self.global_tracker.match_and_update(
+                    camera.source_id,
+                    camera.camera_id,
+                    np.array(track.features)
+                )
+        ACTIVE_TRACKS.labels(camera.camera_id).set(active)
 
-        # self.handle_tracks(tracks)
+        if self.publish_tracks:
+            with self._stage("publish"):
+                self.handle_tracks(camera, tracks)
+
+    def detect(self, frame):
+        """
+        Run person detection on a frame.
 
-    def handle_tracks(self, tracks):
-        """Handle active and disappeared tracks."""
-        current_time = datetime.datetime.now(datetime.UTC).isoformat()
-        logging.info(f"Handling tracks")
-        logging.info(f"Tracks: {tracks}")
+        :return: DeepSort-style ((x, y, w, h), confidence, class) tuples, or None if the detector shed the frame.
+        """
+        boxes = self.detector.detect([frame])[0]
+        if boxes is None:
+            return None
+        detections = []
 
-        # Keep track of currently visible track IDs
-        active_track_ids = set()
+        # Extract detections for "person" class
+        for x1, y1, x2, y2, conf, cls in boxes:
+            if int(cls) == PERSON:
+                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+                width, height = x2 - x1, y2 - y1
+                # DeepSort drops boxes without area after embedding, which would misalign embeds and detections
+                if width > 0 and height > 0:
+                    detections.append(((x1, y1, width, height), float(conf), "person"))
+
+        return detections
+
+    @staticmethod
+    def _rescale(detections, scale):
+        """Scale ((x, y, w, h), confidence, class) detections from reduced-frame to source coordinates."""
+        return [
+            (tuple(int(round(value * scale)) for value in box), conf, cls)
+            for box, conf, cls in detections
+        ]
+
+    def handle_tracks(self, camera: CameraContext, tracks):
+        """Handle a camera's active and disappeared tracks."""
+        now = time.monotonic()
+        active_tracks = camera.active_tracks
+        # Sampled: this runs on every frame of every camera
+        LOG_SAMPLER.log("tracks", key=("tracks", camera.key), camera=camera.camera_id,
+                        tracks=len(tracks), active=len(active_tracks))
 
         for track in tracks:
             if not track.is_confirmed() or track.time_since_update > 1:
                 continue
 
             track_id = str(track.track_id)
-            active_track_ids.add(track_id)
-
-            if track_id not in self.active_tracks:
+            if track_id not in active_tracks:
                 # New track appeared
-                self.active_tracks[track_id] = {"start_time": current_time, "last_seen": current_time}
-                logging.info(f"Person {track_id} appeared at {current_time}")
-            else:
-                # Update last seen time for active track
-                self.active_tracks[track_id]["last_seen"] = current_time
-
-        # Check for disappeared tracks
-        for track_id in list(self.active_tracks.keys()):
-            if track_id not in active_track_ids:
-                # Track has disappeared
-                start_time = self.active_tracks[track_id]["start_time"]
-                end_time = self.active_tracks[track_id]["last_seen"]
-
-                # Prepare and send disappearance message
-                message_content = json.dumps({
-                    "uuid": track_id,
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "source_id": self.source_id,
-                    "camera_id": self.camera_id
-                })
-                self.service_bus_client.send_message_to_queue(self.queue_name, message_content)
-                logging.info(f"Person {track_id} disappeared at {end_time}")
-
-                # Remove the disappeared track
-                del self.active_tracks[track_id]
+                active_tracks[track_id] = {"start_time": time.time()}
+                logging.info(f"Person {track_id} appeared on camera {camera.camera_id} at "
+                             f"{self._isoformat(active_tracks[track_id]['start_time'])}")
+
+            # Update last seen time for active track
+            camera.track_expiry.touch(track_id, now)
+
+        # Only tracks whose timeout has passed are visited; each is reported via _on_track_expired
+        camera.track_expiry.advance(now)
+
+    @staticmethod
+    def _isoformat(timestamp):
+        return datetime.datetime.fromtimestamp(timestamp, datetime.UTC).isoformat()
+
+    def _on_track_expired(self, camera, track_id, last_seen):
+        """Send the disappearance message for a track that has not been seen for track_timeout seconds."""
+        start_time = self._isoformat(camera.active_tracks[track_id]["start_time"])
+        end_time = self._isoformat(time.time() - (time.monotonic() - last_seen))
+
+        # Prepare and send disappearance message
+        message_content = json.dumps({
+            "uuid": track_id,
+            "start_time": start_time,
+            "end_time": end_time,
+            "source_id": camera.source_id,
+            "camera_id": camera.camera_id
+        })
+        # Buffered and sent in batches by a background sender, so the frame loop never waits on the network
+        self.service_bus_client.enqueue_message_to_queue(self.queue_name, message_content)
+        logging.info(f"Person {track_id} disappeared at {end_time}")
+
+        # Remove the disappeared track
+        del camera.active_tracks[track_id]
 
     def run_video_stream(self, url):
         """Read video stream from a URL."""
@@ -138,66 +335,141 @@ class VideoProcessingService:
         cap.release()
         cv2.destroyAllWindows()
 
-    def run_event_hub_listener(self):
-        """Listen for video frames from Azure Event Hub."""
-        def process_event(partition_context, event):
-            logging.info(f"Received event: {event.body_as_str()}")
-            payload = json.loads(event.body_as_str())
-            self.source_id = payload["SourceId"]
-            self.camera_id = payload["CameraId"]
-            frame_data = payload["FrameData"]
-
-            frame_bytes = base64.b64decode(frame_data)
-
-            np_frame = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
-            if np_frame is not None:
-                logging.info(f"NumPy Frame is not None")
-                self.process_frame(np_frame)
-            partition_context.update_checkpoint()
-
-        if self.event_hub_client:
-            self.event_hub_client.receive_events(process_event)
+    def run_event_hub_listener(self, decode_workers: int = 2, queue_size: int = 1, overflow_policy: str = LATEST,
+                               max_batch_size: int = 64, max_wait_time: float = 1.0, checkpoint_interval: float = None,
+                               inference_workers: int = 1):
+        """
+        Listen for video frames from Azure Event Hub.
+
+        Frames are decoded on a thread pool and queued per camera, and inference threads run
+        detection and tracking, so a slow model call drops stale frames instead of backing up
+        the partition. Each camera named in the frame envelopes is tracked in its own context;
+        with several inference threads different cameras are processed concurrently.
+
+        :param decode_workers: Number of JPEG decode threads.
+        :param queue_size: Capacity of each per-camera frame queue.
+        :param overflow_policy: "block", "drop_oldest" or "latest" (keep only the newest frame per camera).
+        :param max_batch_size: Maximum number of events received per batch.
+        :param max_wait_time: Seconds to wait for a batch to fill.
+        :param checkpoint_interval: Checkpoint at most once per this many seconds instead of once per batch.
+        :param inference_workers: Number of inference threads; pair several with a shared BatchedDetector
+            so concurrent cameras' frames are detected in one batch.
+        """
+        def decode(envelope):
+            with self._stage("decode"):
+                np_frame, scale = decode_for_detector(envelope.image, self.detector_imgsz)
+            if np_frame is None:
+                logging.warning(f"Could not decode frame {envelope.sequence} from camera {envelope.camera_id}.")
+                return None
+            return envelope.source_id, envelope.camera_id, np_frame, scale
+
+        def process(camera_key, item):
+            source_id, camera_id, np_frame, scale = item
+            self.process_frame(np_frame, scale, self.camera(source_id, camera_id))
+            self._maybe_evict()
+
+        self.pipeline = FramePipeline(process, decode_workers, queue_size, overflow_policy, inference_workers)
+        PIPELINE_FRAMES.set_function(lambda: {
+            (camera_id, outcome): stats[outcome]
+            for (_, camera_id), stats in self.pipeline.stats().items()
+            for outcome in ("enqueued", "dropped", "processed")
+        })
+
+        def process_batch(partition_context, events):
+            for event in events:
+                try:
+                    # Binary envelopes are decoded straight from the event body; legacy JSON chunks are still accepted
+                    envelope = decode_frame_envelope(event_body_view(event))
+                except (ValueError, KeyError) as e:
+                    logging.warning(f"Skipping malformed event {event.sequence_number}: {e}")
+                    continue
+                logging.debug(f"Received frame {envelope.sequence} from camera {envelope.camera_id} ({len(envelope.image)} bytes)")
+                self.pipeline.submit((envelope.source_id, envelope.camera_id), envelope, decode)
+            # Also runs while every camera of this pod is idle, as long as any partition delivers events
+            self._maybe_evict()
+
+        try:
+            if self.event_hub_client:
+                # Checkpoints are written by the client once per batch (or interval), not per frame
+                self.event_hub_client.receive_batches(
+                    process_batch,
+                    max_batch_size=max_batch_size,
+                    max_wait_time=max_wait_time,
+                    checkpoint_interval=checkpoint_interval
+                )
+        finally:
+            self.pipeline.close()
+            logging.info(f"Camera stats: {self.camera_stats()}")
+
+    @staticmethod
+    def capture_frame_files(frame_directory, camera_name):
+        """Sorted paths of a camera's captured .png frames in a directory."""
+        frame_pattern = os.path.join(frame_directory, f"camera_{camera_name}_frame_*.png")
+        return sorted(glob.glob(frame_pattern))  # Sorted to ensure sequential processing
 
-    def run_capture_frame(self, frame_directory, camera_name):
+    def run_capture_frame(self, frame_directory, camera_name, display: bool = True):
         """
         Simulate video processing by reading frames stored as .png files in a directory.
 
         :param frame_directory: Directory where frame files are stored.
         :param camera_name: Name of the camera to filter the frames.
+        :param display: Show each frame in a window; pass False to run headless.
         """
-        self.camera_id = camera_name
-        frame_pattern = os.path.join(frame_directory, f"camera_{camera_name}_frame_*.png")
-        frame_files = sorted(glob.glob(frame_pattern))  # Sorted to ensure sequential processing
+        frame_files = self.capture_frame_files(frame_directory, camera_name)
 
         if not frame_files:
             logging.error(f"No frames found for camera {camera_name} in directory {frame_directory}.")
             return
 
         logging.info(f"Starting frame processing for camera {camera_name}. Total frames: {len(frame_files)}")
+        self.replay_frames(((frame_file, frame_file) for frame_file in frame_files), camera_name, display)
+
+    def replay_frames(self, encoded_frames, camera_name, display: bool = True):
+        """
+        Process a sequence of encoded frames from one camera, in order.
+
+        :param encoded_frames: Iterable of (label, encoded image) pairs; the image may be any bytes-like
+            object, e.g. preloaded bytes or a slice of a memory-mapped file, or the path of an image file,
+            which is then read with the frame so an unreadable file only skips that frame.
+        :param camera_name: The camera the frames came from.
+        :param display: Show each frame in a window; pass False to run headless.
+        :return: Number of frames processed.
+        """
+        camera = self.camera(self.source_id, camera_name)
+        processed = 0
 
-        for frame_file in frame_files:
+        for label, data in encoded_frames:
             try:
-                # Load the frame
-                frame = cv2.imread(frame_file)
+                # Decode the frame
+                with self._stage("decode"):
+                    if isinstance(data, str):
+                        data = np.fromfile(data, np.uint8)
+                    frame, scale = decode_for_detector(data, self.detector_imgsz)
 
                 if frame is None:
-                    logging.warning(f"Could not read frame {frame_file}. Skipping.")
+                    logging.warning(f"Could not read frame {label}. Skipping.")
                     continue
 
                 # Process the frame
-                self.process_frame(frame)
+                self.process_frame(frame, scale, camera)
+                processed += 1
 
-                # Show the frame for debugging or monitoring purposes
-                cv2.imshow("Frame Processing", frame)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+                if display:
+                    # Show the frame for debugging or monitoring purposes
+                    cv2.imshow("Frame Processing", frame)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
 
             except Exception as e:
-                logging.error(f"Error processing frame {frame_file}: {e}")
+                logging.error(f"Error processing frame {label}: {e}")
                 continue
 
         logging.info("Completed frame processing.")
-        cv2.destroyAllWindows()
+        if camera.motion_gate is not None:
+            logging.info(f"Motion gate stats: {self.motion_stats()}")
+        if display:
+            cv2.destroyAllWindows()
+        return processed
 
 
 # if __name__ == "__main__":
@@ -233,47 +505,185 @@ class VideoProcessingService:
 #         sb_client.close()
 
 
-def start_camera_stream(camera_name, global_tracker, model, service_bus_client, queue_name):
-    tracker = DeepSort(max_age=30)
-    service = VideoProcessingService(model, tracker, global_tracker, service_bus_client, queue_name)
-    service.run_capture_frame("/Users/abdurrahmangaziyavuz/StoreGuardAI/unity/CapturedFrames/", camera_name)
+def motion_gate_factory_from_env():
+    """Build a MotionGate factory from MOTION_GATE* environment variables, or None when gating is off."""
+    if os.getenv("MOTION_GATE", "false").lower() != "true":
+        return None
+    return lambda camera_id: MotionGate(
+        motion_threshold=float(os.getenv("MOTION_GATE_THRESHOLD", "0.005")),
+        max_skip=int(os.getenv("MOTION_GATE_MAX_SKIP", "15"))
+    )
+
+
+def start_camera_stream(camera_name, global_tracker, detector, service_bus_client, queue_name, embedder=None,
+                        display: bool = True):
+    """
+    Track one camera's captured frames from FRAME_DIRECTORY.
+
+    :param display: Show each frame in a window; pass False in headless processes such as the camera workers.
+    """
+    # Imported here so importing this module does not load torch
+    from deep_sort_realtime.deepsort_tracker import DeepSort
+
+    # With a shared embedder the tracker holds no re-ID model of its own
+    tracker = DeepSort(max_age=30, embedder=None) if embedder else DeepSort(max_age=30)
+    service = VideoProcessingService(detector, tracker, global_tracker, service_bus_client, queue_name,
+                                     motion_gate_factory=motion_gate_factory_from_env(),
+                                     detector_imgsz=int(os.getenv("REDUCED_DECODE_IMGSZ", "0")) or None,
+                                     embedder=embedder)
+    service.run_capture_frame(os.getenv("FRAME_DIRECTORY", "/Users/abdurrahmangaziyavuz/StoreGuardAI/unity/CapturedFrames/"),
+                              camera_name, display)
+
+
+def load_models(startup: Startup, max_batch_size: int, embedder_batch_size: int = None):
+    """
+    Load the detector and, if embedder_batch_size is set, the shared re-ID embedder, and warm both
+    up with dummy batches so the first real frames do not pay for model fusing and allocations.
+
+    :return: (detector, embedder model or None).
+    """
+    with startup.phase("load_detector"):
+        detector = detector_from_env()
+    with startup.phase("warm_up_detector"):
+        warm_up_detector(detector, batch_sizes=(1, max_batch_size))
+    embedder = None
+    if embedder_batch_size:
+        with startup.phase("load_embedder"):
+            embedder = create_embedder(max_batch_size=embedder_batch_size)
+        with startup.phase("warm_up_embedder"):
+            warm_up_embedder(embedder, batch_size=embedder_batch_size)
+    return detector, embedder
 
 
 if __name__ == "__main__":
-    config_client = AppConfigClient(os.getenv('APP_CONFIG_URL'))
-    service_bus_connection_str = config_client.fetch_configuration_value("ServiceBusConnectionString")
-    queue = config_client.fetch_configuration_value("SG_QueueName")
-
-    # Initialize Azure Service Bus Client
-    sb_client = AzureServiceBusClient(service_bus_connection_str)
-    yolo = YOLO("yolov8n.pt")
-    global_tracker = GlobalTracker()
-
-    try:
-
-        # List of camera URLs
-        # camera_sources = ["cam1", "cam2", "cam3", "cam4", "cam5", "cam6", "cam7", "cam8"]
-        camera_sources = ["cam1", "cam2"]
-        # tracker = DeepSort(max_age=30)
-        # service = VideoProcessingService(yolo, tracker, global_tracker, sb_client, queue)
-        # service.run_capture_frame("/Users/abdurrahmangaziyavuz/StoreGuardAI/unity/CapturedFrames/", camera_sources[0])
-
-        # Start a thread for each camera
-        threads = []
-        for camera_name in camera_sources:
-            t = threading.Thread(
-                target=start_camera_stream,
-                args=(camera_name, global_tracker, yolo, sb_client, queue)
+    startup = Startup("video-processing")
+    if os.getenv("METRICS_PORT"):
+        # Up first so liveness and /ready answer (503) while the rest starts
+        start_metrics_server(int(os.getenv("METRICS_PORT")), readiness=startup.ready)
+
+    # List of camera URLs
+    # camera_sources = ["cam1", "cam2", "cam3", "cam4", "cam5", "cam6", "cam7", "cam8"]
+    camera_sources = ["cam1", "cam2"]
+    process_mode = os.getenv("EXECUTION_MODE", "thread").lower() == "process"
+    max_batch_size = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", len(camera_sources)))
+    embedder_batch_size = int(os.getenv("EMBEDDER_MAX_BATCH_SIZE", "64"))
+
+    # Models load and warm up while configuration and clients are fetched; in process mode
+    # the inference processes load their own
+    models = None
+    if not process_mode:
+        models = startup.in_background(
+            load_models, startup, max_batch_size,
+            embedder_batch_size if os.getenv("SHARED_EMBEDDER", "true").lower() == "true" else None
+        )
+
+    with startup.phase("imports"):
+        from azure_app_config_client import AppConfigClient
+        from azure_service_bus_client import AzureServiceBusClient
+
+    with startup.phase("config"):
+        config_client = AppConfigClient(os.getenv('APP_CONFIG_URL'))
+        service_bus_connection_str = config_client.fetch_configuration_value("ServiceBusConnectionString")
+        queue = config_client.fetch_configuration_value("SG_QueueName")
+
+    with startup.phase("clients"):
+        # Initialize Azure Service Bus Client
+        sb_client = AzureServiceBusClient(service_bus_connection_str)
+        global_tracker = GlobalTracker(
+            index_factory=functools.partial(create_index, os.getenv("GALLERY_INDEX", "exact")),
+            shard_by_source=os.getenv("GALLERY_SHARD_BY_SOURCE", "false").lower() == "true",
+            snapshot_reads=os.getenv("GALLERY_SNAPSHOT_READS", "false").lower() == "true",
+            snapshot_refresh=float(os.getenv("GALLERY_SNAPSHOT_REFRESH", "0.5"))
+        )
+        GALLERY_SIZE.set_function(lambda: len(global_tracker))
+
+    if process_mode:
+        from multiprocess_runner import MultiProcessRunner
+
+        # One process per camera plus a pool of detector processes, exchanging frames through
+        # shared-memory rings so decode and tracking are not serialized by the GIL
+        runner = MultiProcessRunner(
+            camera_sources, global_tracker, service_bus_connection_str, queue,
+            inference_workers=int(os.getenv("INFERENCE_WORKERS", "1")),
+            max_batch_size=max_batch_size,
+            max_frame_bytes=int(os.getenv("FRAME_RING_MAX_BYTES", 1920 * 1080 * 3))
+        )
+        try:
+            startup.mark_ready()
+            runner.run()
+        finally:
+            startup.mark_not_ready()
+            sb_client.close()
+            config_client.close()
+            print(global_tracker.global_tracks)
+    else:
+        from inference_scheduler import FairInferenceScheduler
+
+        detector, embedder_model = models.result()
+
+        # Share one detector (backend chosen by DETECTOR_BACKEND) between all camera threads,
+        # batching their frames into a single detect call
+        if os.getenv("INFERENCE_SCHEDULER", "batch").lower() == "fair":
+            # Under overload, pick frames by per-camera weight, deadline and minimum FPS instead of arrival order
+            shared_detector = FairInferenceScheduler(
+                detector.detect,
+                max_batch_size=max_batch_size,
+                deadline=float(os.getenv("INFERENCE_DEADLINE_MS", "500")) / 1000
+            )
+            for camera_name, schedule in json.loads(os.getenv("CAMERA_SCHEDULE", "{}")).items():
+                shared_detector.configure(
+                    camera_name,
+                    weight=schedule.get("weight"),
+                    deadline=schedule["deadline_ms"] / 1000 if "deadline_ms" in schedule else None,
+                    min_fps=schedule.get("min_fps")
+                )
+        else:
+            shared_detector = BatchedDetector(
+                detector,
+                max_batch_size=max_batch_size,
+                max_latency=float(os.getenv("INFERENCE_MAX_LATENCY_MS", "20")) / 1000
             )
-            threads.append(t)
-            t.start()
-
-        # Wait for all threads to complete
-        for t in threads:
-            t.join()
-
-    except Exception as e:
-        logging.error(f"Service encountered an error: {e}")
-    finally:
-        sb_client.close()
-        print(global_tracker.global_tracks)
+
+        # One re-ID model for all camera trackers, embedding their crops in shared batches
+        embedder = None
+        if embedder_model is not None:
+            embedder = BatchedEmbedder(
+                embedder_model,
+                max_batch_size=embedder_batch_size,
+                max_latency=float(os.getenv("EMBEDDER_MAX_LATENCY_MS", "10")) / 1000
+            )
+
+        try:
+            # tracker = DeepSort(max_age=30)
+            # service = VideoProcessingService(shared_detector, tracker, global_tracker, sb_client, queue)
+            # service.run_capture_frame("/Users/abdurrahmangaziyavuz/StoreGuardAI/unity/CapturedFrames/", camera_sources[0])
+
+            # Start a thread for each camera
+            threads = []
+            for camera_name in camera_sources:
+                camera_detector = shared_detector
+                if isinstance(shared_detector, FairInferenceScheduler):
+                    camera_detector = shared_detector.detector_for(camera_name)
+                t = threading.Thread(
+                    target=start_camera_stream,
+                    args=(camera_name, global_tracker, camera_detector, sb_client, queue, embedder)
+                )
+                threads.append(t)
+                t.start()
+            startup.mark_ready()
+
+            # Wait for all threads to complete
+            for t in threads:
+                t.join()
+
+        except Exception as e:
+            logging.error(f"Service encountered an error: {e}")
+        finally:
+            startup.mark_not_ready()
+            shared_detector.close()
+            detector.close()
+            if embedder:
+                embedder.close()
+            sb_client.close()
+            config_client.close()
+            print(global_tracker.global_tracks)